@@ -0,0 +1,63 @@
+"""
+Memory held by many point spectroscopy objects, Spec vs CompactSpec.
+
+Writes copies of the test .dat file (with a different position in each
+header) to a temporary directory, loads them all and reports the traced
+memory still allocated, per object and per object beyond its data
+table. Loading is slow under tracemalloc, 10k files take about half an hour.
+
+    python benchmarks/compact_spec_memory.py [number of files]
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import nanonispy as nap
+
+FIXTURE = os.path.join(os.path.dirname(__file__), '..', 'tests', 'Bias-Spectroscopy002.dat')
+
+
+def write_files(directory, num):
+    with open(FIXTURE, 'rb') as f:
+        raw = f.read().replace(b'\n', b'\r\n')
+    fnames = []
+    for i in range(num):
+        fname = os.path.join(directory, 'spec{:05d}.dat'.format(i))
+        with open(fname, 'wb') as f:
+            f.write(raw.replace(b'-19.4904E-9', '{}E-9'.format(i).encode()))
+        fnames.append(fname)
+    return fnames
+
+
+def measure(cls, fnames):
+    gc.collect()
+    tracemalloc.start()
+    t_start = time.perf_counter()
+    objects = [cls(fname) for fname in fnames]
+    elapsed = time.perf_counter() - t_start
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    data_size = sum(obj._specdata.nbytes for obj in objects)
+    del objects
+    return retained, data_size, elapsed
+
+
+def main(num=10000):
+    with tempfile.TemporaryDirectory() as directory:
+        fnames = write_files(directory, num)
+        print('{} files'.format(num))
+        print('{:<12} {:>12} {:>14} {:>16} {:>10}'.format(
+              'class', 'total (MiB)', 'per file (B)', 'non-data (B)', 'load (s)'))
+        for cls in (nap.read.Spec, nap.read.CompactSpec):
+            retained, data_size, elapsed = measure(cls, fnames)
+            print('{:<12} {:>12.1f} {:>14.0f} {:>16.0f} {:>10.2f}'.format(
+                  cls.__name__, retained / 2**20, retained / num,
+                  (retained - data_size) / num, elapsed))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
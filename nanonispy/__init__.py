@@ -1 +1,4 @@
 from . import read
+from .instrument import LoadProfiler
+from .shared import attach
+from .stack import stack_specs
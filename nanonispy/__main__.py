@@ -0,0 +1,54 @@
+import argparse
+import os
+import sys
+
+from .watch import Watcher, load, steps
+
+
+def main(argv=None):
+    """
+    Command line entry point, nanonispy watch DIR.
+    """
+    parser = argparse.ArgumentParser(prog='nanonispy', description='Nanonis file tools.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    watch = commands.add_parser('watch', help='process new or grown files of a directory')
+    watch.add_argument('directory', help='directory the acquisition writes to')
+    watch.add_argument('--out', help='output directory, default DIRECTORY/nanonispy')
+    watch.add_argument('--steps', default='thumbnail',
+                       help='comma separated pipeline steps among {}, default: thumbnail'.format(
+                            ', '.join(steps)))
+    watch.add_argument('--workers', type=int, default=2, help='worker threads, default: 2')
+    watch.add_argument('--max-pending', type=int,
+                       help='files queued or in process at most, default: 2 x workers')
+    watch.add_argument('--settle', type=float, default=2.0,
+                       help='seconds a file must stay unchanged, default: 2')
+    watch.add_argument('--poll', type=float, default=1.0, help='seconds between checks, default: 1')
+    watch.add_argument('--existing', action='store_true', help='also process files already there')
+    watch.add_argument('--polling', action='store_true', help='poll even if inotify is available')
+    watch.add_argument('--timeout', type=float, help='stop after this many seconds')
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.steps.split(',') if name.strip()]
+    unknown = [name for name in names if name not in steps]
+    if unknown:
+        parser.error('unknown steps {}'.format(', '.join(unknown)))
+    out = args.out or os.path.join(args.directory, 'nanonispy')
+    pipeline = [steps[name](out) for name in names]
+    if 'convert' in names or 'cache' in names:
+        # thumbnails only need the header, the other steps the data
+        pipeline.insert(0, load(strategy='auto'))
+
+    with Watcher(args.directory, pipeline, workers=args.workers, max_pending=args.max_pending,
+                 settle_time=args.settle, poll_interval=args.poll, existing=args.existing,
+                 inotify=False if args.polling else None) as watcher:
+        try:
+            watcher.run(timeout=args.timeout)
+        except KeyboardInterrupt:
+            pass
+    return 1 if watcher.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,298 @@
+import itertools
+import json
+import os
+
+import numpy as np
+
+
+def to_arrow(obj, fields=(), metadata=True, chunk_rows=None):
+    """
+    Arrow table of a point spectrum or of the parameters of a grid.
+
+    Spec and CompactSpec give one column per signal. Grid gives one row
+    per pixel with 'row' and 'col' columns and one column per
+    Grid.parameter_names entry (signals['params']), only the pixels
+    within Grid.roi with their row and col in the whole grid. Header
+    only grids (load_data=False) and specs (max_rows=0) are streamed
+    from the file block by block.
+
+    Every column is a native byte order, contiguous numpy buffer handed
+    to Arrow without a copy. Big-endian file data and strided views, the
+    columns of the spec table and the parameters of each pixel, are
+    converted once, in a single pass per block that also transposes the
+    block so that its columns are contiguous.
+
+    Parameters
+    ----------
+    obj : Grid, Spec or CompactSpec
+        Object to convert.
+    fields : sequence of str, optional
+        Header entries added as constant columns, e.g. 'Bias>Bias (V)'
+        or 'pos_xy'. Nested header entries are joined by '>'. Numeric
+        strings are converted to float.
+    metadata : bool, optional
+        Store the file name and the whole flattened header as JSON in the
+        schema metadata under b'nanonis_file' and b'nanonis_header'.
+        Default: True
+    chunk_rows : int, optional
+        Grid rows or spec rows per block of streamed objects.
+
+    Returns
+    -------
+    pyarrow.Table
+
+    Raises
+    ------
+    ImportError
+        If pyarrow is not installed.
+    TypeError
+        If obj is not a Grid, Spec or CompactSpec.
+    """
+    pa = _import_pyarrow()
+    batches, schema = _first_batch(_batches(obj, fields, chunk_rows))
+    if metadata:
+        schema = schema.with_metadata(_metadata(obj))
+    return pa.Table.from_batches(list(batches), schema=schema)
+
+
+def write_parquet(obj, path, fields=(), metadata=True, chunk_rows=None, **kwargs):
+    """
+    Write to_arrow(obj) to a Parquet file, block by block.
+
+    Header only objects are read, converted and written one block at a
+    time. kwargs are passed to pyarrow.parquet.ParquetWriter, e.g.
+    compression='zstd'.
+    """
+    pq = _import_pyarrow('parquet')
+    batches, schema = _first_batch(_batches(obj, fields, chunk_rows))
+    if metadata:
+        schema = schema.with_metadata(_metadata(obj))
+    with pq.ParquetWriter(os.fspath(path), schema, **kwargs) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+
+
+def write_dataset(sources, root, partition_by=(), fields=(), metadata=True, chunk_rows=None,
+                  **kwargs):
+    """
+    Write many files into one hive partitioned Parquet dataset.
+
+    Sources are converted and written one at a time, path sources are
+    opened header only and streamed block by block, so the memory used
+    doesn't grow with the number or the size of the files. Every row
+    gets a 'file' column with the base name of its file, and every
+    source is written to root/field=value/.../name-0.parquet, with URL
+    quoted fields and values. Writing a source again replaces its file.
+
+    Parameters
+    ----------
+    sources : iterable of str, path-like, Grid, Spec or CompactSpec
+        Grid (.3ds) or point spectroscopy (.dat) files or loaded objects.
+        Mixing grids and specs gives a dataset of incompatible files.
+    root : str or path-like
+        Dataset directory.
+    partition_by : sequence of str, optional
+        Header entries partitioning the dataset, e.g. ['Date'].
+    fields : sequence of str, optional
+        Other header entries added as columns, see to_arrow.
+    metadata, chunk_rows : optional
+        See to_arrow.
+    **kwargs
+        Passed to pyarrow.dataset.write_dataset, e.g.
+        file_options=ds.ParquetFileFormat().make_write_options(compression='zstd').
+
+    Returns
+    -------
+    list of str
+        Paths of the Parquet files written.
+
+    Examples
+    --------
+    >>> arrow.write_dataset(glob.glob('session/*.dat'), 'specs', partition_by=['Date'],
+    ...                     fields=['X (m)', 'Y (m)'])
+    >>> pyarrow.dataset.dataset('specs', partitioning='hive').to_table(filter=...)
+    """
+    pa = _import_pyarrow()
+    ds = _import_pyarrow('dataset')
+    from .read import open_header
+
+    root = os.fspath(root)
+    columns = list(partition_by) + [f for f in fields if f not in partition_by]
+    partitioning = None
+    written = []
+    for source in sources:
+        obj = open_header(source) if isinstance(source, (str, os.PathLike)) else source
+        name = os.path.basename(obj.fname)
+        batches, schema = _first_batch(_with_file_column(
+            _batches(obj, columns, chunk_rows), name))
+        if metadata:
+            schema = schema.with_metadata(_metadata(obj))
+        if partition_by:
+            partitioning = ds.partitioning(
+                pa.schema([schema.field(f) for f in partition_by]), flavor='hive')
+
+        ds.write_dataset(batches, root, schema=schema, format='parquet',
+                         partitioning=partitioning, basename_template=name + '-{i}.parquet',
+                         existing_data_behavior='overwrite_or_ignore',
+                         file_visitor=lambda f: written.append(f.path), **kwargs)
+    return written
+
+
+def _import_pyarrow(submodule=None):
+    try:
+        import pyarrow
+        if submodule == 'parquet':
+            import pyarrow.parquet
+            return pyarrow.parquet
+        if submodule == 'dataset':
+            import pyarrow.dataset
+            return pyarrow.dataset
+    except ImportError as exc:
+        raise ImportError('Arrow export requires pyarrow to be installed') from exc
+    return pyarrow
+
+
+def _batches(obj, fields, chunk_rows):
+    """
+    Record batches of obj, header fields as constant columns.
+    """
+    pa = _import_pyarrow()
+    kind = type(obj).__name__
+    if kind == 'Grid':
+        names = ['row', 'col'] + list(obj.parameter_names)
+        blocks = _grid_blocks(obj, chunk_rows)
+    elif kind in ('Spec', 'CompactSpec'):
+        names = list(obj.signals)
+        blocks = _spec_blocks(obj, len(names), chunk_rows)
+    else:
+        raise TypeError('Can not convert a {} to an Arrow table'.format(kind))
+
+    fields = list(fields)
+    for field in fields:
+        if field in names:
+            raise ValueError('{} is already a column of {}'.format(field, obj.fname))
+    flat = _flatten(obj.header)
+    values = []
+    for field in fields:
+        if field not in flat:
+            raise KeyError('{} has no {} header entry'.format(obj.fname, field))
+        values.append(_field_value(flat[field]))
+
+    for columns in blocks:
+        num_rows = len(columns[0]) if columns else 0
+        arrays = [pa.array(column) for column in columns]
+        arrays += [pa.repeat(value, num_rows) for value in values]
+        yield pa.RecordBatch.from_arrays(arrays, names=names + fields)
+
+
+def _grid_blocks(grid, chunk_rows):
+    """
+    Column lists of blocks of rows of a loaded or header only grid.
+    """
+    from .read import _roi_bounds
+
+    num_param = grid.header['num_parameters']
+    nx, ny = grid.header['dim_px']
+    row_start, row_stop, col_start, col_stop = _roi_bounds(grid.roi, ny, nx)
+    if grid.signals is not None:
+        yield _pixel_columns(grid.signals['params'], row_start, col_start)
+        return
+
+    # only the pixels of the roi are read, block by block
+    for start, block in grid.iter_chunks(chunk_rows):
+        yield _pixel_columns(block[:, :, :num_param], row_start + start, col_start)
+
+
+def _pixel_columns(params, row_start, col_start):
+    """
+    row, col and parameter columns of a (rows, cols, parameters) block.
+    """
+    rows, cols, num_param = params.shape
+    row = np.repeat(np.arange(row_start, row_start + rows, dtype=np.int32), cols)
+    col = np.tile(np.arange(col_start, col_start + cols, dtype=np.int32), rows)
+    return [row, col] + _columns(params.reshape(rows * cols, num_param))
+
+
+def _spec_blocks(spec, num_columns, chunk_rows):
+    """
+    Column lists of a loaded or header only (max_rows=0) spec.
+    """
+    if getattr(spec, 'max_rows', None) != 0:
+        yield _columns(spec._specdata)
+        return
+
+    empty = True
+    for _, block in spec.iter_chunks(chunk_rows):
+        empty = False
+        # one copy into a (columns, rows) buffer
+        yield list(np.array(list(block.values()), dtype=np.float64))
+    if empty:
+        yield [np.empty(0)] * num_columns
+
+
+def _columns(table):
+    """
+    Contiguous native byte order columns of a 2d (rows, columns) table.
+
+    The columns are rows of a single transposed buffer. Columns of a
+    native column-major table are views without a copy, row-major or
+    big-endian tables are transposed and converted in one copy.
+    """
+    columns = table.T
+    if not (columns.flags.c_contiguous and table.dtype.isnative):
+        columns = np.ascontiguousarray(columns, dtype=table.dtype.newbyteorder('='))
+    return list(columns)
+
+
+def _with_file_column(batches, name):
+    pa = _import_pyarrow()
+    for batch in batches:
+        file_column = pa.DictionaryArray.from_arrays(np.zeros(batch.num_rows, dtype=np.int32),
+                                                     [name])
+        yield pa.RecordBatch.from_arrays(batch.columns + [file_column],
+                                         names=batch.schema.names + ['file'])
+
+
+def _first_batch(batches):
+    """
+    Schema of the first batch and an iterator over all batches.
+    """
+    first = next(batches)
+    return itertools.chain([first], batches), first.schema
+
+
+def _flatten(header, prefix=''):
+    """
+    Header dict with nested entries joined by '>'.
+    """
+    flat = dict()
+    for key, value in header.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, prefix + key + '>'))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def _field_value(value):
+    """
+    Header value as a Python scalar or list for pyarrow.repeat.
+    """
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    elif isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    if isinstance(value, tuple):
+        return list(value)
+    return value
+
+
+def _metadata(obj):
+    header = {key: _field_value(value) for key, value in _flatten(obj.header).items()}
+    return {b'nanonis_file': os.fspath(obj.fname).encode(),
+            b'nanonis_header': json.dumps(header, default=str).encode()}
@@ -5,4 +5,26 @@ nanonis_format_dict = {
     'little endian float 64': '<f8',
 }
 
-nanonis_end_tags = dict(grid=':HEADER_END:', scan='SCANIT_END', spec='[DATA]')
\ No newline at end of file
+nanonis_end_tags = dict(grid=':HEADER_END:', scan='SCANIT_END', spec='[DATA]')
+
+# grid parameters holding the sweep limits and the topography
+grid_sweep_parameters = ('Sweep Start', 'Sweep End')
+grid_topo_parameter = 'Z (m)'
+
+# marker of backward sweep channels, e.g. 'Current [bwd] (A)', and the
+# start of the key of the multi-segment sweep header entry, e.g.
+# 'Segment Start (V), Segment End (V), Settling (s), Integration (s), Steps (xn)'
+grid_bwd_tag = '[bwd]'
+grid_segment_key = 'Segment Start'
+
+# prefix of the channels recorded in a later pass of a multipass scan,
+# e.g. '[P2]_Current', and the header table of the pass settings, one
+# forward and one backward row per pass
+scan_pass_prefix = r'\[P(\d+)\][_ ]?'
+scan_multipass_key = 'multipass-config'
+
+# compressed file extensions understood on top of the Nanonis ones
+compression_exts = ('.gz', '.zst')
+
+# header entries collected per file by stack_specs
+spec_stack_fields = ('X (m)', 'Y (m)', 'Z (m)', 'Bias>Bias (V)', 'Start time', 'Date')
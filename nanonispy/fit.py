@@ -0,0 +1,250 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# default number of spectra fitted together in one batch
+_FIT_CHUNK_SIZE = 4096
+
+FitResult = namedtuple('FitResult', ['params', 'cost', 'converged', 'names'])
+FitResult.__doc__ = """
+Result of fitting every spectrum of a grid or stack.
+
+params has the spatial shape of the data with a last axis of the model
+parameters, cost (sum of squared residuals) and converged (whether an
+accepted step met ftol or xtol before max_iter, False when no downhill
+step could be found) have the spatial shape. names are
+the parameter names of a built-in model, None for custom models. Widths
+and gaps of built-in models are always positive.
+"""
+
+# positive: indices of parameters the model is even in (widths, gaps),
+# reported as their absolute value
+Model = namedtuple('Model', ['func', 'names', 'positive'])
+
+
+def linear(x, p):
+    """
+    p: slope, offset
+    """
+    return p[:, 0:1] * x + p[:, 1:2]
+
+
+def gaussian(x, p):
+    """
+    p: amplitude, center, sigma, offset
+    """
+    return p[:, 0:1] * np.exp(-(x - p[:, 1:2])**2 / (2 * p[:, 2:3]**2)) + p[:, 3:4]
+
+
+def lorentzian(x, p):
+    """
+    p: amplitude, center, fwhm, offset
+    """
+    half_width_sq = (p[:, 2:3] / 2)**2
+    return p[:, 0:1] * half_width_sq / ((x - p[:, 1:2])**2 + half_width_sq) + p[:, 3:4]
+
+
+def dynes(x, p):
+    """
+    BCS density of states with Dynes broadening.
+
+    p: amplitude, gap, gamma, offset, with x, gap and gamma in the same
+    energy units (e.g. bias in V and gap in eV/e).
+    """
+    z = x - 1j * p[:, 2:3]
+    dos = np.abs(np.real(z / np.sqrt(z**2 - p[:, 1:2]**2)))
+    return p[:, 0:1] * dos + p[:, 3:4]
+
+
+models = dict(linear=Model(linear, ('slope', 'offset'), ()),
+              gaussian=Model(gaussian, ('amplitude', 'center', 'sigma', 'offset'), (2,)),
+              lorentzian=Model(lorentzian, ('amplitude', 'center', 'fwhm', 'offset'), (2,)),
+              dynes=Model(dynes, ('amplitude', 'gap', 'gamma', 'offset'), (1, 2)))
+
+
+def fit_spectra(model, x, data, p0, chunk_size=None, workers=1, max_iter=200,
+                ftol=1e-10, xtol=1e-10, jac=None):
+    """
+    Least squares fit of every spectrum, all at once.
+
+    A Levenberg-Marquardt solver vectorized over spectra: each iteration
+    evaluates the model and its Jacobian for a whole batch of spectra
+    with NumPy and solves all the damped normal equations with one
+    batched np.linalg.solve call. Every spectrum keeps its own damping
+    and stops when it converges. Batches of spectra can be fitted in a
+    process pool.
+
+    Parameters
+    ----------
+    model : str or callable
+        Name of a built-in model in models ('linear', 'gaussian',
+        'lorentzian', 'dynes') or a vectorized function f(x, p) taking
+        the (points,) sweep and (spectra, parameters) array and returning
+        (spectra, points) values. With workers > 1 it must be picklable,
+        i.e. defined at module level.
+    x : numpy.ndarray
+        1d sweep signal, e.g. Grid.signals['sweep_signal'].
+    data : numpy.ndarray
+        Spectra along the last axis, e.g. a (ny, nx, points) grid
+        channel. May be memory mapped, only one batch is converted to
+        float64 at a time.
+    p0 : array-like
+        Initial parameters, (parameters,) for all spectra or shaped like
+        data with a last axis of parameters.
+    chunk_size : int, optional
+        Number of spectra per batch. Default: 4096
+    workers : int, optional
+        Number of processes fitting batches. Default: 1
+    max_iter : int, optional
+        Maximum number of iterations per spectrum. Default: 200
+    ftol : float, optional
+        Stop when an accepted step reduces the cost by less than this
+        fraction. Default: 1e-10
+    xtol : float, optional
+        Stop when an accepted step is smaller than this fraction of the
+        parameters. Default: 1e-10
+    jac : callable, optional
+        Analytic Jacobian jac(x, p) returning (spectra, points,
+        parameters). Default is batched forward differences.
+
+    Returns
+    -------
+    FitResult
+        Parameter maps with the spatial shape of data.
+
+    Examples
+    --------
+    >>> result = fit_spectra('lorentzian', grid.signals['sweep_signal'],
+    ...                      grid.signals['LI Demod 1 X (A)'], p0=[1e-12, 0.1, 0.02, 0])
+    >>> center_map = result.params[..., 1]
+    """
+    names = None
+    if isinstance(model, str):
+        try:
+            names = models[model].names
+        except KeyError:
+            raise ValueError('Unknown model {}, use one of {}'.format(model, ', '.join(models)))
+
+    x = np.asarray(x, dtype=np.float64)
+    spatial_shape = data.shape[:-1]
+    spectra = data.reshape(-1, data.shape[-1])
+    num_spectra = spectra.shape[0]
+
+    p0 = np.asarray(p0, dtype=np.float64)
+    num_params = p0.shape[-1]
+    p0 = np.broadcast_to(p0, spatial_shape + (num_params,)).reshape(-1, num_params)
+    if names is not None and num_params != len(names):
+        raise ValueError('Model {} has {} parameters, not {}'.format(model, len(names), num_params))
+
+    chunk_size = _FIT_CHUNK_SIZE if chunk_size is None else max(int(chunk_size), 1)
+    options = dict(max_iter=max_iter, ftol=ftol, xtol=xtol, jac=jac)
+    tasks = ((model, x, spectra[start:start + chunk_size], p0[start:start + chunk_size], options)
+             for start in range(0, num_spectra, chunk_size))
+
+    if workers == 1:
+        results = [_fit_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_fit_chunk, tasks))
+
+    params = np.concatenate([r[0] for r in results]) if results else np.empty((0, num_params))
+    cost = np.concatenate([r[1] for r in results]) if results else np.empty(0)
+    converged = np.concatenate([r[2] for r in results]) if results else np.empty(0, dtype=bool)
+
+    return FitResult(params.reshape(spatial_shape + (num_params,)), cost.reshape(spatial_shape),
+                     converged.reshape(spatial_shape), names)
+
+
+def _fit_chunk(task):
+    """
+    Fit one batch of spectra, entry point of the pool workers.
+    """
+    model, x, spectra, p0, options = task
+    func = models[model].func if isinstance(model, str) else model
+    params, cost, converged = _levenberg_marquardt(func, x, np.asarray(spectra, dtype=np.float64),
+                                                   p0, **options)
+    if isinstance(model, str):
+        positive = list(models[model].positive)
+        params[:, positive] = np.abs(params[:, positive])
+    return params, cost, converged
+
+
+def _levenberg_marquardt(func, x, y, p0, max_iter, ftol, xtol, jac=None):
+    """
+    Batched Levenberg-Marquardt with Marquardt diagonal scaling.
+
+    Returns
+    -------
+    params, cost, converged : numpy.ndarray
+        (spectra, parameters), (spectra,) and (spectra,) arrays.
+    """
+    p = np.array(p0, dtype=np.float64)
+    r = y - func(x, p)
+    cost = np.einsum('ij,ij->i', r, r)
+    damping = np.full(len(p), 1e-3)
+    active = np.isfinite(cost)
+    converged = np.zeros(len(p), dtype=bool)
+
+    for _ in range(max_iter):
+        idx = np.flatnonzero(active)
+        if not idx.size:
+            break
+        p_a, r_a = p[idx], r[idx]
+
+        if jac is None:
+            J = _jacobian(func, x, p_a, y[idx] - r_a)
+        else:
+            J = jac(x, p_a)
+        JTJ = np.einsum('imk,iml->ikl', J, J)
+        grad = np.einsum('imk,im->ik', J, r_a)
+
+        # damp with the curvature of each parameter, floored so that
+        # parameters without effect don't make the system singular
+        diag = np.diagonal(JTJ, axis1=1, axis2=2)
+        diag = np.maximum(diag, 1e-12 * np.maximum(diag.max(axis=1, keepdims=True), 1e-300))
+        A = JTJ + (damping[idx, None] * diag)[:, :, None] * np.eye(p.shape[1])
+        try:
+            step = np.linalg.solve(A, grad[:, :, None])[:, :, 0]
+        except np.linalg.LinAlgError:
+            step = np.einsum('ikl,il->ik', np.linalg.pinv(A), grad)
+
+        p_new = p_a + step
+        r_new = y[idx] - func(x, p_new)
+        cost_new = np.einsum('ij,ij->i', r_new, r_new)
+
+        better = np.isfinite(cost_new) & (cost_new < cost[idx])
+        reduction = (cost[idx] - cost_new) / np.maximum(cost[idx], 1e-300)
+        small_step = np.all(np.abs(step) <= xtol * (np.abs(p_a) + xtol), axis=1)
+
+        accepted = idx[better]
+        p[accepted] = p_new[better]
+        r[accepted] = r_new[better]
+        cost[accepted] = cost_new[better]
+        damping[idx] = np.where(better, damping[idx] / 10, damping[idx] * 10)
+
+        # only accepted steps count, a rejected small step just means
+        # the damping is large
+        done = (better & ((reduction < ftol) | small_step)) | (cost[idx] == 0)
+        converged[idx[done]] = True
+        # damping this large means no downhill step can be found anymore,
+        # left as not converged
+        active[idx[done | (damping[idx] > 1e16)]] = False
+
+    return p, cost, converged
+
+
+def _jacobian(func, x, p, f0):
+    """
+    Forward difference Jacobian, (spectra, points, parameters).
+
+    One model evaluation per parameter, each for the whole batch.
+    """
+    eps = np.sqrt(np.finfo(np.float64).eps)
+    J = np.empty(f0.shape + (p.shape[1],))
+    for k in range(p.shape[1]):
+        h = eps * np.where(p[:, k] != 0, np.abs(p[:, k]), 1.0)
+        p_k = p.copy()
+        p_k[:, k] += h
+        J[:, :, k] = (func(x, p_k) - f0) / h[:, None]
+    return J
@@ -0,0 +1,205 @@
+import functools
+import re
+import sys
+import threading
+from collections.abc import Mapping
+
+import numpy as np
+
+# key layouts shared by every header with the same keys in the same
+# order, so thousands of headers only store their values
+_layouts = dict()
+_layouts_lock = threading.Lock()
+
+
+def _shared_layout(keys):
+    """
+    (keys, key index) pair shared by all headers with these keys.
+    """
+    keys = tuple(sys.intern(key) for key in keys)
+    with _layouts_lock:
+        layout = _layouts.get(keys)
+        if layout is None:
+            layout = (keys, {key: i for i, key in enumerate(keys)})
+            _layouts[keys] = layout
+    return layout
+
+
+# number and integer strings as written in Nanonis headers
+_float_pattern = re.compile(r'^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$')
+_int_pattern = re.compile(r'^\s*[-+]?\d+\s*$')
+_booleans = {'TRUE': True, 'FALSE': False}
+
+
+class LazyHeader(Mapping):
+
+    """
+    Read-only, compact header mapping with lazy numeric conversion.
+
+    Keys are interned and the key layout is shared between every header
+    with the same keys, string values are interned so repeated values
+    (units, dates, 'TRUE') are stored once. Values are converted like
+    TypedHeader values on first access and cached, the unconverted
+    strings are available from raw.
+
+    Parameters
+    ----------
+    header : dict
+        Parsed header with string values, e.g. Spec.header.
+    """
+
+    __slots__ = ('_layout', '_values', '_converted')
+
+    def __init__(self, header):
+        self._layout = _shared_layout(header)
+        self._values = tuple(sys.intern(value) if isinstance(value, str) else value
+                             for value in header.values())
+        self._converted = None
+
+    def __getitem__(self, key):
+        i = self._layout[1][key]
+        if self._converted is None:
+            self._converted = [None] * len(self._values)
+        value = self._converted[i]
+        if value is None:
+            value = _convert_value(self._values[i])
+            self._converted[i] = value
+        return value
+
+    def raw(self, key):
+        """
+        Unconverted string value of key.
+        """
+        return self._values[self._layout[1][key]]
+
+    def __iter__(self):
+        return iter(self._layout[0])
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, dict(zip(self._layout[0], self._values)))
+
+    def __getstate__(self):
+        return dict(zip(self._layout[0], self._values))
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+
+@functools.lru_cache(maxsize=4096)
+def _convert_scalar(value):
+    """
+    bool, int or float stored in a header string, or the string itself.
+
+    Cached, headers of a series share most of their values. Only
+    immutable results, so they can be shared.
+    """
+    if value in _booleans:
+        return _booleans[value]
+    if _int_pattern.match(value):
+        return int(value)
+    if _float_pattern.match(value):
+        return float(value)
+    return value
+
+
+def _convert_list(values):
+    """
+    Array of a multi-valued field if all values are numbers, else a list
+    of converted values.
+    """
+    if all(isinstance(value, str) and _float_pattern.match(value) for value in values):
+        # numpy parses the whole list at once
+        return np.array(values, dtype=np.float64)
+    if values and all(isinstance(value, (int, float)) and not isinstance(value, bool)
+                      for value in values):
+        return np.asarray(values)
+    return [_convert_value(value) for value in values]
+
+
+def _convert_value(value):
+    if isinstance(value, str):
+        if ';' in value:
+            return _convert_list(value.split(';'))
+        return _convert_scalar(value)
+    if isinstance(value, (list, tuple)):
+        return _convert_list(value)
+    if isinstance(value, dict):
+        return TypedHeader(value)
+    return value
+
+
+@functools.lru_cache(maxsize=256)
+def _attribute_names(keys):
+    """
+    Attribute name to key dict, 'Bias>Bias (V)' is header.bias_bias_v.
+
+    The first key wins if two keys normalize to the same name.
+    """
+    names = dict()
+    for key in keys:
+        name = re.sub(r'[^0-9a-zA-Z]+', '_', key).strip('_').lower()
+        if name[:1].isdigit():
+            name = 'n' + name
+        if name and name not in names:
+            names[name] = key
+    return names
+
+
+class TypedHeader(Mapping):
+
+    """
+    Read-only header mapping with values converted to Python types.
+
+    Every value is converted once, when the object is created: 'TRUE'
+    and 'FALSE' to bool, integer and float strings to int and float,
+    ';' separated and list values to float arrays when all items are
+    numbers, nested dicts to TypedHeader. Other strings are kept as is.
+    Values are also available as attributes named after the key in
+    lower case with runs of other characters replaced by '_', e.g.
+    header.bias_bias_v for 'Bias>Bias (V)' or header.z_controller_z_m
+    for 'Z-Controller>Z (m)'.
+
+    Parameters
+    ----------
+    header : dict
+        Parsed header, e.g. Spec.header or Grid.header.
+    """
+
+    __slots__ = ('_layout', '_values')
+
+    def __init__(self, header):
+        self._layout = _shared_layout(header)
+        self._values = tuple(_convert_value(value) for value in header.values())
+
+    def __getitem__(self, key):
+        return self._values[self._layout[1][key]]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[_attribute_names(self._layout[0])[name]]
+        except KeyError:
+            raise AttributeError('{} has no header entry {}'.format(type(self).__name__, name))
+
+    def __dir__(self):
+        return list(super().__dir__()) + list(_attribute_names(self._layout[0]))
+
+    def __iter__(self):
+        return iter(self._layout[0])
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, dict(zip(self._layout[0], self._values)))
+
+    def __getstate__(self):
+        return self._layout[0], self._values
+
+    def __setstate__(self, state):
+        keys, self._values = state
+        self._layout = _shared_layout(keys)
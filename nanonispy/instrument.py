@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+
+
+logger = logging.getLogger('nanonispy')
+
+PhaseRecord = namedtuple('PhaseRecord',
+                         ['cls', 'fname', 'phase', 'wall_time', 'nbytes', 'peak_memory'])
+PhaseRecord.__doc__ = """
+Timing of one load phase of one file.
+
+wall_time is in seconds, nbytes is the number of bytes read from the
+file during the phase and peak_memory the peak traced allocation in
+bytes (None unless memory tracing is enabled).
+"""
+
+# active LoadProfiler instances, shared by all threads
+_profilers = []
+_profilers_lock = threading.Lock()
+
+
+class LoadProfiler:
+
+    """
+    Opt-in instrumentation of NanonisFile loads.
+
+    While active (used as a context manager), every load phase of every
+    Grid, Scan, Spec or NanonisFile created in any thread is recorded:
+    'start_byte', 'read_raw_header', 'parse_header', 'read_data' and
+    'reshape'. Records are also emitted to the 'nanonispy' logger at
+    DEBUG level, which can be used on its own without a profiler.
+
+    Parameters
+    ----------
+    callback : callable, optional
+        Called with each PhaseRecord as soon as the phase finishes.
+    trace_memory : bool, optional
+        Record peak allocation per phase using tracemalloc. This slows
+        down loading noticeably, and with concurrent loads the peak is
+        process wide rather than per file. Default: False
+
+    Attributes
+    ----------
+    records : list of PhaseRecord
+        Every phase recorded so far.
+
+    Examples
+    --------
+    >>> with LoadProfiler() as prof:
+    ...     grids = [Grid(fname) for fname in fnames]
+    >>> print(prof.report())
+    """
+
+    def __init__(self, callback=None, trace_memory=False):
+        self.callback = callback
+        self.trace_memory = trace_memory
+        self.records = []
+        self._lock = threading.Lock()
+        self._started_tracing = False
+
+    def __enter__(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        with _profilers_lock:
+            _profilers.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        with _profilers_lock:
+            _profilers.remove(self)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _add(self, record):
+        with self._lock:
+            self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    def summary(self):
+        """
+        Aggregate records per file class and phase.
+
+        Returns
+        -------
+        dict
+            Keyed by (class name, phase) tuples, values are dicts with
+            'count', 'wall_time' (total), 'max_wall_time', 'nbytes'
+            (total) and 'peak_memory' (max, None if not traced).
+        """
+        stats = dict()
+        with self._lock:
+            records = list(self.records)
+        for rec in records:
+            entry = stats.setdefault((rec.cls, rec.phase),
+                                     dict(count=0, wall_time=0.0, max_wall_time=0.0,
+                                          nbytes=0, peak_memory=None))
+            entry['count'] += 1
+            entry['wall_time'] += rec.wall_time
+            entry['max_wall_time'] = max(entry['max_wall_time'], rec.wall_time)
+            entry['nbytes'] += rec.nbytes or 0
+            if rec.peak_memory is not None:
+                entry['peak_memory'] = max(entry['peak_memory'] or 0, rec.peak_memory)
+        return stats
+
+    def report(self):
+        """
+        Summary as a text table, slowest phases first.
+        """
+        rows = sorted(self.summary().items(), key=lambda item: -item[1]['wall_time'])
+        lines = ['{:<12} {:<16} {:>6} {:>10} {:>10} {:>12} {:>12}'.format(
+                 'class', 'phase', 'count', 'total (s)', 'max (s)', 'bytes', 'peak (B)')]
+        for (cls, phase_name), entry in rows:
+            lines.append('{:<12} {:<16} {:>6} {:>10.4f} {:>10.4f} {:>12} {:>12}'.format(
+                         cls, phase_name, entry['count'], entry['wall_time'],
+                         entry['max_wall_time'], entry['nbytes'],
+                         '-' if entry['peak_memory'] is None else entry['peak_memory']))
+        return '\n'.join(lines)
+
+
+class _Phase:
+
+    """
+    Times one phase and hands the record to active profilers.
+
+    Code inside the phase sets the nbytes attribute to the number of
+    bytes it read.
+    """
+
+    def __init__(self, obj, name):
+        self.obj = obj
+        self.name = name
+        self.nbytes = 0
+
+    def __enter__(self):
+        self._trace = tracemalloc.is_tracing() and any(p.trace_memory for p in _profilers)
+        if self._trace:
+            self._mem_start = tracemalloc.get_traced_memory()[0]
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+        self._t_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall_time = time.perf_counter() - self._t_start
+        peak = None
+        if self._trace:
+            peak = max(tracemalloc.get_traced_memory()[1] - self._mem_start, 0)
+
+        record = PhaseRecord(type(self.obj).__name__, getattr(self.obj, 'fname', None),
+                             self.name, wall_time, self.nbytes, peak)
+        logger.debug('%s %s %s: %.6f s, %d bytes', record.cls, record.fname,
+                     record.phase, record.wall_time, record.nbytes)
+        for profiler in list(_profilers):
+            profiler._add(record)
+
+
+class _NullPhase:
+
+    """
+    Stand-in for _Phase when nothing is listening, costs next to nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_null_phase = _NullPhase()
+
+
+def phase(obj, name):
+    """
+    Context manager timing the load phase called name of obj.
+    """
+    if not _profilers and not logger.isEnabledFor(logging.DEBUG):
+        return _null_phase
+    return _Phase(obj, name)
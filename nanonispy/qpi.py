@@ -0,0 +1,151 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    import scipy.fft as _scipy_fft
+except ImportError:
+    _scipy_fft = None
+
+# default size of the complex temporaries of one batch of maps, energies
+# of a grid or frames of a scan series
+_FFT_CHUNK_SIZE = 1 << 26
+
+_windows = dict(hann=np.hanning, hanning=np.hanning, hamming=np.hamming,
+                blackman=np.blackman, bartlett=np.bartlett)
+
+
+def fft_stack(data, window=None, symmetrize=None, chunk_size=None, workers=1):
+    """
+    Fourier transform magnitude of every energy slice of a grid channel.
+
+    All (ny, nx) maps data[:, :, i] are transformed in batches of
+    energies with a single 2d FFT call per batch, so FFT plans are
+    shared within and across batches. Only one batch of complex
+    temporaries is held in memory at a time, which keeps memory bounded
+    for memory mapped grids. scipy.fft is used if installed, otherwise
+    numpy.fft.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        3d (ny, nx, energies) array, e.g. Grid.signals[channel].
+    window : str or numpy.ndarray, optional
+        Window applied to every map before the transform, one of 'hann',
+        'hamming', 'blackman', 'bartlett' or a (ny, nx) array. Default
+        is no window.
+    symmetrize : str, optional
+        Average the magnitudes over a symmetry group of q-space:
+        'mirror' (qx -> -qx), 'c2' (q -> -q) or 'c4' (90 degree
+        rotations, square grids only). Default is no symmetrization.
+    chunk_size : int, optional
+        Number of energies transformed per batch. Defaults to batches
+        of about 64 MiB of complex values.
+    workers : int, optional
+        Number of threads. Passed to scipy.fft, or used to transform
+        batches concurrently with numpy.fft. Default: 1
+
+    Returns
+    -------
+    numpy.ndarray
+        float32 array shaped like data, with zero q at the center
+        (fftshift) of every map.
+    """
+    ny, nx, num_energy = data.shape
+    if symmetrize not in (None, 'mirror', 'c2', 'c4'):
+        raise ValueError('Unknown symmetrization {}'.format(symmetrize))
+    if symmetrize == 'c4' and nx != ny:
+        raise ValueError('c4 symmetrization needs a square grid, not {} x {}'.format(nx, ny))
+
+    win = _window_2d(window, ny, nx)
+    if chunk_size is None:
+        chunk_size = _FFT_CHUNK_SIZE // (16 * ny * nx)
+    chunk_size = max(int(chunk_size), 1)
+
+    out = np.empty(data.shape, dtype=np.float32)
+
+    def transform(start):
+        stop = min(start + chunk_size, num_energy)
+        # energies first so that each map is contiguous
+        maps = np.ascontiguousarray(np.moveaxis(data[:, :, start:stop], 2, 0))
+        if win is not None:
+            maps = maps * win
+        spectrum = _fft2(maps, workers)
+        magnitude = np.fft.fftshift(np.abs(spectrum), axes=(1, 2))
+        magnitude = _symmetrize(magnitude, symmetrize)
+        out[:, :, start:stop] = np.moveaxis(magnitude, 0, 2)
+
+    starts = range(0, num_energy, chunk_size)
+    if workers == 1 or _scipy_fft is not None:
+        for start in starts:
+            transform(start)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(transform, starts))
+
+    return out
+
+
+def _fft2(maps, workers):
+    """
+    2d FFT of a (maps, ny, nx) batch, scipy.fft with workers threads if
+    installed.
+    """
+    if _scipy_fft is not None:
+        return _scipy_fft.fft2(maps, axes=(1, 2), workers=workers)
+    return np.fft.fft2(maps, axes=(1, 2))
+
+
+def _ifft2(spectra, workers):
+    """
+    Inverse of _fft2.
+    """
+    if _scipy_fft is not None:
+        return _scipy_fft.ifft2(spectra, axes=(1, 2), workers=workers)
+    return np.fft.ifft2(spectra, axes=(1, 2))
+
+
+def _window_2d(window, ny, nx):
+    """
+    (ny, nx) separable window array from its name, None for no window.
+    """
+    if window is None:
+        return None
+    if isinstance(window, str):
+        try:
+            func = _windows[window]
+        except KeyError:
+            raise ValueError('Unknown window {}'.format(window))
+        return np.outer(func(ny), func(nx))
+    window = np.asarray(window)
+    if window.shape != (ny, nx):
+        raise ValueError('Window shape {} does not match maps of shape {}'.format(window.shape, (ny, nx)))
+    return window
+
+
+def _reverse_q(maps, axis):
+    """
+    Map q -> -q along axis of fftshifted maps.
+
+    The zero frequency of an even length axis is at n // 2, so a plain
+    flip is off by one pixel and has to be rolled back.
+    """
+    flipped = np.flip(maps, axis=axis)
+    if maps.shape[axis] % 2 == 0:
+        flipped = np.roll(flipped, 1, axis=axis)
+    return flipped
+
+
+def _symmetrize(maps, symmetrize):
+    """
+    Average (energies, ny, nx) fftshifted maps over a symmetry group.
+    """
+    if symmetrize is None:
+        return maps
+    if symmetrize == 'mirror':
+        return (maps + _reverse_q(maps, 2)) / 2
+    inverted = _reverse_q(_reverse_q(maps, 1), 2)
+    if symmetrize == 'c2':
+        return (maps + inverted) / 2
+    rotated = _reverse_q(np.swapaxes(maps, 1, 2), 1)
+    return (maps + rotated + inverted + _reverse_q(_reverse_q(rotated, 1), 2)) / 4
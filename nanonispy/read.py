@@ -1,9 +1,60 @@
+import contextlib
+import gzip
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import io
+import itertools
 import os
+import re
 import warnings
+import zipfile
+import zlib
 
 import numpy as np
 
-from .constants import nanonis_format_dict, nanonis_end_tags
+from .constants import nanonis_format_dict, nanonis_end_tags, compression_exts
+from .constants import grid_sweep_parameters, grid_topo_parameter, grid_bwd_tag, grid_segment_key
+from .constants import scan_pass_prefix, scan_multipass_key
+from .arrow import to_arrow, write_parquet
+from .header import LazyHeader, TypedHeader, _shared_layout
+from .fit import fit_spectra
+from .instrument import phase
+from .qpi import fft_stack
+from .shared import share
+
+# first range read used to look for the header end tag, doubled each
+# time the tag is not found
+_HEADER_BLOCK_SIZE = 16384
+
+# largest single read into an output array, bounds the temporary
+# buffers of decompressing readers
+_READ_CHUNK_SIZE = 1 << 23
+
+# default size of the blocks of rows streamed by Grid reductions
+_GRID_CHUNK_SIZE = 1 << 26
+
+# loading strategies, see Grid
+_strategies = ('eager', 'memmap', 'chunked', 'auto')
+
+# memory budget of strategy='auto' when the available memory is unknown,
+# and the file it is read from on Linux
+_DEFAULT_MEMORY_BUDGET = 1 << 30
+_MEMINFO = '/proc/meminfo'
+
+# rows between entries of the Spec row offset index, and default rows
+# per block of Spec.iter_chunks
+_SPEC_INDEX_STEP = 1024
+_SPEC_CHUNK_ROWS = 65536
+
+Quantization = namedtuple('Quantization', ['scale', 'offset', 'max_error', 'rms_error'])
+Quantization.__doc__ = """
+Storage of a channel loaded with a storage_dtype.
+
+Physical values are stored values * scale + offset. max_error and
+rms_error are the absolute conversion errors over all finite values, in
+the units of the channel.
+"""
 
 
 class NanonisFile:
@@ -15,8 +66,14 @@ class NanonisFile:
 
     Parameters
     ----------
-    fname : str
-        Name of Nanonis file.
+    fname : str, path-like or file-like
+        Name of Nanonis file, an fsspec URL (e.g. 's3://bucket/a.3ds')
+        or a seekable binary file-like object. File-like objects are
+        never closed, and their name attribute, if any, is used to
+        determine the filetype. Files compressed with gzip ('.3ds.gz')
+        or zstandard ('.sxm.zst', requires the zstandard package) and
+        members of zip archives ('archive.zip/scan.sxm') are
+        decompressed on the fly, without temporary files.
 
     Attributes
     ----------
@@ -34,13 +91,97 @@ class NanonisFile:
         Unproccessed header information.
     """
 
+    # filetype assumed for file-like objects without a usable name
+    _default_filetype = None
+
+    # attributes that are views of the data buffers, not pickled but
+    # rebuilt by _build_views after unpickling
+    _view_attributes = ('signals',)
+
     def __init__(self, fname):
         _data_format = nanonis_format_dict
-        self.datadir, self.basename = os.path.split(fname)
-        self.fname = fname
-        self.filetype = self._determine_filetype()
-        self.byte_offset = self.start_byte()
-        self.header_raw = self.read_raw_header(self.byte_offset)
+        with self._open(fname):
+            self.datadir, self.basename = os.path.split(self.fname)
+            self.filetype = self._determine_filetype()
+            with phase(self, 'start_byte') as p:
+                self.byte_offset = self.start_byte()
+                # whole blocks are read, usually more than the header
+                p.nbytes = len(self._header_block)
+            with phase(self, 'read_raw_header') as p:
+                # decoded from the blocks read by start_byte, no file read
+                p.nbytes = 0 if len(self._header_block) >= self.byte_offset else self.byte_offset
+                self.header_raw = self.read_raw_header(self.byte_offset)
+            # only needed to decode the header, don't keep it around
+            del self._header_block
+
+    @contextlib.contextmanager
+    def _open(self, source=None):
+        """
+        Context manager yielding the binary handle all reads go through.
+
+        The first call opens the file, nested calls reuse the same
+        handle so that a whole load is done through a single handle.
+        The handle is closed when the outermost call exits, unless the
+        source was a file-like object given by the caller.
+
+        Parameters
+        ----------
+        source : str, path-like or file-like, optional
+            Set the file source on first use, see class docstring.
+        """
+        if source is not None and not hasattr(self, '_source'):
+            self._source = source
+            self._fh = None
+            if _is_file_like(source):
+                if not source.seekable():
+                    # range reads need seek, keep a seekable copy in memory
+                    source = io.BytesIO(source.read())
+                self._fh = source
+                self.fname = _source_name(self._source)
+            else:
+                self.fname = source
+
+        if self._fh is not None:
+            yield self._fh
+            return
+
+        if self._source is None:
+            raise ValueError('{} was unpickled from a file-like object and can no longer '
+                             'be read'.format(self.basename))
+        self._fh = _open_source(self._source)
+        try:
+            yield self._fh
+        finally:
+            self._fh.close()
+            self._fh = None
+
+    def __getstate__(self):
+        """
+        Pickle each data buffer once, without the views into it.
+
+        With pickle protocol 5 the buffers can be sent out-of-band.
+        Open handles and caches are dropped, file-like sources can't be
+        pickled so data not loaded can't be read after unpickling.
+        """
+        state = self.__dict__.copy()
+        state['_fh'] = None
+        if '_previews' in state:
+            state['_previews'] = dict()
+        if _is_file_like(state.get('_source')):
+            state['_source'] = None
+        for key in self._view_attributes:
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_views()
+
+    def _build_views(self):
+        """
+        Rebuild the view attributes from the data buffers.
+        """
+        pass
 
     def _determine_filetype(self):
         """
@@ -59,13 +200,15 @@ class NanonisFile:
             'sxm', or 'dat'.
         """
 
-        _, fname_ext = os.path.splitext(self.fname)
+        _, fname_ext = os.path.splitext(_strip_compression_ext(self.fname))
         if fname_ext == '.3ds':
             return 'grid'
         elif fname_ext == '.sxm':
             return 'scan'
         elif fname_ext == '.dat':
             return 'spec'
+        elif _is_file_like(self._source) and self._default_filetype is not None:
+            return self._default_filetype
         else:
             raise UnhandledFileError('{} is not a supported filetype or does not exist'.format(self.basename))
 
@@ -88,8 +231,27 @@ class NanonisFile:
             string.
         """
 
-        with open(self.fname, 'rb') as f:
-            return f.read(byte_offset).decode('utf-8', errors='replace')
+        # reuse the bytes already fetched by start_byte if possible
+        header = getattr(self, '_header_block', b'')
+        if len(header) < byte_offset:
+            with self._open() as f:
+                f.seek(0)
+                header = f.read(byte_offset)
+        return header[:byte_offset].decode('utf-8', errors='replace')
+
+    @property
+    def typed_header(self):
+        """
+        TypedHeader of the parsed header, numbers, booleans and lists
+        converted once and values available as attributes.
+
+        Built on first access and cached, the header dict itself is left
+        unchanged.
+        """
+        typed = self.__dict__.get('_typed_header')
+        if typed is None:
+            typed = self._typed_header = TypedHeader(self.header)
+        return typed
 
     def start_byte(self):
         """
@@ -101,36 +263,206 @@ class NanonisFile:
         __init__, byte_offset is incremented by 4 to account for a
         'start' byte that is not actual data.
 
+        The file is read in blocks of growing size from the start until
+        the end tag is found, so only the header and at most one block
+        of data is ever read.
+
         Returns
         -------
         int
             Size of header in bytes.
         """
 
-        with open(self.fname, 'rb') as f:
-            tag = nanonis_end_tags[self.filetype]
+        tag = nanonis_end_tags[self.filetype].encode()
+        block_size = _HEADER_BLOCK_SIZE
+
+        with self._open() as f:
+            f.seek(0)
+            header = b''
+            tag_pos = -1
+            line_end = -1
+            while True:
+                block = f.read(block_size)
+                header += block
+                if tag_pos == -1:
+                    # tag may straddle two blocks
+                    tag_pos = header.find(tag, max(len(header) - len(block) - len(tag), 0))
+                if tag_pos != -1:
+                    line_end = header.find(b'\n', tag_pos)
+                    if line_end != -1 or not block:
+                        break
+                elif not block:
+                    break
+                block_size *= 2
 
-            # Set to a default value to know if end_tag wasn't found
-            byte_offset = -1
+        if tag_pos == -1:
+            raise FileHeaderNotFoundError(
+                    'Could not find the {} end tag in {}'.format(tag.decode(), self.basename)
+                    )
 
-            for line in f:
-                # Convert from bytes to str
-                try:
-                    entry = line.strip().decode()
-                except UnicodeDecodeError:
-                    warnings.warn('{} has non-uft-8 characters, replacing them.'.format(f.name))
-                    entry = line.strip().decode('utf-8', errors='replace')
-                if tag in entry:
-                    byte_offset = f.tell()
-                    break
+        # first byte after the line the tag is found on
+        byte_offset = len(header) if line_end == -1 else line_end + 1
 
-            if byte_offset == -1:
-                raise FileHeaderNotFoundError(
-                        'Could not find the {} end tag in {}'.format(tag, self.basename)
-                        )
+        try:
+            header[:byte_offset].decode()
+        except UnicodeDecodeError:
+            warnings.warn('{} has non-uft-8 characters, replacing them.'.format(self.basename))
 
+        self._header_block = header
         return byte_offset
 
+    def _read_array(self, offset, count, dtype, out=None):
+        """
+        Range read count items of dtype starting at byte offset.
+
+        Reads straight into the output buffer, no intermediate copies.
+        If the file ends early, the remaining items are left untouched.
+
+        Parameters
+        ----------
+        offset : int
+            Position in bytes of the first item in the file.
+        count : int
+            Number of items to read.
+        dtype : str or numpy.dtype
+            Data type of the items.
+        out : numpy.ndarray, optional
+            C-contiguous array of count items to read into. Defaults to
+            a new array of zeros.
+
+        Returns
+        -------
+        numpy.ndarray
+            1d array of count items, or out if given.
+        int
+            Number of complete items actually read.
+        """
+        if out is None:
+            out = np.zeros(count, dtype=dtype)
+        buf = out.reshape(-1).view(np.uint8)
+
+        with self._open() as f:
+            f.seek(offset)
+            nbytes = _readinto(f, buf)
+
+        return out, nbytes // np.dtype(dtype).itemsize
+
+    def validate(self, checksum=None):
+        """
+        Check the size of the data section against the header.
+
+        Only the header and the file size are needed, so objects created
+        with load_data=False can be validated without loading any data.
+        The size comes from os.stat for local files and from the end
+        position of file-like objects. Compressed files and URLs are
+        streamed once, together with the checksum if requested.
+
+        Parameters
+        ----------
+        checksum : str, optional
+            'crc32', 'adler32', 'xxh32', 'xxh64', 'xxh3_64', 'xxh128'
+            (requires the xxhash package) or a hashlib algorithm name
+            like 'sha256'. Computed in chunks over the file contents,
+            decompressed for compressed files. Default is no checksum.
+
+        Returns
+        -------
+        dict
+            'body_size': bytes after the header.
+            'expected_size': bytes the header describes, None if the
+            header doesn't say (spec files).
+            'complete': whether body_size is at least expected_size.
+            'extra_bytes': bytes after the expected end of the data.
+            'completed', 'total': number of complete and expected units
+            of data, pixels for grids and images (one per channel and
+            direction) for scans, see Scan.validate.
+            'checksum': hex digest, or None.
+        """
+        file_size, digest = None, None
+        if checksum is None:
+            file_size = self._file_size()
+        if file_size is None:
+            file_size, digest = self._stream_file(checksum)
+
+        body_size = max(file_size - self.byte_offset, 0)
+        report = dict(body_size=body_size, expected_size=None, complete=None,
+                      extra_bytes=None, completed=None, total=None, checksum=digest)
+        layout = self._data_layout()
+        if layout is not None:
+            unit_size, total = layout
+            expected_size = unit_size * total
+            report.update(expected_size=expected_size,
+                          complete=body_size >= expected_size,
+                          extra_bytes=max(body_size - expected_size, 0),
+                          completed=min(body_size // unit_size, total),
+                          total=total)
+        return report
+
+    def _data_layout(self):
+        """
+        (unit size in bytes, number of units) of the data section, None
+        if unknown. Units are the pieces completed files are written in.
+        """
+        return None
+
+    def _resolve_strategy(self, strategy, memory_budget):
+        """
+        Loading strategy, 'auto' decided from the header and file size.
+
+        The data is loaded eagerly if its size in memory, data_nbytes,
+        fits in memory_budget, else memory mapped if the file is a
+        complete uncompressed local file, else streamed in chunks.
+        """
+        if strategy not in _strategies:
+            raise ValueError('Unknown loading strategy {}, use one of {}'.format(
+                             strategy, ', '.join(_strategies)))
+        self.data_nbytes = self._loaded_nbytes()
+        if strategy != 'auto':
+            return strategy
+        if memory_budget is None:
+            memory_budget = _default_memory_budget()
+        if self.data_nbytes <= memory_budget:
+            return 'eager'
+        if _is_plain_file(self._source) and self.storage_dtype is None and \
+                self.validate()['complete']:
+            return 'memmap'
+        return 'chunked'
+
+    def _loaded_nbytes(self):
+        """
+        Size in bytes of the data once loaded.
+        """
+        raise NotImplementedError
+
+    def _file_size(self):
+        """
+        Size of the file without reading it, None if that needs a read.
+        """
+        if _is_plain_file(self._source):
+            return os.stat(self._source).st_size
+        if _is_file_like(self._source):
+            with self._open() as f:
+                return f.seek(0, io.SEEK_END)
+        return None
+
+    def _stream_file(self, checksum=None):
+        """
+        Read the whole file in chunks, return its size and checksum.
+        """
+        hasher = None if checksum is None else _new_checksum(checksum)
+        buf = memoryview(bytearray(_READ_CHUNK_SIZE))
+        size = 0
+        with self._open() as f:
+            f.seek(0)
+            while True:
+                n = _readinto(f, buf)
+                if hasher is not None:
+                    hasher.update(buf[:n])
+                size += n
+                if n < len(buf):
+                    break
+        return size, None if hasher is None else hasher.hexdigest()
+
     def set_data_format(self, data_format):
         # default value is '>f4' big endian float 32 bit
         if data_format is None:
@@ -169,12 +501,53 @@ class Grid(NanonisFile):
 
     Parameters
     ----------
-    fname : str
-        Filename for grid file.
+    fname : str, path-like or file-like
+        Filename for grid file, see NanonisFile for other sources.
     header_override : dict, optional
         A dict of key:value to override any corresponding key:value should
         they be wrong or missing in your header. Keys in header_override must
         match keys in Grid.header_raw.
+    roi : tuple of slice, optional
+        (rows, cols) region of interest in pixels, e.g.
+        (slice(10, 20), slice(None)). Only the pixels inside are read
+        from the file and signals have the shape of the region. Slice
+        steps are not supported. Default is the whole grid.
+    load_data : bool, optional
+        If False only the header is read, signals and parameters are
+        None. Methods like topo_preview still work by reading only the
+        bytes they need. Default: True
+    mmap : bool, optional
+        Memory map the data section instead of reading it, signals are
+        then copy-on-write views into the file. Only for uncompressed
+        local files. Default: False
+    strategy : str, optional
+        How the data is loaded: 'eager' reads it into memory, 'memmap'
+        memory maps it (see mmap), 'chunked' only reads the header and
+        leaves the data to streaming methods (iter_chunks, reduce,
+        mean_spectrum, topo_preview) and 'auto' picks one of them from
+        the size of the data described by the header (dim_px, roi,
+        num_parameters, num_sweep_signal, num_channels) and
+        memory_budget. Overrides load_data and mmap, the strategy used
+        is the strategy attribute. Default follows load_data and mmap.
+    memory_budget : int, optional
+        Largest data size in bytes loaded eagerly by strategy='auto'.
+        Default is half of MemAvailable in /proc/meminfo, 1 GiB where
+        it is unknown.
+    threads : int, optional
+        Number of threads reading disjoint blocks of rows concurrently
+        into the preallocated output, with positional reads on a single
+        file descriptor. Each block is converted to native byte order
+        as soon as it is read. Only for uncompressed local files, other
+        sources are read by a single thread. Default: 1
+    storage_dtype : str or numpy.dtype, optional
+        Store the sweep channels with a smaller data type, e.g.
+        'float16' or 'int16', converting block by block of rows as they
+        are read. Integer and float16 channels are scaled, the physical
+        values are signals[channel] * scale + offset, see quantization
+        and dequantize. The parameters block is kept in full precision.
+        Integer types need the range of every channel first, so the
+        file is read twice. Read by a single thread, not with mmap.
+        Default is the file data type.
 
     Attributes
     ----------
@@ -183,7 +556,31 @@ class Grid(NanonisFile):
         otherwise most are string values.
     signals : dict
         Dict keys correspond to channel name, with values being the
-        corresponding data array.
+        corresponding data array. Data read into memory is in native
+        byte order whatever the number of threads, memory mapped data
+        keeps the byte order of the file, data_format.
+    parameter_names : list of str
+        Names of the fixed and experimental parameters, in the order
+        they are stored for each pixel.
+    parameters : numpy.ndarray
+        Structured 2d array over the parameters block of every pixel,
+        with a field per parameter name. Fields are views into the same
+        buffer as signals['params'], e.g. parameters['Z (m)'] is the
+        topography map without any copy.
+    bwd_channels : dict
+        Forward channel name keyed dict of the backward sweep channel
+        names, e.g. {'Current (A)': 'Current [bwd] (A)'}.
+    segments : list of tuple
+        (start, end, points) of each segment of a multi-segment sweep,
+        empty for a single linear sweep. See sweep_view.
+    quantization : dict
+        Channel name keyed dict of Quantization (scale, offset,
+        max_error, rms_error) of the channels stored with storage_dtype,
+        empty otherwise.
+    strategy : str
+        Loading strategy used, 'eager', 'memmap' or 'chunked'.
+    data_nbytes : int
+        Size in bytes of the data in memory when loaded eagerly.
 
     Raises
     ------
@@ -191,14 +588,42 @@ class Grid(NanonisFile):
         If fname does not have a '.3ds' extension.
     """
 
-    def __init__(self, fname, header_override=None, data_format=None):
+    _default_filetype = 'grid'
+    _view_attributes = ('signals', 'parameters')
+
+    def __init__(self, fname, header_override=None, data_format=None, roi=None,
+                 load_data=True, mmap=False, threads=1, storage_dtype=None, strategy=None,
+                 memory_budget=None):
         _is_valid_file(fname, ext='3ds')
-        super().__init__(fname)
-        self.set_data_format(data_format)
-        self.header = _parse_3ds_header(self.header_raw, header_override=header_override)
-        self.signals = self._load_data()
-        self.signals['sweep_signal'] = self._derive_sweep_signal()
-        self.signals['topo'] = self._extract_topo()
+        if strategy is None:
+            strategy = 'chunked' if not load_data else 'memmap' if mmap else 'eager'
+        self._previews = dict()
+        with self._open(fname):
+            super().__init__(fname)
+            self.set_data_format(data_format)
+            with phase(self, 'parse_header'):
+                self.header = _parse_3ds_header(self.header_raw, header_override=header_override)
+            self.parameter_names = _grid_parameter_names(self.header)
+            self.bwd_channels = _grid_bwd_channels(self.header['channels'])
+            self.segments = self._parse_segments()
+            self.roi = roi
+            self.threads = threads
+            self.storage_dtype = _storage_dtype(storage_dtype)
+            self.strategy = self._resolve_strategy(strategy, memory_budget)
+            self.mmap = self.strategy == 'memmap'
+            if self.mmap and self.storage_dtype is not None:
+                raise ValueError('storage_dtype can not be used with mmap')
+            self.quantization = dict()
+            self.signals = None
+            self.parameters = None
+            self._griddata = None
+            self._paramdata = None
+            load_data = self.strategy != 'chunked'
+            if load_data:
+                self.signals = self._load_data()
+        if load_data:
+            self.signals['sweep_signal'] = self._derive_sweep_signal()
+            self.signals['topo'] = self._extract_topo()
 
     def _load_data(self):
         """
@@ -211,73 +636,772 @@ class Grid(NanonisFile):
         """
         # load grid params
         nx, ny = self.header['dim_px']
-        num_sweep = self.header['num_sweep_signal']
-        num_param = self.header['num_parameters']
-        num_chan = self.header['num_channels']
-        data_dict = dict()
 
-        # open and seek to start of data
-        f = open(self.fname, 'rb')
-        f.seek(self.byte_offset)
+        # pixel size in bytes
+        exp_size_per_pix = self._pixel_size()
         data_format = self.data_format
-        griddata = np.fromfile(f, dtype=data_format)
-        f.close()
+        row_start, row_stop, col_start, col_stop = _roi_bounds(self.roi, ny, nx)
+
+        mapped = self._memmap_data() if self.mmap else None
+
+        with phase(self, 'read_data') as p:
+            if mapped is not None:
+                griddata = mapped[row_start:row_stop, col_start:col_stop]
+                count = 0
+            elif self.storage_dtype is not None:
+                griddata, count = self._read_rows_quantized(row_start, row_stop, col_start, col_stop)
+            elif self.threads > 1 and _is_plain_file(self._source):
+                griddata, count = self._read_rows_threaded(row_start, row_stop, col_start, col_stop)
+            else:
+                # zero filled so that incomplete grids are padded, native
+                # byte order like threaded reads
+                dtype = np.dtype(data_format)
+                griddata = np.zeros((row_stop - row_start, col_stop - col_start, exp_size_per_pix),
+                                    dtype=dtype.newbyteorder('='))
+                count = self._read_rows(row_start, row_stop, col_start, col_stop, out=griddata)
+                if not dtype.isnative:
+                    griddata.byteswap(inplace=True)
+            p.nbytes = count * np.dtype(data_format).itemsize
+
+        num_values = griddata.shape[0] * griddata.shape[1] * exp_size_per_pix
+        if mapped is None and count < num_values:
+            warnings.warn('{} is incomplete, {} of {} pixels read, the rest is zero padded'.format(
+                          self.basename, count // exp_size_per_pix,
+                          num_values // exp_size_per_pix))
+
+        self._griddata = griddata
+        with phase(self, 'reshape'):
+            data_dict = self._split_griddata()
 
-        # pixel size in bytes
-        exp_size_per_pix = num_param + num_sweep*num_chan
+        return data_dict
 
-        # resize from 1d to 3d
-        griddata.resize((ny, nx, exp_size_per_pix))
+    def _split_griddata(self):
+        """
+        Channel name keyed dict of views into the 3d data buffer.
+
+        Also sets the parameters structured view. With a storage_dtype
+        the parameters are in their own buffer and the data buffer only
+        holds the channels.
+        """
+        griddata = self._griddata
+        data_dict = dict()
 
         # experimental parameters are first num_param of every pixel
-        params = griddata[:, :, :num_param]
-        data_dict['params'] = params
+        num_param = self.header['num_parameters']
+        if self._paramdata is None:
+            data_dict['params'] = griddata[:, :, :num_param]
+            self.parameters = _parameter_view(griddata, self.parameter_names)
+            num_param = 0
+        else:
+            data_dict['params'] = self._paramdata
+            self.parameters = _parameter_view(self._paramdata, self.parameter_names)
 
         # extract data for each channel
-        for i, chann in enumerate(self.header['channels']):
-            start_ind = num_param + i * num_sweep
-            stop_ind = num_param + (i+1) * num_sweep
-            data_dict[chann] = griddata[:, :, start_ind:stop_ind]
+        for chann in self.header['channels']:
+            sl = self._channel_slice(chann)
+            data_dict[chann] = griddata[:, :, sl.start - num_param:sl.stop - num_param]
 
         return data_dict
 
+    def __getstate__(self):
+        """
+        Pickle the data buffer once, memory mapped data by path only.
+        """
+        state = super().__getstate__()
+        if self.signals is not None:
+            state['_sweep_signal'] = self.signals['sweep_signal']
+            if isinstance(self._griddata, np.memmap):
+                # remapped from the file on unpickling
+                state['_griddata'] = None
+        return state
+
+    def _build_views(self):
+        self.signals = None
+        self.parameters = None
+        sweep_signal = self.__dict__.pop('_sweep_signal', None)
+        if sweep_signal is None:
+            return
+        if self._griddata is None:
+            nx, ny = self.header['dim_px']
+            row_start, row_stop, col_start, col_stop = _roi_bounds(self.roi, ny, nx)
+            self._griddata = self._memmap_data()[row_start:row_stop, col_start:col_stop]
+        self.signals = self._split_griddata()
+        self.signals['sweep_signal'] = sweep_signal
+        self.signals['topo'] = self._extract_topo()
+
+    def _data_layout(self):
+        nx, ny = self.header['dim_px']
+        return self._pixel_size() * np.dtype(self.data_format).itemsize, nx * ny
+
+    def _loaded_nbytes(self):
+        nx, ny = self.header['dim_px']
+        row_start, row_stop, col_start, col_stop = _roi_bounds(self.roi, ny, nx)
+        num_pixels = (row_stop - row_start) * (col_stop - col_start)
+        itemsize = np.dtype(self.data_format).itemsize
+        chann_itemsize = itemsize if self.storage_dtype is None else self.storage_dtype.itemsize
+        return int(num_pixels * (self.header['num_parameters'] * itemsize +
+                                 self.header['num_sweep_signal'] * self.header['num_channels'] * chann_itemsize))
+
+    def _pixel_size(self):
+        """
+        Number of values recorded per pixel, parameters and all channels.
+        """
+        return self.header['num_parameters'] + \
+            self.header['num_sweep_signal'] * self.header['num_channels']
+
+    def _channel_slice(self, channel):
+        """
+        Slice of the values of a pixel belonging to channel or 'params'.
+        """
+        num_param = self.header['num_parameters']
+        num_sweep = self.header['num_sweep_signal']
+        if channel == 'params':
+            return slice(0, num_param)
+        if channel not in self.header['channels']:
+            raise KeyError('{} is not a channel of {}'.format(channel, self.basename))
+        i = self.header['channels'].index(channel)
+        return slice(num_param + i * num_sweep, num_param + (i+1) * num_sweep)
+
+    def _read_rows(self, row_start, row_stop, col_start=0, col_stop=None, out=None, f=None):
+        """
+        Range read the pixels of a block of rows from the file.
+
+        Parameters
+        ----------
+        row_start, row_stop : int
+            Rows to read.
+        col_start, col_stop : int, optional
+            Columns to read, default all.
+        out : numpy.ndarray, optional
+            Zero filled (rows, cols, pixel size) array to read into.
+        f : file-like, optional
+            Handle to read from instead of the handle of the instance,
+            so that blocks can be read concurrently.
+
+        Returns
+        -------
+        numpy.ndarray or int
+            The block read if out is None, else the number of values read.
+        """
+        if f is None:
+            with self._open() as fh:
+                return self._read_rows(row_start, row_stop, col_start, col_stop, out=out, f=fh)
+
+        nx = self.header['dim_px'][0]
+        col_stop = nx if col_stop is None else col_stop
+        pixel_size = self._pixel_size()
+        itemsize = np.dtype(self.data_format).itemsize
+        block = out
+        if block is None:
+            block = np.zeros((row_stop - row_start, col_stop - col_start, pixel_size),
+                             dtype=self.data_format)
+
+        if col_start == 0 and col_stop == nx:
+            # whole rows are contiguous in the file, single range read
+            ranges = [(row_start * nx, block)]
+        else:
+            ranges = [(row * nx + col_start, block[i])
+                      for i, row in enumerate(range(row_start, row_stop))]
+
+        count = 0
+        for first_pixel, dest in ranges:
+            f.seek(self.byte_offset + first_pixel * pixel_size * itemsize)
+            count += _readinto(f, dest.reshape(-1).view(np.uint8)) // itemsize
+
+        return block if out is None else count
+
+    def _read_rows_threaded(self, row_start, row_stop, col_start, col_stop):
+        """
+        Read a block of rows with self.threads concurrent readers.
+
+        The rows are split in blocks of at most about 64 MiB, at least
+        one per thread, each read by a thread straight into its part of
+        the output and byteswapped in place while still in cache.
+
+        Returns
+        -------
+        numpy.ndarray
+            Zero padded (rows, cols, pixel size) native endian array.
+        int
+            Number of values read.
+        """
+        dtype = np.dtype(self.data_format)
+        native = dtype.newbyteorder('=')
+        nrows = row_stop - row_start
+        griddata = np.zeros((nrows, col_stop - col_start, self._pixel_size()), dtype=native)
+
+        row_bytes = griddata[0].nbytes
+        chunk_rows = min(_GRID_CHUNK_SIZE // max(row_bytes, 1), -(-nrows // self.threads))
+        chunk_rows = max(chunk_rows, 1)
+        bounds = [(start, min(start + chunk_rows, row_stop))
+                  for start in range(row_start, row_stop, chunk_rows)]
+
+        def read_block(fd, block_start, block_stop):
+            block = griddata[block_start - row_start:block_stop - row_start]
+            if fd is not None:
+                count = self._read_rows(block_start, block_stop, col_start, col_stop,
+                                        out=block, f=_PositionalReader(fd))
+            else:
+                with open(self._source, 'rb') as f:
+                    count = self._read_rows(block_start, block_stop, col_start, col_stop,
+                                            out=block, f=f)
+            if not dtype.isnative:
+                block.byteswap(inplace=True)
+            return count
+
+        fd = os.open(self._source, os.O_RDONLY | getattr(os, 'O_BINARY', 0)) \
+            if hasattr(os, 'preadv') else None
+        try:
+            with ThreadPoolExecutor(max_workers=self.threads) as pool:
+                counts = list(pool.map(lambda b: read_block(fd, *b), bounds))
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+        return griddata, sum(counts)
+
+    def _read_rows_quantized(self, row_start, row_stop, col_start, col_stop):
+        """
+        Read a block of rows, converting the channels to storage_dtype.
+
+        Rows are read in blocks of at most about 64 MiB into a single
+        temporary block, and the channels of each block are converted
+        into the output before the next one is read. Scaled types first
+        stream the file once for the range of every channel. Sets
+        _paramdata and quantization.
+
+        Returns
+        -------
+        numpy.ndarray
+            Zero padded (rows, cols, channel values) array of
+            storage_dtype, without the parameters.
+        int
+            Number of values read.
+        """
+        channels = self.header['channels']
+        num_param = self.header['num_parameters']
+        num_sweep = self.header['num_sweep_signal']
+        nrows, ncols = row_stop - row_start, col_stop - col_start
+        paramdata = np.zeros((nrows, ncols, num_param), dtype=self.data_format)
+        chandata = np.zeros((nrows, ncols, len(channels) * num_sweep), dtype=self.storage_dtype)
+
+        row_bytes = ncols * self._pixel_size() * np.dtype(self.data_format).itemsize
+        chunk_rows = max(min(_GRID_CHUNK_SIZE // max(row_bytes, 1), nrows), 1)
+        bounds = [(start, min(start + chunk_rows, row_stop))
+                  for start in range(row_start, row_stop, chunk_rows)]
+        buffer = np.empty((chunk_rows, ncols, self._pixel_size()), dtype=self.data_format)
+
+        def read_block(start, stop):
+            block = buffer[:stop - start]
+            block[...] = 0
+            count = self._read_rows(start, stop, col_start, col_stop, out=block)
+            # (rows, cols, channels, points) view of the channel values
+            values = block[:, :, num_param:].reshape(block.shape[:2] + (len(channels), num_sweep))
+            return block, values, count
+
+        scales = [(1.0, 0.0)] * len(channels)
+        with self._open():
+            if _is_scaled(self.storage_dtype):
+                vmin = np.full(len(channels), np.nan)
+                vmax = np.full(len(channels), np.nan)
+                for start, stop in bounds:
+                    _, values, _ = read_block(start, stop)
+                    vmin = np.fmin(vmin, np.fmin.reduce(values, axis=(0, 1, 3)))
+                    vmax = np.fmax(vmax, np.fmax.reduce(values, axis=(0, 1, 3)))
+                scales = [_quantization_scale(self.storage_dtype, lo, hi) for lo, hi in zip(vmin, vmax)]
+
+            errors = np.zeros((len(channels), 3))
+            count = 0
+            for start, stop in bounds:
+                block, values, n = read_block(start, stop)
+                count += n
+                rows = slice(start - row_start, stop - row_start)
+                paramdata[rows] = block[:, :, :num_param]
+                out = chandata[rows].reshape(values.shape)
+                for i, (scale, offset) in enumerate(scales):
+                    max_error, sum_sq, num = _quantize(values[:, :, i], out[:, :, i], scale, offset)
+                    errors[i] = max(errors[i, 0], max_error), errors[i, 1] + sum_sq, errors[i, 2] + num
+
+        self._paramdata = paramdata
+        self.quantization = {chann: _quantization(scale, offset, *error)
+                             for chann, (scale, offset), error in zip(channels, scales, errors)}
+        return chandata, count
+
+    def _dequantized_rows(self, row_start, row_stop):
+        """
+        (rows, cols, pixel size) block of loaded data in the file layout.
+        """
+        params = self._paramdata[row_start:row_stop]
+        block = np.empty(params.shape[:2] + (self._pixel_size(),), dtype=self.data_format)
+        block[:, :, :params.shape[2]] = params
+        for chann in self.header['channels']:
+            block[:, :, self._channel_slice(chann)] = _dequantize(
+                self.signals[chann][row_start:row_stop], self.quantization.get(chann))
+        return block
+
+    def dequantize(self, channel):
+        """
+        Physical values of a channel loaded with a storage_dtype.
+
+        Parameters
+        ----------
+        channel : str
+            Channel name.
+
+        Returns
+        -------
+        numpy.ndarray
+            float32 signals[channel] * scale + offset, or signals[channel]
+            itself if the channel is not scaled.
+        """
+        return _dequantize(self.signals[channel], self.quantization.get(channel))
+
+    def _memmap_data(self):
+        """
+        Memory map the whole data section as a (rows, cols, pixel) array.
+
+        Returns None, with a warning, if the file is too short to hold
+        the full grid so that it gets read and padded instead.
+        """
+        source = self._source
+        if not _is_plain_file(source):
+            raise ValueError('Memory mapping needs an uncompressed local file, not {}'.format(self.basename))
+
+        nx, ny = self.header['dim_px']
+        try:
+            return np.memmap(source, dtype=self.data_format, mode='c', offset=self.byte_offset,
+                             shape=(ny, nx, self._pixel_size()))
+        except ValueError:
+            warnings.warn('{} is incomplete, reading it instead of memory mapping'.format(self.basename))
+            return None
+
+    def iter_chunks(self, chunk_rows=None):
+        """
+        Iterate over blocks of whole rows of pixels.
+
+        Uses the loaded data if any, otherwise streams the rows from the
+        file so that only one block is held in memory at a time. Blocks
+        of data loaded with a storage_dtype are dequantized copies.
+
+        Parameters
+        ----------
+        chunk_rows : int, optional
+            Number of rows per block. Defaults to about 64 MiB per block.
+
+        Yields
+        ------
+        row_start : int
+            Index of the first row of the block within roi, i.e. in
+            signals.
+        block : numpy.ndarray
+            3d (rows, cols, pixel size) array of all values of the
+            pixels within roi, use _channel_slice to pick a channel.
+        """
+        if self.signals is None:
+            nx, ny = self.header['dim_px']
+            roi_start, _, col_start, col_stop = _roi_bounds(self.roi, ny, nx)
+            with self._open():
+                for row_start, row_stop in self._chunk_bounds(chunk_rows):
+                    yield row_start - roi_start, self._read_rows(row_start, row_stop,
+                                                                 col_start, col_stop)
+            return
+
+        for row_start, row_stop in self._chunk_bounds(chunk_rows):
+            if self._paramdata is not None:
+                yield row_start, self._dequantized_rows(row_start, row_stop)
+            else:
+                yield row_start, self._griddata[row_start:row_stop]
+
+    def _chunk_bounds(self, chunk_rows=None):
+        """
+        List of (row_start, row_stop) blocks covering the roi.
+
+        Rows of the loaded data for loaded grids, rows of the file
+        within roi for header only grids.
+        """
+        if self.signals is not None:
+            ny, nx = self._griddata.shape[:2]
+            row_start, row_stop = 0, ny
+        else:
+            nx, ny = self.header['dim_px']
+            row_start, row_stop, col_start, col_stop = _roi_bounds(self.roi, ny, nx)
+            nx = col_stop - col_start
+        if chunk_rows is None:
+            row_bytes = nx * self._pixel_size() * np.dtype(self.data_format).itemsize
+            chunk_rows = _GRID_CHUNK_SIZE // max(row_bytes, 1)
+        chunk_rows = max(int(chunk_rows), 1)
+        return [(start, min(start + chunk_rows, row_stop))
+                for start in range(row_start, row_stop, chunk_rows)]
+
+    def reduce(self, func, channel, axis=None, combine=None, chunk_rows=None, workers=1):
+        """
+        Reduce a channel block by block, without loading the whole grid.
+
+        Equivalent to func(signals[channel], axis=axis) but only one
+        block of rows per worker is held in memory at a time. Only the
+        pixels within roi are reduced. When axis
+        includes the row axis 0, the results of all blocks are stacked
+        along a new first axis and passed to combine, so func must be
+        such that func(partials, axis=0) gives the full result (np.sum,
+        np.min, np.max...) or combine must be given.
+
+        Parameters
+        ----------
+        func : callable
+            Called as func(block, axis=axis) on each (rows, cols, sweep)
+            block of the channel.
+        channel : str
+            Channel name, or 'params' for the parameters block.
+        axis : int or tuple of int, optional
+            Axes to reduce, default all.
+        combine : callable, optional
+            Called with the stacked block results when reducing along
+            rows. Default: func(partials, axis=0).
+        chunk_rows : int, optional
+            Number of rows per block, see iter_chunks.
+        workers : int, optional
+            Number of threads reducing blocks concurrently, each with its
+            own file handle. Default: 1
+
+        Returns
+        -------
+        numpy.ndarray
+            Reduced channel.
+
+        Examples
+        --------
+        Histogram of a channel that doesn't fit in memory
+
+        >>> grid = Grid(fname, load_data=False)
+        >>> counts = grid.reduce(lambda a, axis: np.histogram(a, 100, (-1e-9, 1e-9))[0],
+        ...                      'Current (A)', combine=lambda p: p.sum(axis=0))
+        """
+        sl = self._channel_slice(channel)
+        if axis is None:
+            axis = (0, 1, 2)
+        axis = tuple(a % 3 for a in np.atleast_1d(axis))
+        nx, ny = self.header['dim_px']
+        _, _, col_start, col_stop = _roi_bounds(self.roi, ny, nx)
+
+        def reduce_block(bounds):
+            row_start, row_stop = bounds
+            if self.signals is not None:
+                values = _dequantize(self.signals[channel][row_start:row_stop],
+                                     self.quantization.get(channel))
+            elif workers == 1:
+                values = self._read_rows(row_start, row_stop, col_start, col_stop)[:, :, sl]
+            else:
+                with _open_source(self._source) as f:
+                    values = self._read_rows(row_start, row_stop, col_start, col_stop,
+                                             f=f)[:, :, sl]
+            return func(values, axis=axis)
+
+        bounds = self._chunk_bounds(chunk_rows)
+        if workers == 1:
+            with self._open():
+                partials = [reduce_block(b) for b in bounds]
+        else:
+            if self.signals is None and _is_file_like(self._source):
+                raise ValueError('Concurrent reads need a filename, not a file-like object')
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                partials = list(pool.map(reduce_block, bounds))
+
+        if 0 not in axis:
+            return np.concatenate(partials, axis=0)
+        if combine is None:
+            return func(np.stack(partials), axis=0)
+        return combine(np.stack(partials))
+
+    def mean_spectrum(self, channel, chunk_rows=None, workers=1):
+        """
+        Spatially averaged spectrum of a channel, streamed block by block.
+
+        Sums are accumulated in float64, see reduce for the parameters.
+
+        Returns
+        -------
+        numpy.ndarray
+            1d float64 mean over all pixels within roi, same as
+            signals[channel].mean(axis=(0, 1), dtype=np.float64).
+        """
+        total = self.reduce(lambda a, axis: a.sum(axis=axis, dtype=np.float64), channel,
+                            axis=(0, 1), chunk_rows=chunk_rows, workers=workers)
+        nx, ny = self.header['dim_px']
+        row_start, row_stop, col_start, col_stop = _roi_bounds(self.roi, ny, nx)
+        return total / ((row_stop - row_start) * (col_stop - col_start))
+
     def _derive_sweep_signal(self):
         """
         Computer sweep signal.
 
         Based on start and stop points of sweep signal in header, and
-        number of sweep signal points.
+        number of sweep signal points. Multi-segment sweeps are a
+        linear ramp per segment.
 
         Returns
         -------
         numpy.ndarray
             1d sweep signal, should be sample bias in most cases.
         """
+        if self.segments:
+            return np.concatenate([np.linspace(start, end, points, dtype=np.float32)
+                                   for start, end, points in self.segments])
+
         # find sweep signal start and end from a given pixel value
-        sweep_start, sweep_end = self.signals['params'][0, 0, :2]
+        start_name, end_name = grid_sweep_parameters
+        if start_name in self.parameter_names and end_name in self.parameter_names:
+            sweep_start = self.parameters[start_name][0, 0]
+            sweep_end = self.parameters[end_name][0, 0]
+        else:
+            sweep_start, sweep_end = self.signals['params'][0, 0, :2]
         num_sweep_signal = self.header['num_sweep_signal']
 
         return np.linspace(sweep_start, sweep_end, num_sweep_signal, dtype=np.float32)
 
+    def _parse_segments(self):
+        """
+        (start, end, points) of each sweep segment from the header.
+
+        Empty list if the header has no segment entry, or with a warning
+        if it doesn't add up to the number of sweep points.
+        """
+        segments = _grid_segments(self.header)
+        num_sweep_signal = self.header['num_sweep_signal']
+        if segments and sum(points for _, _, points in segments) != num_sweep_signal:
+            warnings.warn('Sweep segments of {} do not add up to {} points, ignoring them'.format(
+                          self.basename, num_sweep_signal))
+            return []
+        return segments
+
+    def sweep_view(self, channel, direction='forward', segment=None, align=True):
+        """
+        Zero-copy view of one sweep direction and segment of a channel.
+
+        Parameters
+        ----------
+        channel : str
+            Forward channel name, e.g. 'Current (A)'.
+        direction : str, optional
+            'forward' or 'backward', backward reads the '[bwd]' channel
+            of channel. Default: 'forward'
+        segment : int, optional
+            Index of the segment in segments. Default is the whole sweep.
+        align : bool, optional
+            Backward sweeps are recorded from the end of the sweep to its
+            start, but stored in sweep order like the forward channel. If
+            True, the backward data is returned as stored, lined up with
+            the sweep signal, else the data and the sweep axis are both
+            reversed (negative stride views) into acquisition order.
+            Default: True
+
+        Returns
+        -------
+        sweep : numpy.ndarray
+            1d sweep signal of the view.
+        data : numpy.ndarray
+            3d (rows, cols, points) view into signals, no data is copied.
+            Values of channels loaded with a storage_dtype are the stored
+            values, see quantization.
+        """
+        if self.signals is None:
+            raise ValueError('Data of {} is not loaded'.format(self.basename))
+        if direction not in ('forward', 'backward'):
+            raise ValueError('Unknown sweep direction {}'.format(direction))
+
+        if direction == 'forward':
+            data = self.signals[channel]
+        else:
+            try:
+                data = self.signals[self.bwd_channels[channel]]
+            except KeyError:
+                raise KeyError('{} has no backward sweep of {}'.format(self.basename, channel))
+        sweep = self.signals['sweep_signal']
+
+        if segment is not None:
+            if not self.segments:
+                raise ValueError('{} is a single segment sweep'.format(self.basename))
+            start = sum(points for _, _, points in self.segments[:segment])
+            sl = slice(start, start + self.segments[segment][2])
+            data = data[:, :, sl]
+            sweep = sweep[sl]
+
+        if direction == 'backward' and not align:
+            data = data[:, :, ::-1]
+            sweep = sweep[::-1]
+
+        return sweep, data
+
     def _extract_topo(self):
         """
         Extract topographic map based on z-controller height at each
         pixel.
 
         The data is already extracted, though it lives in the signals
-        dict under the key 'parameters'. Currently the 4th column is the
-        Z (m) information at each pixel, should update this to be more
-        general in case the fixed/experimental parameters are not the
-        same for other Nanonis users.
+        dict under the key 'params'. The parameter is found by name
+        (constants.grid_topo_parameter, 'Z (m)'). For headers without
+        it, the 5th parameter is used as before with a warning.
 
         Returns
         -------
         numpy.ndarray
-            Copy of already extracted data to be more easily accessible
+            View of already extracted data to be more easily accessible
             in signals dict.
         """
+        if grid_topo_parameter in self.parameter_names:
+            return self.parameters[grid_topo_parameter]
+        warnings.warn('No {} parameter in {}, using the 5th parameter as topography'.format(
+                      grid_topo_parameter, self.basename))
         return self.signals['params'][:, :, 4]
 
+    def fft_stack(self, channel, window=None, symmetrize=None, chunk_size=None, workers=1):
+        """
+        Fourier transform magnitude of every energy slice of a channel.
+
+        For quasiparticle interference analysis. See qpi.fft_stack for
+        the parameters. Memory mapped grids (mmap=True) are transformed
+        batch by batch of energies without being loaded in memory.
+
+        Returns
+        -------
+        numpy.ndarray
+            float32 (ny, nx, num_sweep_signal) q-space magnitudes.
+        """
+        if self.signals is None:
+            raise ValueError('fft_stack needs loaded data, use mmap=True for grids larger than memory')
+        return fft_stack(self.dequantize(channel), window=window, symmetrize=symmetrize,
+                         chunk_size=chunk_size, workers=workers)
+
+    def fit(self, channel, model, p0, direction='forward', segment=None, **kwargs):
+        """
+        Fit the spectrum of every pixel of a channel at once.
+
+        See fit.fit_spectra for the model and the other keyword
+        arguments (chunk_size, workers, max_iter, ftol, xtol, jac).
+
+        Parameters
+        ----------
+        channel : str
+            Channel name.
+        model : str or callable
+            Built-in model name ('linear', 'gaussian', 'lorentzian',
+            'dynes') or vectorized model function.
+        p0 : array-like
+            Initial parameters, for all pixels or as (ny, nx, parameters).
+        direction, segment : optional
+            Part of the sweep to fit, see sweep_view.
+
+        Returns
+        -------
+        fit.FitResult
+            (ny, nx, parameters) parameter maps, (ny, nx) cost and
+            convergence maps.
+        """
+        if self.signals is None:
+            raise ValueError('fit needs loaded data, use mmap=True for grids larger than memory')
+        sweep, data = self.sweep_view(channel, direction=direction, segment=segment)
+        if direction == 'backward':
+            channel = self.bwd_channels[channel]
+        data = _dequantize(data, self.quantization.get(channel))
+        return fit_spectra(model, sweep, data, p0, **kwargs)
+
+    def to_shared_memory(self, name=None):
+        """
+        Publish signals in named shared memory for other processes.
+
+        Each signal is copied once into its own shared block, except
+        topo which is rebuilt as a view of its params column. Consumer
+        processes then get zero-copy views with nanonispy.attach(name)
+        instead of unpickling the arrays.
+
+        Parameters
+        ----------
+        name : str, optional
+            Name of the published grid, random by default.
+
+        Returns
+        -------
+        shared.SharedGrid
+            Owner handle, pass its name attribute to the consumers and
+            call its unlink method when done. See shared.SharedGrid.
+        """
+        if self.signals is None:
+            raise ValueError('to_shared_memory needs loaded data')
+        if grid_topo_parameter in self.parameter_names:
+            topo_index = self.parameter_names.index(grid_topo_parameter)
+        else:
+            topo_index = 4
+        return share(self.signals, self.header, name=name, derived={'topo': ('params', topo_index)})
+
+    def to_arrow(self, fields=(), metadata=True, chunk_rows=None):
+        """
+        Arrow table of the parameters of every pixel, signals['params'].
+
+        One row per pixel with 'row', 'col' and one column per
+        parameter_names entry. Header only grids are streamed from the
+        file. See arrow.to_arrow for the parameters.
+
+        Returns
+        -------
+        pyarrow.Table
+        """
+        return to_arrow(self, fields=fields, metadata=metadata, chunk_rows=chunk_rows)
+
+    def write_parquet(self, path, fields=(), metadata=True, chunk_rows=None, **kwargs):
+        """
+        Write the to_arrow table to a Parquet file block by block.
+
+        See arrow.write_parquet.
+        """
+        write_parquet(self, path, fields=fields, metadata=metadata, chunk_rows=chunk_rows,
+                      **kwargs)
+
+    def topo_preview(self, max_px=128):
+        """
+        Downsampled topography map for thumbnails.
+
+        Takes every k-th pixel of every k-th row, with k the smallest
+        step giving at most max_px pixels per side. If the data is not
+        loaded only the topography value of those pixels is read from
+        the file. Only pixels within roi are previewed. Previews are
+        cached, and coarser previews are derived from cached finer ones
+        without reading the file again.
+
+        Parameters
+        ----------
+        max_px : int, optional
+            Maximum size in pixels of the preview. Default: 128
+
+        Returns
+        -------
+        numpy.ndarray
+            2d topography preview, equal to signals['topo'][::k, ::k].
+        """
+        nx, ny = self.header['dim_px']
+        row_start, row_stop, col_start, col_stop = _roi_bounds(self.roi, ny, nx)
+        step = _preview_step(col_stop - col_start, row_stop - row_start, max_px)
+
+        def read_preview(step):
+            if self.signals is not None:
+                return self.signals['topo'][::step, ::step]
+
+            if grid_topo_parameter in self.parameter_names:
+                topo_index = self.parameter_names.index(grid_topo_parameter)
+            else:
+                topo_index = 4
+            pixel_size = self._pixel_size()
+            itemsize = np.dtype(self.data_format).itemsize
+            rows, cols = range(row_start, row_stop, step), range(col_start, col_stop, step)
+            topo = np.zeros((len(rows), len(cols)), dtype=self.data_format)
+            with self._open():
+                for i, row in enumerate(rows):
+                    for j, col in enumerate(cols):
+                        offset = self.byte_offset + \
+                            ((row * nx + col) * pixel_size + topo_index) * itemsize
+                        self._read_array(offset, 1, self.data_format, out=topo[i, j:j + 1])
+            return topo
+
+        return _cached_preview(self._previews, 'topo', step, read_preview)
+
 
 class Scan(NanonisFile):
 
@@ -299,8 +1423,32 @@ class Scan(NanonisFile):
 
     Parameters
     ----------
-    fname : str
-        Filename for scan file.
+    fname : str, path-like or file-like
+        Filename for scan file, see NanonisFile for other sources.
+    channels : list of str, optional
+        Names of the channels to load. Only the bytes of these channels
+        are read from the file. Default is all channels.
+    passes : list of int, optional
+        Numbers of the passes of a multipass scan to load, only the
+        bytes of their channels are read. Combined with channels, the
+        channels of these passes in channels are loaded. Default is all
+        passes.
+    load_data : bool, optional
+        If False only the header is read and signals is None. Methods
+        like preview still work by reading only the bytes they need.
+        Default: True
+    storage_dtype : str or numpy.dtype, optional
+        Store the channels with a smaller data type, e.g. 'float16' or
+        'int16', converting one channel at a time as it is read. See
+        Grid. Default is the file data type.
+    strategy : str, optional
+        'eager', 'memmap', 'chunked' or 'auto', see Grid. The size of
+        the data comes from scan_pixels and data_info. Chunked scans
+        only read the header, see preview. Overrides load_data.
+    memory_budget : int, optional
+        Largest data size in bytes loaded eagerly by strategy='auto'.
+        Default is half of MemAvailable in /proc/meminfo, 1 GiB where
+        it is unknown.
 
     Attributes
     ----------
@@ -311,61 +1459,338 @@ class Scan(NanonisFile):
         Dict keys correspond to channel name, values correspond to
         another dict whose keys are simply forward and backward arrays
         for the scan image.
+    passes : dict
+        Pass number keyed dict of the loaded channels of each pass of a
+        multipass scan, by channel name without the pass prefix, e.g.
+        passes[2]['Current']['forward'] is
+        signals['[P2]_Current']['forward'], the same array. Channels
+        without a pass prefix are in pass 1. None if not loaded.
+    multipass_config : dict
+        Pass number keyed dict of the forward and backward rows of the
+        Multipass-Config header table, e.g.
+        multipass_config[2]['backward']['Bias_override_value']. Empty
+        for single pass scans.
+    quantization : dict
+        Channel name keyed dict of Quantization of the channels stored
+        with storage_dtype, empty otherwise. Both directions of a
+        channel share the scale.
+    strategy : str
+        Loading strategy used, 'eager', 'memmap' or 'chunked'.
+    data_nbytes : int
+        Size in bytes of the data in memory when loaded eagerly.
 
     Raises
     ------
     UnhandledFileError
         If fname does not have a '.sxm' extension.
+    KeyError
+        If a channel does not exist, or a pass has no recorded channels.
     """
 
-    def __init__(self, fname, data_format=None):
+    _default_filetype = 'scan'
+    _view_attributes = ('signals', 'passes')
+
+    def __init__(self, fname, data_format=None, channels=None, load_data=True, storage_dtype=None,
+                 strategy=None, memory_budget=None, passes=None):
         _is_valid_file(fname, ext='sxm')
-        super().__init__(fname)
-        self.set_data_format(data_format)
-        self.header = _parse_sxm_header(self.header_raw)
+        if strategy is None:
+            strategy = 'eager' if load_data else 'chunked'
+        self._previews = dict()
+        with self._open(fname):
+            super().__init__(fname)
+            self.set_data_format(data_format)
+            with phase(self, 'parse_header'):
+                self.header = _parse_sxm_header(self.header_raw)
+
+            # data begins with 4 byte code, add 4 bytes to offset instead
+            self.byte_offset += 4
+
+            # load data
+            self.multipass_config = _multipass_config(self.header)
+            self.channels = self._select_passes(channels, passes)
+            self.storage_dtype = _storage_dtype(storage_dtype)
+            self.strategy = self._resolve_strategy(strategy, memory_budget)
+            if self.strategy == 'memmap' and self.storage_dtype is not None:
+                raise ValueError('storage_dtype can not be used with mmap')
+            self.quantization = dict()
+            self._scandata = None
+            self.signals = self._load_data() if self.strategy != 'chunked' else None
+            self.passes = self._split_passes()
+
+    def _load_data(self):
+        """
+        Read binary data for Nanonis sxm file.
+
+        Returns
+        -------
+        dict
+            Channel name keyed dict of each channel array.
+        """
+        all_channs = list(self.header['data_info']['Name'])
+        channs = all_channs if self.channels is None else list(self.channels)
+        for chann in channs:
+            if chann not in all_channs:
+                raise KeyError('{} is not a channel of {}'.format(chann, self.basename))
+        nchanns = len(channs)
+        nx, ny = self.header['scan_pixels']
+
+        # assume both directions for now
+        ndir = 2
+
+        if self.strategy == 'memmap':
+            self._scandata = self._memmap_data()
+            self._scan_channels = channs
+            return self._split_scandata()
+
+        data_format = self.data_format
+        storage_dtype = data_format if self.storage_dtype is None else self.storage_dtype
+        scandata_shaped = np.empty((nchanns, ndir, ny, nx), dtype=storage_dtype)
+        chann_size = ndir * ny * nx
+
+        with phase(self, 'read_data') as p:
+            if self.storage_dtype is not None:
+                count = self._read_channels_quantized(channs, scandata_shaped)
+            elif channs == all_channs:
+                _, count = self._read_array(self.byte_offset, scandata_shaped.size,
+                                            data_format, out=scandata_shaped)
+            else:
+                # each channel is contiguous in the file, one range read per
+                # run of channels adjacent in the file, e.g. a whole pass
+                count = 0
+                indices = [all_channs.index(chann) for chann in channs]
+                start = 0
+                for stop in range(1, nchanns + 1):
+                    if stop < nchanns and indices[stop] == indices[stop - 1] + 1:
+                        continue
+                    offset = self.byte_offset + indices[start] * chann_size * scandata_shaped.itemsize
+                    _, n = self._read_array(offset, (stop - start) * chann_size, data_format,
+                                            out=scandata_shaped[start:stop])
+                    count += n
+                    start = stop
+            p.nbytes = count * np.dtype(data_format).itemsize
+
+        if count != scandata_shaped.size:
+            raise ValueError('{} is incomplete, expected {} values but found {}'.format(
+                             self.basename, scandata_shaped.size, count))
+
+        self._scandata = scandata_shaped
+        self._scan_channels = channs
+        with phase(self, 'reshape'):
+            data_dict = self._split_scandata()
+
+        return data_dict
+
+    def _read_channels_quantized(self, channs, out):
+        """
+        Read channels one by one, converting them to storage_dtype.
+
+        Only one channel (both directions) is held in the file data
+        type at a time. Sets quantization.
+
+        Returns
+        -------
+        int
+            Number of values read.
+        """
+        all_channs = list(self.header['data_info']['Name'])
+        values = np.empty(out.shape[1:], dtype=self.data_format)
+        count = 0
+        for i, chann in enumerate(channs):
+            offset = self.byte_offset + all_channs.index(chann) * values.nbytes
+            _, n = self._read_array(offset, values.size, self.data_format, out=values)
+            count += n
+            scale, value_offset = 1.0, 0.0
+            if _is_scaled(self.storage_dtype):
+                scale, value_offset = _quantization_scale(self.storage_dtype, np.fmin.reduce(values, axis=None),
+                                                          np.fmax.reduce(values, axis=None))
+            self.quantization[chann] = _quantization(scale, value_offset,
+                                                     *_quantize(values, out[i], scale, value_offset))
+        return count
+
+    def dequantize(self, channel, direction='forward'):
+        """
+        Physical values of a channel loaded with a storage_dtype.
+
+        Returns
+        -------
+        numpy.ndarray
+            float32 signals[channel][direction] * scale + offset, or the
+            signal itself if the channel is not scaled.
+        """
+        return _dequantize(self.signals[channel][direction], self.quantization.get(channel))
+
+    def validate(self, checksum=None):
+        """
+        Check the size of the data section against the header.
+
+        See NanonisFile.validate. The data is stored image by image, all
+        lines of the forward image of a channel, then of its backward
+        image, then the next channel, so 'completed' and 'total' count
+        whole images. The report also has:
+
+        'image': (channel, direction) of the first incomplete image,
+        None if the scan is complete.
+        'image_lines': number of complete lines of that image.
+        """
+        report = super().validate(checksum=checksum)
+        nx, ny = self.header['scan_pixels']
+        line_size = nx * np.dtype(self.data_format).itemsize
+        lines = min(report['body_size'] // line_size, report['total'] * ny)
+        image, image_lines = None, None
+        if report['completed'] < report['total']:
+            channel = self.header['data_info']['Name'][report['completed'] // 2]
+            image = (channel, ('forward', 'backward')[report['completed'] % 2])
+            image_lines = lines % ny
+        report.update(image=image, image_lines=image_lines)
+        return report
+
+    def _data_layout(self):
+        nx, ny = self.header['scan_pixels']
+        nchanns = len(self.header['data_info']['Name'])
+        # both directions of every channel, see _load_data
+        return nx * ny * np.dtype(self.data_format).itemsize, nchanns * 2
+
+    def _loaded_nbytes(self):
+        nx, ny = self.header['scan_pixels']
+        nchanns = len(self.header['data_info']['Name'] if self.channels is None else self.channels)
+        dtype = np.dtype(self.data_format) if self.storage_dtype is None else self.storage_dtype
+        return nchanns * 2 * int(nx) * int(ny) * dtype.itemsize
+
+    def _split_scandata(self):
+        """
+        Channel name keyed dict of forward/backward views into the data.
+
+        Memory mapped data holds all channels of the file.
+        """
+        data_dict = dict()
+        if isinstance(self._scandata, np.memmap):
+            indices = [list(self.header['data_info']['Name']).index(c) for c in self._scan_channels]
+        else:
+            indices = range(len(self._scan_channels))
+
+        # extract data for each channel
+        for i, chann in zip(indices, self._scan_channels):
+            chann_dict = dict(forward=self._scandata[i, 0, :, :],
+                              backward=self._scandata[i, 1, :, :])
+            data_dict[chann] = chann_dict
+
+        return data_dict
+
+    def _memmap_data(self):
+        """
+        Memory map the whole data section as a (channels, 2, ny, nx) array.
+        """
+        if not _is_plain_file(self._source):
+            raise ValueError('Memory mapping needs an uncompressed local file, not {}'.format(self.basename))
+        nx, ny = self.header['scan_pixels']
+        nchanns = len(self.header['data_info']['Name'])
+        try:
+            return np.memmap(self._source, dtype=self.data_format, mode='c', offset=self.byte_offset,
+                             shape=(nchanns, 2, ny, nx))
+        except ValueError:
+            raise ValueError('{} is incomplete and can not be memory mapped'.format(self.basename))
+
+    def __getstate__(self):
+        """
+        Pickle the data buffer once, memory mapped data by path only.
+        """
+        state = super().__getstate__()
+        if isinstance(state.get('_scandata'), np.memmap):
+            # remapped from the file on unpickling
+            state['_scandata'] = None
+        return state
+
+    def _build_views(self):
+        self.signals = None
+        if getattr(self, '_scandata', None) is None and getattr(self, 'strategy', None) == 'memmap':
+            self._scandata = self._memmap_data()
+        if getattr(self, '_scandata', None) is not None:
+            self.signals = self._split_scandata()
+        self.passes = self._split_passes()
+
+    def _select_passes(self, channels, passes):
+        """
+        Channels to load for a selection of passes, in file order.
+        """
+        if passes is None:
+            return channels
+        by_pass = _scan_passes(self.header['data_info']['Name'])
+        for number in passes:
+            if number in self.multipass_config and number not in by_pass:
+                raise KeyError('{} recorded no channels in pass {}'.format(self.basename, number))
+            if number not in by_pass:
+                raise KeyError('{} has no pass {}'.format(self.basename, number))
+        selected = [name for number in sorted(by_pass) if number in passes
+                    for name, _ in by_pass[number]]
+        if channels is not None:
+            selected = [chann for chann in channels if chann in selected]
+        return selected
+
+    def _split_passes(self):
+        """
+        Pass number keyed dict of the loaded channels of each pass.
+        """
+        if self.signals is None:
+            return None
+        passes = dict()
+        for number, channs in _scan_passes(self.header['data_info']['Name']).items():
+            views = {base: self.signals[name] for name, base in channs if name in self.signals}
+            if views:
+                passes[number] = views
+        return passes
 
-        # data begins with 4 byte code, add 4 bytes to offset instead
-        self.byte_offset += 4
 
-        # load data
-        self.signals = self._load_data()
+    def preview(self, channel, max_px=128, direction='forward'):
+        """
+        Downsampled channel image for thumbnails.
 
+        Takes every k-th pixel of every k-th line, with k the smallest
+        step giving at most max_px pixels per side. If the data is not
+        loaded, only every k-th line of the channel is read from the
+        file, so a preview costs about 1/k of a full read. Previews are
+        cached, and coarser previews are derived from cached finer ones
+        without reading the file again.
 
-    def _load_data(self):
-        """
-        Read binary data for Nanonis sxm file.
+        Parameters
+        ----------
+        channel : str
+            Channel name, as in header['data_info']['Name'].
+        max_px : int, optional
+            Maximum size in pixels of the preview. Default: 128
+        direction : str, optional
+            'forward' or 'backward'. Default: 'forward'
 
         Returns
         -------
-        dict
-            Channel name keyed dict of each channel array.
+        numpy.ndarray
+            2d preview, equal to signals[channel][direction][::k, ::k].
         """
-        channs = list(self.header['data_info']['Name'])
-        nchanns = len(channs)
+        all_channs = list(self.header['data_info']['Name'])
+        if channel not in all_channs:
+            raise KeyError('{} is not a channel of {}'.format(channel, self.basename))
+        dir_index = ('forward', 'backward').index(direction)
         nx, ny = self.header['scan_pixels']
+        step = _preview_step(nx, ny, max_px)
 
-        # assume both directions for now
-        ndir = 2
-
-        data_dict = dict()
-
-        # open and seek to start of data
-        f = open(self.fname, 'rb')
-        f.seek(self.byte_offset)
-        data_format = self.data_format
-        scandata = np.fromfile(f, dtype=data_format)
-        f.close()
-
-        # reshape
-        scandata_shaped = scandata.reshape(nchanns, ndir, ny, nx)
+        def read_preview(step):
+            if self.signals is not None and channel in self.signals:
+                return _dequantize(self.signals[channel][direction][::step, ::step],
+                                   self.quantization.get(channel))
 
-        # extract data for each channel
-        for i, chann in enumerate(channs):
-            chann_dict = dict(forward=scandata_shaped[i, 0, :, :],
-                              backward=scandata_shaped[i, 1, :, :])
-            data_dict[chann] = chann_dict
+            itemsize = np.dtype(self.data_format).itemsize
+            image_offset = self.byte_offset + \
+                (all_channs.index(channel) * 2 + dir_index) * ny * nx * itemsize
+            rows = range(0, ny, step)
+            line = np.empty(nx, dtype=self.data_format)
+            image = np.zeros((len(rows), len(range(0, nx, step))), dtype=self.data_format)
+            with self._open():
+                for i, row in enumerate(rows):
+                    self._read_array(image_offset + row * nx * itemsize, nx,
+                                     self.data_format, out=line)
+                    image[i] = line[::step]
+            return image
 
-        return data_dict
+        return _cached_preview(self._previews, (channel, direction), step, read_preview)
 
 
 class Spec(NanonisFile):
@@ -376,15 +1801,30 @@ class Spec(NanonisFile):
     These files are a little easier to handle since they are stored in
     ascii format.
 
+    Long tables, e.g. long-term chart or history exports, can be read
+    in part with usecols, skip_rows and max_rows, or streamed block by
+    block with iter_chunks. Seeking to a row uses an index of the byte
+    offset of every 1024th row, built by a single pass over the file
+    the first time it is needed.
+
     Parameters
     ----------
-    fname : str
-        Filename for spec file.
+    fname : str, path-like or file-like
+        Filename for spec file, see NanonisFile for other sources.
+    usecols : list of str or int, optional
+        Names or indices of the columns to read. Default all.
+    skip_rows : int, optional
+        Number of data rows to skip. Default: 0
+    max_rows : int, optional
+        Maximum number of data rows to read, 0 to only read the header.
+        Default all.
 
     Attributes
     ----------
     header : dict
         Parsed dat header.
+    columns : list of str
+        Names of the columns read, the keys of signals.
 
     Raises
     ------
@@ -392,11 +1832,23 @@ class Spec(NanonisFile):
         If fname does not have a '.dat' extension.
     """
 
-    def __init__(self, fname):
+    _default_filetype = 'spec'
+
+    def __init__(self, fname, usecols=None, skip_rows=0, max_rows=None):
         _is_valid_file(fname, ext='dat')
-        super().__init__(fname)
-        self.header = _parse_dat_header(self.header_raw)
-        self.signals = self._load_data()
+        self.usecols = usecols
+        self.skip_rows = skip_rows
+        self.max_rows = max_rows
+        self._row_index = None
+        with self._open(fname):
+            super().__init__(fname)
+            with phase(self, 'parse_header'):
+                self.header = _parse_dat_header(self.header_raw)
+            self.signals = self._load_data()
+
+    @property
+    def columns(self):
+        return list(self._columns)
 
     def _load_data(self):
         """
@@ -412,28 +1864,287 @@ class Spec(NanonisFile):
         """
 
         # done differently since data is ascii, not binary
-        f = open(self.fname, 'r')
-        f.seek(self.byte_offset)
-        data_dict = dict()
+        with self._open() as f:
+            f.seek(self.byte_offset)
+            names_line = f.readline()
+            self._data_offset = self.byte_offset + len(names_line)
+            self._all_columns = names_line.decode().strip('\r\n').split('\t')
+            self._usecols = self._column_indices(self.usecols)
+            column_names = [self._all_columns[i] for i in self._usecols]
+            if self.skip_rows:
+                f.seek(self._row_offset(self.skip_rows))
+            with phase(self, 'read_data') as p:
+                start = f.tell()
+                specdata = _parse_spec_table(f, self._usecols, self.max_rows,
+                                             len(self._all_columns))
+                p.nbytes = f.tell() - start
+
+        self._specdata = specdata
+        self._columns = column_names
+        with phase(self, 'reshape'):
+            data_dict = self._split_specdata()
 
-        column_names = f.readline().strip('\n').split('\t')
-        f.close()
-        num_lines = self._num_header_lines()
-        specdata = np.genfromtxt(self.fname, delimiter='\t', skip_header=num_lines)
+        return data_dict
 
-        for i, name in enumerate(column_names):
-            data_dict[name] = specdata[:, i]
+    def _split_specdata(self):
+        """
+        Column name keyed dict of views into the 2d data table.
+        """
+        data_dict = dict()
+        for i, name in enumerate(self._columns):
+            data_dict[name] = self._specdata[:, i]
 
         return data_dict
 
-    def _num_header_lines(self):
-        """Number of lines the header is composed of"""
-        with open(self.fname, 'r') as f:
-            data = f.readlines()
-            for i, line in enumerate(data):
-                if nanonis_end_tags['spec'] in line:
-                    return i + 2  # add 2 to skip the tag itself and column names
-        return 0
+    def _build_views(self):
+        self.signals = self._split_specdata()
+
+    def _column_indices(self, usecols):
+        """
+        Indices of the columns selected by names or indices.
+        """
+        if usecols is None:
+            return list(range(len(self._all_columns)))
+        indices = []
+        for col in usecols:
+            if isinstance(col, str):
+                if col not in self._all_columns:
+                    raise KeyError('{} is not a column of {}'.format(col, self.basename))
+                col = self._all_columns.index(col)
+            indices.append(int(col) % len(self._all_columns))
+        return indices
+
+    def to_arrow(self, fields=(), metadata=True, chunk_rows=None):
+        """
+        Arrow table with one column per signal.
+
+        Header only specs (max_rows=0) are streamed from the file. See
+        arrow.to_arrow for the parameters.
+
+        Returns
+        -------
+        pyarrow.Table
+        """
+        return to_arrow(self, fields=fields, metadata=metadata, chunk_rows=chunk_rows)
+
+    def write_parquet(self, path, fields=(), metadata=True, chunk_rows=None, **kwargs):
+        """
+        Write the to_arrow table to a Parquet file block by block.
+
+        See arrow.write_parquet.
+        """
+        write_parquet(self, path, fields=fields, metadata=metadata, chunk_rows=chunk_rows,
+                      **kwargs)
+
+    @property
+    def num_rows(self):
+        """
+        Number of data rows in the file, builds the row offset index.
+        """
+        self._build_row_index()
+        return self._num_rows
+
+    def _build_row_index(self):
+        """
+        Byte offsets of every _SPEC_INDEX_STEP-th data row.
+
+        A single pass over the data section in blocks, counting line
+        ends with numpy, so memory is bounded for any number of rows.
+        """
+        if self._row_index is not None:
+            return self._row_index
+
+        offsets = [self._data_offset]
+        num_rows = 0
+        last_byte = b'\n'
+        buf = bytearray(_READ_CHUNK_SIZE)
+        with self._open() as f:
+            f.seek(self._data_offset)
+            pos = self._data_offset
+            while True:
+                n = _readinto(f, buf)
+                if not n:
+                    break
+                line_ends = np.flatnonzero(np.frombuffer(buf, np.uint8, count=n) == ord('\n'))
+                # row num_rows + k + 1 starts after the k-th line end
+                rows = num_rows + 1 + np.arange(len(line_ends))
+                offsets.extend((pos + line_ends[rows % _SPEC_INDEX_STEP == 0] + 1).tolist())
+                num_rows += len(line_ends)
+                last_byte = bytes(buf[n - 1:n])
+                pos += n
+                if n < len(buf):
+                    break
+        if last_byte != b'\n':
+            # last row without a line end
+            num_rows += 1
+        elif offsets[-1] == pos:
+            # no row starts at the end of the file
+            offsets.pop()
+
+        self._row_index = np.asarray(offsets, dtype=np.int64)
+        self._num_rows = num_rows
+        self._end_offset = pos
+        return self._row_index
+
+    def _row_offset(self, row):
+        """
+        Byte offset of the start of data row, end of file past the end.
+        """
+        index = self._build_row_index()
+        if row >= self._num_rows:
+            return self._end_offset
+        with self._open() as f:
+            f.seek(index[row // _SPEC_INDEX_STEP])
+            for _ in range(row % _SPEC_INDEX_STEP):
+                f.readline()
+            return f.tell()
+
+    def iter_chunks(self, rows=None, start=0, stop=None):
+        """
+        Iterate over blocks of data rows, reading one block at a time.
+
+        Only the columns selected by usecols are parsed. Rows before
+        start are skipped with the row offset index, not parsed.
+
+        Parameters
+        ----------
+        rows : int, optional
+            Number of rows per block. Default: 65536
+        start : int, optional
+            First row. Default: 0
+        stop : int, optional
+            Row to stop at. Default is the end of the file.
+
+        Yields
+        ------
+        row_start : int
+            Index of the first row of the block.
+        block : dict
+            Column name keyed dict of 1d arrays of the rows of the block.
+        """
+        rows = _SPEC_CHUNK_ROWS if rows is None else max(int(rows), 1)
+        offset = self._row_offset(start) if start else self._data_offset
+        row_start = start
+        # one handle for the whole iteration, compressed files are not
+        # decompressed again from the start for every block
+        with self._open() as f:
+            while stop is None or row_start < stop:
+                num = rows if stop is None else min(rows, stop - row_start)
+                # other reads may have moved the handle between blocks
+                f.seek(offset)
+                lines = list(itertools.islice(f, num))
+                offset = f.tell()
+                if not lines:
+                    break
+                block = _parse_spec_table(lines, self._usecols, None, len(self._all_columns))
+                yield row_start, {name: block[:, i] for i, name in enumerate(self._columns)}
+                row_start += len(lines)
+
+
+class CompactSpec:
+
+    """
+    Memory compact point spectroscopy file, for keeping many in memory.
+
+    Loaded like Spec, but only the data table, the column names and a
+    LazyHeader are kept: no instance __dict__, no header_raw, header
+    keys, values and column names are interned and shared between
+    objects, and numeric header values are converted on access.
+
+    Parameters
+    ----------
+    fname : str, path-like or file-like
+        Filename for spec file, see NanonisFile for other sources.
+
+    Attributes
+    ----------
+    fname : str
+        Full path of the file.
+    header : LazyHeader
+        Parsed dat header, numeric values as float.
+    signals : dict
+        Keys correspond to each channel recorded, values are views into
+        the data table built on every access.
+    """
+
+    __slots__ = ('fname', 'header', '_columns', '_specdata')
+
+    def __init__(self, fname):
+        self._take(Spec(fname))
+
+    @classmethod
+    def from_spec(cls, spec):
+        """
+        CompactSpec sharing the data table of a loaded Spec.
+        """
+        obj = cls.__new__(cls)
+        obj._take(spec)
+        return obj
+
+    def _take(self, spec):
+        self.fname = spec.fname if isinstance(spec.fname, str) else str(spec.fname)
+        self.header = LazyHeader(spec.header)
+        self._columns = _shared_layout(spec._columns)
+        self._specdata = spec._specdata
+
+    @property
+    def signals(self):
+        return {name: self._specdata[:, i] for i, name in enumerate(self._columns[0])}
+
+    def to_arrow(self, fields=(), metadata=True):
+        """
+        Arrow table with one column per signal, see arrow.to_arrow.
+        """
+        return to_arrow(self, fields=fields, metadata=metadata)
+
+    def write_parquet(self, path, fields=(), metadata=True, **kwargs):
+        """
+        Write the to_arrow table to a Parquet file, see arrow.write_parquet.
+        """
+        write_parquet(self, path, fields=fields, metadata=metadata, **kwargs)
+
+    def __getstate__(self):
+        return dict(fname=self.fname, header=self.header,
+                    columns=self._columns[0], specdata=self._specdata)
+
+    def __setstate__(self, state):
+        self.fname = state['fname']
+        self.header = state['header']
+        self._columns = _shared_layout(state['columns'])
+        self._specdata = state['specdata']
+
+
+def open_header(path):
+    """
+    Grid, Scan or Spec of a file with only its header read.
+
+    The class is picked from the extension, compression extensions
+    aside, e.g. 'a.3ds.gz' is a Grid.
+
+    Parameters
+    ----------
+    path : str or path-like
+        Grid (.3ds), scan (.sxm) or point spectroscopy (.dat) file.
+
+    Returns
+    -------
+    Grid, Scan or Spec
+        Grid and Scan with load_data=False, Spec with max_rows=0.
+
+    Raises
+    ------
+    ValueError
+        If path has none of these extensions.
+    """
+    path = os.fspath(path)
+    ext = os.path.splitext(_strip_compression_ext(path))[1].lower()
+    if ext == '.3ds':
+        return Grid(path, load_data=False)
+    elif ext == '.sxm':
+        return Scan(path, load_data=False)
+    elif ext == '.dat':
+        return Spec(path, max_rows=0)
+    raise ValueError('{} is not a Nanonis grid, scan or spec file'.format(path))
 
 
 class UnhandledFileError(Exception):
@@ -642,6 +2353,31 @@ def _parse_sxm_header(header_raw):
     return header_dict
 
 
+def _parse_spec_table(source, usecols, max_rows, num_columns):
+    """
+    Parse tab separated rows of a .dat data section as a 2d array.
+
+    Parameters
+    ----------
+    source : file-like or list of bytes
+        Handle positioned at the first row, or the rows themselves.
+    usecols : list of int
+        Indices of the columns to keep.
+    max_rows : int or None
+        Maximum number of rows read from source.
+    num_columns : int
+        Number of columns in the file.
+    """
+    if max_rows == 0:
+        return np.empty((0, len(usecols)))
+    if len(usecols) == num_columns:
+        # let genfromtxt handle the columns as before
+        usecols = None
+    data = np.genfromtxt(source, delimiter='\t', encoding='utf-8', usecols=usecols,
+                         max_rows=max_rows)
+    return data.reshape(-1, num_columns if usecols is None else len(usecols))
+
+
 def _parse_dat_header(header_raw):
     """
     Parse point spectroscopy header.
@@ -670,6 +2406,187 @@ def _parse_dat_header(header_raw):
     return header_dict
 
 
+def _grid_parameter_names(header):
+    """
+    Unique names of the parameters stored at the start of every pixel.
+
+    Names come from the fixed and experimental parameters header
+    entries. Repeated names get a ' #2', ' #3'... suffix, and names
+    are made up ('Parameter 5'...) if the header lists fewer names than
+    header['num_parameters'].
+    """
+    names = []
+    for key in ('fixed_parameters', 'experimental_parameters'):
+        entry = header.get(key) or []
+        names += [entry] if isinstance(entry, str) else list(entry)
+
+    num_param = header['num_parameters']
+    names = names[:num_param]
+    names += ['Parameter {}'.format(i) for i in range(len(names), num_param)]
+
+    unique_names = []
+    for name in names:
+        unique_name, count = name, 1
+        while unique_name in unique_names:
+            count += 1
+            unique_name = '{} #{}'.format(name, count)
+        unique_names.append(unique_name)
+    return unique_names
+
+
+def _grid_bwd_channels(channels):
+    """
+    Forward channel name keyed dict of backward sweep channel names.
+    """
+    bwd_channels = dict()
+    for chann in channels:
+        if grid_bwd_tag in chann:
+            forward = ' '.join(chann.replace(grid_bwd_tag, ' ').split())
+            if forward in channels:
+                bwd_channels[forward] = chann
+    return bwd_channels
+
+
+def _grid_segments(header):
+    """
+    (start, end, points) of each segment of a multi-segment sweep.
+
+    The header entry key lists the segment fields separated by ',', the
+    value has a ','-separated row of field values per segment, e.g.
+    'Segment Start (V), Segment End (V), ..., Steps (xn)=-1,0,...,64;0,1,...,128'.
+    Empty list if there is no such entry or it can't be parsed.
+    """
+    for key, val in header.items():
+        if isinstance(key, str) and key.startswith(grid_segment_key):
+            break
+    else:
+        return []
+
+    fields = [name.strip() for name in key.split(',')]
+    rows = [val] if isinstance(val, str) else val
+    try:
+        steps = next(i for i, name in enumerate(fields) if name.startswith('Steps'))
+        segments = []
+        for row in rows:
+            values = row.split(',')
+            segments.append((float(values[0]), float(values[1]), int(float(values[steps]))))
+    except (StopIteration, IndexError, ValueError):
+        warnings.warn('Could not parse the sweep segments entry {}'.format(key))
+        return []
+    return segments
+
+
+def _parameter_view(griddata, names):
+    """
+    Structured view over the leading parameters of each grid pixel.
+
+    Parameters
+    ----------
+    griddata : numpy.ndarray
+        3d (rows, cols, values per pixel) array, C-contiguous.
+    names : list of str
+        Name of each leading parameter value.
+
+    Returns
+    -------
+    numpy.ndarray
+        2d structured array sharing memory with griddata.
+    """
+    itemsize = griddata.dtype.itemsize
+    dtype = np.dtype({'names': names,
+                      'formats': [griddata.dtype] * len(names),
+                      'offsets': [i * itemsize for i in range(len(names))],
+                      'itemsize': griddata.shape[-1] * itemsize})
+    return griddata.view(dtype)[..., 0]
+
+
+def _storage_dtype(storage_dtype):
+    """
+    Native byte order storage data type, None for the file data type.
+    """
+    if storage_dtype is None:
+        return None
+    dtype = np.dtype(storage_dtype).newbyteorder('=')
+    if dtype.kind not in 'fi':
+        raise ValueError('storage_dtype must be a float or signed integer type, not {}'.format(dtype))
+    return dtype
+
+
+def _is_scaled(dtype):
+    """
+    Whether values stored as dtype need a scale, integers and float16.
+    """
+    return dtype.kind == 'i' or dtype.itemsize < 4
+
+
+def _quantization_scale(dtype, vmin, vmax):
+    """
+    (scale, offset) of a channel with values from vmin to vmax.
+
+    Integers span the range symmetrically around its center, the most
+    negative integer is kept for NaN. float16 gets a power of two scale
+    only, so that values don't overflow or underflow (currents in A are
+    far below the smallest float16).
+    """
+    if not (np.isfinite(vmin) and np.isfinite(vmax)):
+        return 1.0, 0.0
+    if dtype.kind == 'i':
+        half_range = (float(vmax) - float(vmin)) / 2
+        scale = half_range / np.iinfo(dtype).max if half_range > 0 else 1.0
+        return scale, (float(vmax) + float(vmin)) / 2
+    max_abs = max(abs(float(vmin)), abs(float(vmax)))
+    if max_abs == 0:
+        return 1.0, 0.0
+    return float(2.0 ** (np.ceil(np.log2(max_abs)) - 15)), 0.0
+
+
+def _quantize(values, out, scale, offset):
+    """
+    Store (values - offset) / scale in out.
+
+    Returns
+    -------
+    tuple
+        Maximum absolute error, sum of squared errors and number of
+        finite values, to combine the errors of several blocks.
+    """
+    values = values.astype(np.float64)
+    scaled = (values - offset) / scale
+    if out.dtype.kind == 'i':
+        info = np.iinfo(out.dtype)
+        nan = np.isnan(scaled)
+        scaled = np.clip(np.rint(scaled), -info.max, info.max)
+        scaled[nan] = info.min
+    out[...] = scaled
+
+    error = np.abs(_dequantize(out, (scale, offset), dtype=np.float64) - values)
+    error = error[np.isfinite(error)]
+    return error.max(initial=0.0), np.square(error).sum(), error.size
+
+
+def _quantization(scale, offset, max_error, sum_sq, num):
+    return Quantization(scale, offset, float(max_error), float(np.sqrt(sum_sq / num)) if num else 0.0)
+
+
+def _dequantize(values, quantization, dtype=np.float32):
+    """
+    values * scale + offset, values itself if they are not scaled.
+
+    NaN is restored for the most negative value of integer types.
+    """
+    if quantization is None:
+        return values
+    scale, offset = quantization[0], quantization[1]
+    if values.dtype.kind == 'f' and values.dtype.itemsize >= 4 and scale == 1.0 and offset == 0.0:
+        return values
+    decoded = values.astype(dtype)
+    if values.dtype.kind == 'i':
+        decoded[values == np.iinfo(values.dtype).min] = np.nan
+    decoded *= scale
+    decoded += offset
+    return decoded
+
+
 def _clean_sxm_header(header_dict):
     """
     Cleanup header dicitonary key-value pairs.
@@ -777,10 +2694,347 @@ def _parse_scan_header_table(table_list):
     return dict(zip(keys, zip_vals))
 
 
+def _scan_passes(names):
+    """
+    Pass number keyed dict of (channel name, name without pass prefix).
+
+    Channels without a pass prefix are in pass 1.
+    """
+    passes = dict()
+    for name in names:
+        match = re.match(scan_pass_prefix, name)
+        number, base = (int(match.group(1)), name[match.end():]) if match else (1, name)
+        passes.setdefault(number, []).append((name, base))
+    return dict(sorted(passes.items()))
+
+
+def _multipass_config(header):
+    """
+    Pass number keyed dict of the forward and backward settings rows.
+    """
+    table = header.get(scan_multipass_key)
+    if not table:
+        return dict()
+    keys = list(table)
+    rows = list(zip(*table.values()))
+    if len(rows) % 2:
+        warnings.warn('Multipass-Config has an odd number of rows, ignoring the last one')
+    return {i + 1: dict(forward=dict(zip(keys, rows[2 * i])), backward=dict(zip(keys, rows[2 * i + 1])))
+            for i in range(len(rows) // 2)}
+
+
+def _preview_step(nx, ny, max_px):
+    """
+    Smallest pixel step giving at most max_px pixels per side.
+    """
+    return max(1, -(-max(nx, ny) // max_px))
+
+
+def _cached_preview(cache, key, step, read_preview):
+    """
+    Look up a preview in a pyramid of cached previews.
+
+    Parameters
+    ----------
+    cache : dict
+        Keyed by key, values are dicts of step to preview array.
+    key : hashable
+        Identifies the image, e.g. (channel, direction).
+    step : int
+        Pixel step of the requested preview.
+    read_preview : callable
+        Called with step to make the preview if it can't be derived
+        from a cached one.
+    """
+    levels = cache.setdefault(key, dict())
+    if step not in levels:
+        finer = [s for s in levels if step % s == 0]
+        if finer:
+            # subsample the coarsest cached level that fits
+            s = max(finer)
+            levels[step] = levels[s][::step // s, ::step // s]
+        else:
+            levels[step] = read_preview(step)
+    return levels[step]
+
+
+def _roi_bounds(roi, ny, nx):
+    """
+    Convert a (rows, cols) tuple of slices to pixel bounds.
+
+    Returns
+    -------
+    tuple
+        (row_start, row_stop, col_start, col_stop)
+    """
+    if roi is None:
+        roi = (None, None)
+    bounds = []
+    for sl, n in zip(roi, (ny, nx)):
+        if sl is None:
+            sl = slice(None)
+        start, stop, step = sl.indices(n)
+        if step != 1:
+            raise ValueError('Region of interest slices can not have a step')
+        bounds += [start, max(start, stop)]
+    return tuple(bounds)
+
+
 def _is_valid_file(fname, ext):
     """
     Detect if invalid file is being initialized by class.
+
+    Anonymous file-like objects can't be checked and are assumed valid.
     """
-    _, fname_ext = os.path.splitext(fname)
+    fname = _source_name(fname)
+    if not fname:
+        return
+    _, fname_ext = os.path.splitext(_strip_compression_ext(fname))
     if fname_ext[1:] != ext:
         raise UnhandledFileError('{} is not a {} file'.format(fname, ext))
+
+
+def _is_file_like(obj):
+    """
+    Detect if a file-like object rather than a filename was given.
+    """
+    return hasattr(obj, 'read') and hasattr(obj, 'seek')
+
+
+def _source_name(source):
+    """
+    Filename of a file source, empty string for anonymous file-like objects.
+    """
+    if _is_file_like(source):
+        name = getattr(source, 'name', '')
+        return name if isinstance(name, (str, os.PathLike)) else ''
+    return source
+
+
+def _open_source(source):
+    """
+    Open a binary read handle on a local filename or fsspec URL.
+
+    Compressed files and zip archive members are opened with a
+    decompressing reader.
+    """
+    if isinstance(source, str) and '://' in source:
+        try:
+            import fsspec
+        except ImportError as exc:
+            raise ImportError('Reading {} requires fsspec to be installed'.format(source)) from exc
+        return fsspec.open(source, 'rb', compression='infer').open()
+
+    source = os.fspath(source)
+    _, comp_ext = os.path.splitext(source)
+    archive = _split_zip_path(source)
+    if archive is not None:
+        zf = zipfile.ZipFile(archive[0])
+        try:
+            # the archive's file stays open until the member is closed
+            return zf.open(archive[1])
+        finally:
+            zf.close()
+    elif comp_ext == '.gz':
+        return gzip.open(source, 'rb')
+    elif comp_ext == '.zst':
+        return io.BufferedReader(_ZstdFile(source))
+    return open(source, 'rb')
+
+
+def _default_memory_budget():
+    """
+    Half of the available memory, or _DEFAULT_MEMORY_BUDGET.
+
+    Uses MemAvailable of /proc/meminfo, which unlike the free pages
+    counts the page cache that can be reclaimed.
+    """
+    try:
+        with open(_MEMINFO) as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024 // 2
+    except (OSError, ValueError, IndexError):
+        pass
+    return _DEFAULT_MEMORY_BUDGET
+
+
+def _is_plain_file(source):
+    """
+    Whether source is an uncompressed local file, which can be mapped
+    or read concurrently.
+    """
+    if _is_file_like(source) or (isinstance(source, str) and '://' in source):
+        return False
+    return _strip_compression_ext(source) == source and _split_zip_path(os.fspath(source)) is None
+
+
+def _strip_compression_ext(fname):
+    """
+    Remove a compression extension, 'a.3ds.gz' becomes 'a.3ds'.
+    """
+    root, ext = os.path.splitext(os.fspath(fname))
+    return root if ext in compression_exts else fname
+
+
+def _split_zip_path(fname):
+    """
+    Split 'archive.zip/member' into (archive, member).
+
+    Returns None if fname is not a path into an existing zip file.
+    """
+    if os.path.exists(fname):
+        return None
+    for sep in {'/', os.sep}:
+        index = fname.lower().find('.zip' + sep)
+        if index != -1:
+            archive = fname[:index + 4]
+            if os.path.isfile(archive):
+                return archive, fname[index + 5:].replace(os.sep, '/')
+    return None
+
+
+class _ZstdFile(io.RawIOBase):
+
+    """
+    Seekable reader decompressing a zstandard file on the fly.
+
+    Seeking forward decompresses and discards, seeking backward
+    restarts decompression from the start of the file, like gzip.
+    """
+
+    def __init__(self, fname):
+        try:
+            import zstandard
+        except ImportError as exc:
+            raise ImportError('Reading {} requires zstandard to be installed'.format(fname)) from exc
+        self.name = fname
+        self._dctx = zstandard.ZstdDecompressor()
+        self._raw = open(fname, 'rb')
+        self._reader = self._dctx.stream_reader(self._raw, closefd=False)
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = self._reader.readinto(b)
+        self._pos += n
+        return n
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation('Seek from end not supported')
+        if offset < self._pos:
+            self._reader.close()
+            self._raw.seek(0)
+            self._reader = self._dctx.stream_reader(self._raw, closefd=False)
+            self._pos = 0
+        while self._pos < offset:
+            skipped = len(self._reader.read(min(offset - self._pos, _READ_CHUNK_SIZE)))
+            if not skipped:
+                break
+            self._pos += skipped
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._reader.close()
+            self._raw.close()
+        super().close()
+
+
+class _ZlibChecksum:
+
+    """
+    Running zlib crc32 or adler32 with the hashlib update/hexdigest API.
+    """
+
+    def __init__(self, name):
+        self._func = getattr(zlib, name)
+        self._value = self._func(b'')
+
+    def update(self, data):
+        self._value = self._func(data, self._value)
+
+    def hexdigest(self):
+        return '{:08x}'.format(self._value)
+
+
+def _new_checksum(name):
+    """
+    Object with update and hexdigest methods computing checksum name.
+    """
+    if name in ('crc32', 'adler32'):
+        return _ZlibChecksum(name)
+    if name.startswith('xxh'):
+        try:
+            import xxhash
+        except ImportError as exc:
+            raise ImportError('{} checksums require xxhash to be installed'.format(name)) from exc
+        if not hasattr(xxhash, name):
+            raise ValueError('Unknown checksum {}'.format(name))
+        return getattr(xxhash, name)()
+    try:
+        return hashlib.new(name)
+    except ValueError:
+        raise ValueError('Unknown checksum {}'.format(name))
+
+
+class _PositionalReader:
+
+    """
+    Minimal seek/readinto handle over a shared file descriptor.
+
+    Reads with os.preadv at its own position, so readers on the same
+    descriptor can be used from different threads without locking.
+    """
+
+    def __init__(self, fd):
+        self._fd = fd
+        self._pos = 0
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence != io.SEEK_SET:
+            raise ValueError('Only absolute seeks are supported')
+        self._pos = offset
+        return offset
+
+    def readinto(self, b):
+        n = os.preadv(self._fd, [b], self._pos)
+        self._pos += n
+        return n
+
+
+def _readinto(f, buf):
+    """
+    Fill buf from the current position of f, return bytes read.
+
+    Loops since readinto may return fewer bytes than requested before
+    the end of file, e.g. for network file systems. Each read is at
+    most _READ_CHUNK_SIZE bytes, so that decompressing readers stream
+    into buf through small temporary buffers.
+    """
+    view = memoryview(buf)
+    total = 0
+    readinto = getattr(f, 'readinto', None)
+    while total < len(view):
+        stop = min(total + _READ_CHUNK_SIZE, len(view))
+        if readinto is not None:
+            n = readinto(view[total:stop])
+        else:
+            chunk = f.read(stop - total)
+            n = len(chunk)
+            view[total:total + n] = chunk
+        if not n:
+            break
+        total += n
+    return total
@@ -0,0 +1,266 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .qpi import _FFT_CHUNK_SIZE, _fft2, _ifft2, _scipy_fft, _window_2d
+
+
+def estimate_drift(images, upsample=10, prior=None, max_shift=None, window=None,
+                   chunk_size=None, workers=1):
+    """
+    Drift of every frame of an image series relative to the first one.
+
+    Consecutive frames are registered by phase correlation. Each batch
+    of frames is transformed with a single 2d FFT call, so plans are
+    shared within and across batches (scipy.fft is used if installed,
+    otherwise numpy.fft). Batches are processed in order and the
+    spectrum of the last frame of a batch is carried over to the next,
+    so every frame is transformed once, except when batches run
+    concurrently (workers > 1 without scipy): the last frame of each
+    batch is then transformed again with the next. The correlation
+    peaks of all pairs of a batch are then refined together to
+    1/upsample pixel with a matrix multiply (upsampled DFT) of a small
+    region around each peak instead of an upsampled inverse FFT.
+
+    Parameters
+    ----------
+    images : numpy.ndarray
+        3d (frames, ny, nx) array, e.g. a stack of
+        Scan.signals['Z']['forward'] of a series. NaN pixels of
+        incomplete frames are set to the frame mean.
+    upsample : int, optional
+        Shifts are resolved to 1/upsample pixel. Default: 10
+    prior : numpy.ndarray, optional
+        (frames - 1, 2) expected (row, column) shift of each frame
+        relative to the previous one, e.g. from offset_prior. The peak
+        search window is centered on it.
+    max_shift : float, optional
+        Only look for peaks within max_shift pixels (along each axis) of
+        the prior, or of zero shift. Default is the whole frame.
+    window : str or numpy.ndarray, optional
+        Window applied to every frame before the transform, see
+        qpi.fft_stack. Default is no window.
+    chunk_size : int, optional
+        Number of frames transformed per batch. Defaults to batches of
+        about 64 MiB of complex values.
+    workers : int, optional
+        Number of threads. Passed to scipy.fft, or used to process
+        batches concurrently with numpy.fft. Default: 1
+
+    Returns
+    -------
+    numpy.ndarray
+        (frames, 2) cumulative (row, column) shift in pixels of the
+        image content of every frame relative to the first frame, the
+        first row is zero. register(images, drift) aligns the frames.
+    """
+    images = np.asarray(images)
+    num_frames, ny, nx = images.shape
+    upsample = max(int(upsample), 1)
+    if prior is not None:
+        prior = np.asarray(prior, dtype=np.float64)
+        if prior.shape != (max(num_frames - 1, 0), 2):
+            raise ValueError('prior must have shape {}, not {}'.format(
+                             (num_frames - 1, 2), prior.shape))
+
+    win = _window_2d(window, ny, nx)
+    if chunk_size is None:
+        chunk_size = _FFT_CHUNK_SIZE // (16 * ny * nx)
+    # a batch of frames gives one pair less, it needs at least two
+    chunk_size = max(int(chunk_size), 2)
+
+    shifts = np.zeros((num_frames, 2))
+
+    def correlate(start, previous=None):
+        # frames start..stop, the last frame is also the first of the next batch
+        stop = min(start + chunk_size, num_frames)
+        if previous is None:
+            spectra = _fft2(_prepare(images[start:stop], win), workers)
+            cross = spectra[1:] * np.conj(spectra[:-1])
+        else:
+            # spectrum of frame start carried over from the previous batch
+            spectra = _fft2(_prepare(images[start + 1:stop], win), workers)
+            cross = np.empty_like(spectra)
+            cross[0] = spectra[0] * np.conj(previous)
+            cross[1:] = spectra[1:] * np.conj(spectra[:-1])
+        # phase correlation, only the phase difference of the frames counts
+        cross /= np.maximum(np.abs(cross), 1e-30)
+        pair_prior = None if prior is None else prior[start:stop - 1]
+        shifts[start + 1:stop] = _peak_shifts(cross, upsample, pair_prior, max_shift, workers)
+        # copy, so that the rest of the batch can be freed
+        return spectra[-1].copy()
+
+    starts = range(0, max(num_frames - 1, 0), chunk_size - 1)
+    if workers == 1 or _scipy_fft is not None:
+        previous = None
+        for start in starts:
+            previous = correlate(start, previous)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(correlate, starts))
+
+    return np.cumsum(shifts, axis=0)
+
+
+def offset_prior(scans):
+    """
+    Expected shifts between consecutive scans from their scan offsets.
+
+    Moving the scan frame by the header scan_offset moves the image
+    content the other way. The offset change is expressed along the
+    (clockwise rotated) frame axes in pixels of the earlier scan. Rows
+    are in file order, so for 'up' scans the row index grows with y and
+    for 'down' scans it decreases.
+
+    Parameters
+    ----------
+    scans : sequence of Scan
+        Scans of a series, header only loads (load_data=False) suffice.
+
+    Returns
+    -------
+    numpy.ndarray
+        (len(scans) - 1, 2) expected (row, column) shifts in pixels.
+    """
+    from .spatial import frame_of, _to_frame
+
+    prior = np.zeros((max(len(scans) - 1, 0), 2))
+    for i in range(len(scans) - 1):
+        frame = frame_of(scans[i])
+        nx, ny = scans[i].header['scan_pixels']
+        u, v = _to_frame(frame, *frame_of(scans[i + 1]).center)
+        row_sign = -1 if scans[i].header.get('scan_dir', 'up') == 'up' else 1
+        prior[i] = (row_sign * v * ny / frame.size[1], -u * nx / frame.size[0])
+    return prior
+
+
+def scan_drift(scans, channel='Z', direction='forward', use_offset=True, max_shift=None,
+               **kwargs):
+    """
+    Drift of a series of scans, see estimate_drift.
+
+    Parameters
+    ----------
+    scans : sequence of Scan
+        Loaded scans of a series, all with the same number of pixels.
+    channel : str, optional
+        Channel to register. Default: 'Z'
+    direction : str, optional
+        'forward' or 'backward'. Default: 'forward'
+    use_offset : bool, optional
+        Center the peak search on the shift expected from the scan
+        offsets of the headers (offset_prior). Default: True
+    max_shift : float, optional
+        Search window half width in pixels around the expected shift.
+    **kwargs
+        Passed to estimate_drift (upsample, window, chunk_size, workers).
+
+    Returns
+    -------
+    numpy.ndarray
+        (len(scans), 2) cumulative (row, column) shift in pixels of every
+        scan relative to the first one.
+
+    Examples
+    --------
+    >>> scans = [nap.read.Scan(f) for f in sorted(glob.glob('series/*.sxm'))]
+    >>> drift = register.scan_drift(scans, max_shift=20, workers=4)
+    >>> aligned = register.register(np.stack([s.signals['Z']['forward'] for s in scans]), drift)
+    """
+    images = np.stack([scan.signals[channel][direction] for scan in scans])
+    prior = offset_prior(scans) if use_offset else None
+    return estimate_drift(images, prior=prior, max_shift=max_shift, **kwargs)
+
+
+def register(images, drift, chunk_size=None, workers=1):
+    """
+    Shift every frame back by its drift with a Fourier shift.
+
+    Parameters
+    ----------
+    images : numpy.ndarray
+        3d (frames, ny, nx) array.
+    drift : numpy.ndarray
+        (frames, 2) (row, column) shifts in pixels, e.g. from
+        estimate_drift.
+    chunk_size : int, optional
+        Number of frames shifted per batch.
+    workers : int, optional
+        Number of threads of scipy.fft. Default: 1
+
+    Returns
+    -------
+    numpy.ndarray
+        float64 array of aligned frames. Content shifted in from outside
+        the frame wraps around.
+    """
+    images = np.asarray(images)
+    num_frames, ny, nx = images.shape
+    drift = np.asarray(drift, dtype=np.float64)
+    if chunk_size is None:
+        chunk_size = _FFT_CHUNK_SIZE // (16 * ny * nx)
+    chunk_size = max(int(chunk_size), 1)
+
+    fy, fx = np.fft.fftfreq(ny), np.fft.fftfreq(nx)
+    out = np.empty(images.shape)
+    for start in range(0, num_frames, chunk_size):
+        stop = min(start + chunk_size, num_frames)
+        spectra = _fft2(np.nan_to_num(images[start:stop].astype(np.float64)), workers)
+        d = drift[start:stop]
+        spectra *= np.exp(2j * np.pi * d[:, 0, None, None] * fy[None, :, None])
+        spectra *= np.exp(2j * np.pi * d[:, 1, None, None] * fx[None, None, :])
+        out[start:stop] = _ifft2(spectra, workers).real
+    return out
+
+
+def _prepare(frames, win):
+    """
+    float64 frames with zero mean and NaN pixels set to zero.
+    """
+    frames = frames.astype(np.float64)
+    frames -= np.nanmean(frames, axis=(1, 2), keepdims=True)
+    frames = np.nan_to_num(frames, copy=False)
+    if win is not None:
+        frames *= win
+    return frames
+
+
+def _peak_shifts(cross, upsample, prior, max_shift, workers):
+    """
+    Subpixel (row, column) peak of the correlation of every pair.
+
+    Parameters
+    ----------
+    cross : numpy.ndarray
+        (pairs, ny, nx) normalized cross power spectra.
+    """
+    num_pairs, ny, nx = cross.shape
+    corr = _ifft2(cross, workers).real
+
+    # signed shift of every row and column, wrapped around
+    rows = np.fft.fftfreq(ny, 1 / ny)
+    cols = np.fft.fftfreq(nx, 1 / nx)
+    if max_shift is not None:
+        center = np.zeros((num_pairs, 2)) if prior is None else prior
+        dy = (rows[None, :] - center[:, 0, None] + ny / 2) % ny - ny / 2
+        dx = (cols[None, :] - center[:, 1, None] + nx / 2) % nx - nx / 2
+        inside = (np.abs(dy) <= max_shift)[:, :, None] & (np.abs(dx) <= max_shift)[:, None, :]
+        corr = np.where(inside, corr, -np.inf)
+
+    peak = corr.reshape(num_pairs, -1).argmax(axis=1)
+    coarse = np.column_stack([rows[peak // nx], cols[peak % nx]])
+    if upsample == 1:
+        return coarse
+
+    # upsampled DFT of a 1.5 pixel region around the coarse peak
+    size = int(np.ceil(1.5 * upsample))
+    offsets = (np.arange(size) - size // 2) / upsample
+    row_pos = coarse[:, 0, None] + offsets
+    col_pos = coarse[:, 1, None] + offsets
+    row_kernel = np.exp(2j * np.pi * row_pos[:, :, None] * np.fft.fftfreq(ny)[None, None, :])
+    col_kernel = np.exp(2j * np.pi * np.fft.fftfreq(nx)[None, :, None] * col_pos[:, None, :])
+    fine = (row_kernel @ cross @ col_kernel).real
+
+    peak = fine.reshape(num_pairs, -1).argmax(axis=1)
+    index = np.arange(num_pairs)
+    return np.column_stack([row_pos[index, peak // size], col_pos[index, peak % size]])
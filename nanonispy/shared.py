@@ -0,0 +1,242 @@
+import pickle
+import struct
+import sys
+import time
+import uuid
+import weakref
+
+import numpy as np
+
+# metadata block starts with the attach count and the payload size
+_META_FORMAT = '<qq'
+_META_SIZE = struct.calcsize(_META_FORMAT)
+
+
+class SharedGrid:
+
+    """
+    Grid signals published in named shared memory blocks.
+
+    Created by Grid.to_shared_memory in the loading process (the owner)
+    and by attach(name) in consumer processes. Every signal is a
+    separate shared block, and the signals of every process are views
+    into the same memory, so nothing is copied or pickled between
+    processes, only the name is passed around. Signals that are a
+    column of another signal, e.g. topo of params, are not copied but
+    rebuilt as views in every process.
+
+    Cleanup: consumers call close() (or use the object as a context
+    manager) when done, which decrements the attach count. The owner
+    calls unlink() to remove the blocks, optionally waiting until no
+    consumer is attached. Consumers that are still attached keep valid
+    views after unlink, the memory is released when the last one
+    closes. The attach count is not updated atomically, processes
+    attaching and closing at the exact same time can miscount.
+
+    Attributes
+    ----------
+    name : str
+        Name to pass to attach() in other processes.
+    header : dict
+        Parsed header of the grid.
+    signals : dict
+        Signal name keyed dict of arrays in shared memory.
+    """
+
+    def __init__(self, name, header, layout, derived, blocks, meta, owner):
+        self.name = name
+        self.header = header
+        self._blocks = blocks
+        self._meta = meta
+        self._owner = owner
+        self._closed = False
+        self._layout = layout
+        self._derived = derived
+        self._exported = dict()
+        self.signals = self._views()
+
+    def _views(self):
+        """
+        Signals dict, arrays over the blocks are reused while alive.
+
+        Every array built on a block is tracked with a weak reference.
+        Views of those arrays, e.g. slices taken by the caller, keep
+        them alive, so close can tell whether the mappings are in use.
+        """
+        views = dict()
+        for (key, _, shape, dtype), shm in zip(self._layout, self._blocks):
+            ref = self._exported.get(key)
+            arr = None if ref is None else ref()
+            if arr is None:
+                arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+                self._exported[key] = weakref.ref(arr)
+            views[key] = arr
+        for key, source, index in self._derived:
+            views[key] = views[source][..., index]
+        return views
+
+    def _in_use(self):
+        return any(ref() is not None for ref in self._exported.values())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        if self._owner:
+            self.unlink()
+
+    @property
+    def attach_count(self):
+        """
+        Number of consumers currently attached.
+        """
+        return struct.unpack_from(_META_FORMAT, self._meta.buf)[0]
+
+    def close(self):
+        """
+        Release the views and mappings of this process.
+
+        Raises
+        ------
+        BufferError
+            If arrays from signals are still referenced elsewhere.
+        """
+        if self._closed:
+            return
+        self.signals = None
+        # arrays only reference the mapping, closing it under them would
+        # leave them pointing to unmapped memory
+        if self._in_use():
+            self.signals = self._views()
+            raise BufferError('Arrays of shared grid {} are still in use, delete them '
+                              'before closing'.format(self.name))
+        if not self._owner:
+            count, size = struct.unpack_from(_META_FORMAT, self._meta.buf)
+            struct.pack_into(_META_FORMAT, self._meta.buf, 0, max(count - 1, 0), size)
+        for shm in self._blocks + [self._meta]:
+            shm.close()
+        self._closed = True
+
+    def unlink(self, timeout=None):
+        """
+        Remove the shared blocks, owner only.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Seconds to wait for attached consumers to close first. By
+            default blocks are removed right away.
+        """
+        if not self._owner:
+            raise ValueError('Only the process that created {} can unlink it'.format(self.name))
+        if timeout is not None and not self._closed:
+            deadline = time.monotonic() + timeout
+            while self.attach_count > 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        for shm in self._blocks + [self._meta]:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def share(signals, header, name=None, derived=None):
+    """
+    Copy signals into named shared memory blocks.
+
+    Parameters
+    ----------
+    signals : dict
+        Signal name keyed dict of arrays, e.g. Grid.signals.
+    header : dict
+        Header stored alongside the signals, must be picklable.
+    name : str, optional
+        Name of the metadata block, signal blocks are named after it.
+        Default is a random unique name.
+    derived : dict, optional
+        Signal name keyed (source signal name, index) of signals equal
+        to source[..., index], e.g. {'topo': ('params', 4)}. They get no
+        block of their own and are rebuilt as views.
+
+    Returns
+    -------
+    SharedGrid
+        Owner handle on the shared blocks.
+    """
+    from multiprocessing import shared_memory
+
+    name = 'nap_' + uuid.uuid4().hex[:16] if name is None else name
+    derived = [(key, source, index) for key, (source, index) in (derived or dict()).items()]
+    skipped = set(key for key, _, _ in derived)
+    blocks, layout = [], []
+    try:
+        for i, (key, arr) in enumerate(signals.items()):
+            if key in skipped:
+                continue
+            arr = np.asarray(arr)
+            block_name = '{}_{}'.format(name, i)
+            # zero sized blocks are not allowed
+            shm = shared_memory.SharedMemory(name=block_name, create=True, size=max(arr.nbytes, 1))
+            blocks.append(shm)
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            layout.append((key, block_name, arr.shape, arr.dtype.str))
+
+        payload = pickle.dumps(dict(header=header, layout=layout, derived=derived),
+                               protocol=pickle.HIGHEST_PROTOCOL)
+        meta = shared_memory.SharedMemory(name=name, create=True, size=_META_SIZE + len(payload))
+        struct.pack_into(_META_FORMAT, meta.buf, 0, 0, len(payload))
+        meta.buf[_META_SIZE:_META_SIZE + len(payload)] = payload
+    except BaseException:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+        raise
+
+    return SharedGrid(name, header, layout, derived, blocks, meta, owner=True)
+
+
+def attach(name):
+    """
+    Attach to grid signals published by Grid.to_shared_memory.
+
+    Parameters
+    ----------
+    name : str
+        SharedGrid.name of the published grid.
+
+    Returns
+    -------
+    SharedGrid
+        Consumer handle, signals are zero-copy views of the shared
+        blocks. Call close() when done.
+    """
+    meta = _attach_block(name)
+    count, size = struct.unpack_from(_META_FORMAT, meta.buf)
+    payload = pickle.loads(bytes(meta.buf[_META_SIZE:_META_SIZE + size]))
+
+    blocks = [_attach_block(block_name) for _, block_name, _, _ in payload['layout']]
+
+    struct.pack_into(_META_FORMAT, meta.buf, 0, count + 1, size)
+    return SharedGrid(name, payload['header'], payload['layout'], payload['derived'], blocks, meta,
+                      owner=False)
+
+
+def _attach_block(name):
+    """
+    Open an existing shared block without taking ownership of it.
+
+    Before Python 3.13 the resource tracker of every attaching process
+    would unlink the block when that process exits, pulling it from
+    under the other processes.
+    """
+    from multiprocessing import shared_memory
+
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    shm = shared_memory.SharedMemory(name=name)
+    if sys.platform != 'win32':
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
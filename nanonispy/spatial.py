@@ -0,0 +1,325 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import warnings
+
+import numpy as np
+
+# maximum number of children of an index node
+_NODE_SIZE = 16
+
+Frame = namedtuple('Frame', ['path', 'kind', 'center', 'size', 'angle'])
+Frame.__doc__ = """
+Real-space frame of a file.
+
+kind is 'grid', 'scan' or 'spec'. center (x, y) and size (width,
+height) are in m, a point spectrum has size (0, 0). angle is the frame
+rotation in degrees, clockwise as in the Nanonis scan control.
+"""
+
+
+def read_frame(path):
+    """
+    Frame of a Nanonis file, only its header is read.
+
+    Parameters
+    ----------
+    path : str or path-like
+        Grid (.3ds), scan (.sxm) or point spectroscopy (.dat) file.
+
+    Returns
+    -------
+    Frame
+    """
+    from .read import open_header
+
+    return frame_of(open_header(path))
+
+
+def frame_of(obj):
+    """
+    Frame of a loaded Grid, Scan, Spec or CompactSpec.
+    """
+    kind = type(obj).__name__
+    header = obj.header
+    if kind == 'Grid':
+        return Frame(obj.fname, 'grid', tuple(header['pos_xy']), tuple(header['size_xy']),
+                     float(header['angle']))
+    if kind == 'Scan':
+        return Frame(obj.fname, 'scan', tuple(float(v) for v in header['scan_offset']),
+                     tuple(float(v) for v in header['scan_range']), float(header['scan_angle']))
+    if kind in ('Spec', 'CompactSpec'):
+        try:
+            center = (float(header['X (m)']), float(header['Y (m)']))
+        except KeyError:
+            raise KeyError('{} has no X (m) and Y (m) header entries'.format(obj.fname))
+        return Frame(obj.fname, 'spec', center, (0.0, 0.0), 0.0)
+    raise TypeError('Can not get the frame of a {}'.format(kind))
+
+
+class SpatialIndex:
+
+    """
+    R-tree of the real-space frames of many files.
+
+    Frames are read from the headers only. The tree is packed with the
+    Sort-Tile-Recursive algorithm over the bounding boxes of the,
+    possibly rotated, frames, and candidates are then tested exactly
+    against the rotated rectangles. The frames are saved to and loaded
+    from disk with save/load, the tree is rebuilt when needed.
+
+    Parameters
+    ----------
+    frames : list of Frame, optional
+        Initial frames.
+
+    Examples
+    --------
+    >>> index = SpatialIndex.from_files(glob.glob('session/*.sxm') + glob.glob('session/*.dat'))
+    >>> index.save('session/index.npz')
+    >>> index.files_at(1.2e-7, 3.1e-7)
+    >>> index.overlapping('session/grid001.3ds')
+    """
+
+    def __init__(self, frames=None):
+        self._frames = []
+        self._mtimes = []
+        self._positions = dict()
+        self._tree = None
+        for frame in frames or []:
+            self._insert(frame, None)
+
+    @classmethod
+    def from_files(cls, paths, workers=None):
+        """
+        Index of files, headers are read concurrently by workers threads.
+        """
+        index = cls()
+        index.add(paths, workers=workers)
+        return index
+
+    def __len__(self):
+        return len(self._frames)
+
+    @property
+    def frames(self):
+        return list(self._frames)
+
+    def add(self, paths, workers=None):
+        """
+        Add or update files, unchanged files already indexed are skipped.
+
+        Files that are missing, whose header can't be read or has no
+        position are skipped with a warning.
+        """
+        def read(path):
+            try:
+                mtime = os.stat(path).st_mtime
+                i = self._positions.get(path)
+                if i is not None and self._mtimes[i] == mtime:
+                    return None, None
+                return read_frame(path), mtime
+            except (KeyError, ValueError, OSError) as exc:
+                warnings.warn('Skipping {}: {}'.format(path, exc))
+                return None, None
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for frame, mtime in pool.map(read, [os.fspath(path) for path in paths]):
+                if frame is not None:
+                    self._insert(frame, mtime)
+
+    def _insert(self, frame, mtime):
+        frame = Frame(os.fspath(frame.path), frame.kind, tuple(frame.center), tuple(frame.size),
+                      float(frame.angle))
+        i = self._positions.get(frame.path)
+        if i is None:
+            self._positions[frame.path] = len(self._frames)
+            self._frames.append(frame)
+            self._mtimes.append(mtime)
+        else:
+            self._frames[i] = frame
+            self._mtimes[i] = mtime
+        self._tree = None
+
+    def files_at(self, x, y, tolerance=0.0):
+        """
+        Files whose frame contains the point (x, y), in m.
+
+        tolerance widens every frame by that distance, e.g. to find
+        point spectra close to a point.
+        """
+        query = np.array([x, y, x, y], dtype=np.float64)
+        hits = []
+        for i in self._candidates(query, tolerance):
+            u, v = _to_frame(self._frames[i], x, y)
+            width, height = self._frames[i].size
+            if abs(u) <= width / 2 + tolerance and abs(v) <= height / 2 + tolerance:
+                hits.append(self._frames[i].path)
+        return hits
+
+    def overlapping(self, other, tolerance=0.0):
+        """
+        Files whose frame overlaps the frame of other.
+
+        Parameters
+        ----------
+        other : Frame, Grid, Scan, Spec or path
+            Frame to compare with, other itself is not in the result.
+        tolerance : float, optional
+            Distance in m the frames are widened by. Default: 0
+        """
+        if isinstance(other, Frame):
+            frame = other
+        elif isinstance(other, (str, os.PathLike)):
+            frame = read_frame(other)
+        else:
+            frame = frame_of(other)
+        corners = _corners(frame, tolerance)
+        query = np.concatenate([corners.min(axis=0), corners.max(axis=0)])
+
+        hits = []
+        for i in self._candidates(query, tolerance):
+            candidate = self._frames[i]
+            if candidate.path == os.fspath(frame.path):
+                continue
+            if _convex_overlap(corners, _corners(candidate, tolerance)):
+                hits.append(candidate.path)
+        return hits
+
+    def _candidates(self, query, tolerance):
+        """
+        Indices of frames whose bounding box intersects query box.
+        """
+        if not self._frames:
+            return []
+        if self._tree is None:
+            self._tree = _pack_tree(np.array([_bbox(frame) for frame in self._frames]))
+        order, levels = self._tree
+
+        nodes = np.arange(len(levels[-1]))
+        for depth in range(len(levels) - 1, -1, -1):
+            boxes = levels[depth][nodes]
+            hit = (boxes[:, 0] - tolerance <= query[2]) & (boxes[:, 2] + tolerance >= query[0]) & \
+                  (boxes[:, 1] - tolerance <= query[3]) & (boxes[:, 3] + tolerance >= query[1])
+            nodes = nodes[hit]
+            if depth:
+                # children of a node are contiguous in the level below
+                children = (nodes[:, None] * _NODE_SIZE + np.arange(_NODE_SIZE)).ravel()
+                nodes = children[children < len(levels[depth - 1])]
+        return sorted(order[nodes].tolist())
+
+    def save(self, fname):
+        """
+        Save the frames to a .npz file.
+        """
+        frames = self._frames
+        mtimes = [np.nan if m is None else m for m in self._mtimes]
+        np.savez(fname,
+                 path=np.array([f.path for f in frames], dtype=str),
+                 kind=np.array([f.kind for f in frames], dtype=str),
+                 center=np.array([f.center for f in frames], dtype=np.float64).reshape(-1, 2),
+                 size=np.array([f.size for f in frames], dtype=np.float64).reshape(-1, 2),
+                 angle=np.array([f.angle for f in frames], dtype=np.float64),
+                 mtime=np.array(mtimes, dtype=np.float64))
+
+    @classmethod
+    def load(cls, fname):
+        """
+        Index saved by save, call add to pick up new or changed files.
+        """
+        index = cls()
+        with np.load(fname, allow_pickle=False) as data:
+            for path, kind, center, size, angle, mtime in zip(
+                    data['path'], data['kind'], data['center'], data['size'], data['angle'],
+                    data['mtime']):
+                index._insert(Frame(str(path), str(kind), tuple(center.tolist()),
+                                    tuple(size.tolist()), float(angle)),
+                              None if np.isnan(mtime) else float(mtime))
+        return index
+
+
+def _pack_tree(boxes):
+    """
+    Sort-Tile-Recursive packing of (n, 4) xmin, ymin, xmax, ymax boxes.
+
+    Returns
+    -------
+    order : numpy.ndarray
+        Frame index of every leaf entry.
+    levels : list of numpy.ndarray
+        Boxes of the entries, then of every level of nodes up to the
+        root level. Node i covers entries i*_NODE_SIZE to
+        (i+1)*_NODE_SIZE of the level below.
+    """
+    n = len(boxes)
+    centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+    num_leaves = -(-n // _NODE_SIZE)
+    num_slices = int(np.ceil(np.sqrt(num_leaves)))
+    slice_size = num_slices * _NODE_SIZE
+
+    # vertical slices by x, then sorted by y within each slice
+    by_x = np.argsort(centers[:, 0], kind='stable')
+    order = np.concatenate([s[np.argsort(centers[s, 1], kind='stable')]
+                            for s in np.split(by_x, np.arange(slice_size, n, slice_size))])
+
+    levels = [boxes[order]]
+    while len(levels[-1]) > _NODE_SIZE:
+        lower = levels[-1]
+        starts = np.arange(0, len(lower), _NODE_SIZE)
+        levels.append(np.column_stack([np.minimum.reduceat(lower[:, 0], starts),
+                                       np.minimum.reduceat(lower[:, 1], starts),
+                                       np.maximum.reduceat(lower[:, 2], starts),
+                                       np.maximum.reduceat(lower[:, 3], starts)]))
+    return order, levels
+
+
+def _corners(frame, tolerance=0.0):
+    """
+    (4, 2) corners of a frame widened by tolerance.
+    """
+    width, height = frame.size
+    u = np.array([-1, 1, 1, -1]) * (width / 2 + tolerance)
+    v = np.array([-1, -1, 1, 1]) * (height / 2 + tolerance)
+    theta = np.deg2rad(frame.angle)
+    # clockwise rotation
+    x = frame.center[0] + u * np.cos(theta) + v * np.sin(theta)
+    y = frame.center[1] - u * np.sin(theta) + v * np.cos(theta)
+    return np.column_stack([x, y])
+
+
+def _bbox(frame):
+    corners = _corners(frame)
+    return np.concatenate([corners.min(axis=0), corners.max(axis=0)])
+
+
+def _to_frame(frame, x, y):
+    """
+    Coordinates of (x, y) along the width and height axes of frame.
+    """
+    theta = np.deg2rad(frame.angle)
+    dx, dy = x - frame.center[0], y - frame.center[1]
+    return dx * np.cos(theta) - dy * np.sin(theta), dx * np.sin(theta) + dy * np.cos(theta)
+
+
+def _convex_overlap(a, b):
+    """
+    Separating axis test of two convex (n, 2) polygons, touching counts.
+
+    Degenerate edges (point or line frames) have no axis, the axes of
+    the other polygon are enough for the test to be exact.
+    """
+    tested = False
+    for poly in (a, b):
+        edges = np.roll(poly, -1, axis=0) - poly
+        for normal in np.column_stack([-edges[:, 1], edges[:, 0]]):
+            if not normal.any():
+                continue
+            tested = True
+            pa, pb = a @ normal, b @ normal
+            margin = 1e-12 * max(np.abs(pa).max(), np.abs(pb).max())
+            if pa.max() < pb.min() - margin or pb.max() < pa.min() - margin:
+                return False
+    if not tested:
+        # two points
+        return bool(np.allclose(a[0], b[0], rtol=0, atol=1e-12 * np.abs(a[0]).max()))
+    return True
@@ -0,0 +1,142 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .constants import nanonis_end_tags, spec_stack_fields
+from .read import FileHeaderNotFoundError, _is_valid_file, _parse_dat_header
+
+
+def stack_specs(paths, column, sweep=None, fields=None, workers=None):
+    """
+    Stack one channel of many point spectroscopy files into one array.
+
+    Every file is parsed without building a Spec object: only the
+    header and the two columns of interest are read, and each spectrum
+    is written straight into its row of a preallocated output array.
+    Files are parsed concurrently by a thread pool, the pandas C parser
+    used releases the GIL while parsing.
+
+    Parameters
+    ----------
+    paths : sequence of str or path-like
+        Spec (.dat) files to stack. Row order of the output follows
+        the order of paths.
+    column : str
+        Name of the channel to stack, e.g. 'Input 3 (A)'.
+    sweep : str, optional
+        Name of the sweep channel. Defaults to the first column of the
+        data section, usually 'Bias calc (V)'.
+    fields : sequence of str, optional
+        Header entries to collect for every file. Defaults to
+        constants.spec_stack_fields (position, bias and time).
+    workers : int, optional
+        Number of threads used for parsing. Defaults to the
+        ThreadPoolExecutor default, 1 parses serially.
+
+    Returns
+    -------
+    sweep_signal : numpy.ndarray
+        1d sweep signal shared by all files.
+    data : numpy.ndarray
+        2d array of shape (len(paths), len(sweep_signal)).
+    info : pandas.DataFrame
+        One row per file, indexed by path, with a column for every
+        requested header field. Numeric fields are converted to float.
+
+    Raises
+    ------
+    ValueError
+        If no paths are given, or a file has a different sweep signal
+        than the first file.
+    KeyError
+        If column or sweep is not found in a file.
+    """
+    try:
+        import pandas as pd
+    except ImportError as exc:
+        raise ImportError('stack_specs requires pandas to be installed') from exc
+
+    paths = [os.fspath(p) for p in paths]
+    if not paths:
+        raise ValueError('No files to stack')
+    if fields is None:
+        fields = spec_stack_fields
+
+    # first file fixes the sweep signal and the size of the output
+    sweep_signal, first, header = _read_spec_columns(paths[0], column, sweep, pd)
+    data = np.empty((len(paths), sweep_signal.size), dtype=first.dtype)
+    data[0] = first
+    headers = [None] * len(paths)
+    headers[0] = header
+
+    def _fill_row(i):
+        sweep_i, values, headers[i] = _read_spec_columns(paths[i], column, sweep, pd)
+        if sweep_i.shape != sweep_signal.shape or \
+                not np.allclose(sweep_i, sweep_signal, equal_nan=True):
+            raise ValueError('Sweep signal of {} does not match {}'.format(paths[i], paths[0]))
+        data[i] = values
+
+    if workers == 1:
+        for i in range(1, len(paths)):
+            _fill_row(i)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # list() so that the first exception raised is propagated
+            list(pool.map(_fill_row, range(1, len(paths))))
+
+    info = pd.DataFrame([[h.get(key) for key in fields] for h in headers],
+                        index=pd.Index(paths, name='path'),
+                        columns=list(fields))
+    for key in fields:
+        try:
+            info[key] = pd.to_numeric(info[key])
+        except (ValueError, TypeError):
+            pass
+
+    return sweep_signal, data, info
+
+
+def _read_spec_columns(fname, column, sweep, pd):
+    """
+    Read header and the sweep/column pair of a single .dat file.
+
+    The table is parsed by the pandas C parser, which releases the GIL
+    while tokenizing and converting, so files parse in parallel threads.
+
+    Returns
+    -------
+    tuple
+        (sweep signal, column data, parsed header dict)
+    """
+    _is_valid_file(fname, ext='dat')
+    with open(fname, 'rb') as f:
+        raw = f.read()
+
+    tag = nanonis_end_tags['spec'].encode()
+    tag_pos = raw.find(tag)
+    if tag_pos == -1:
+        raise FileHeaderNotFoundError(
+                'Could not find the {} end tag in {}'.format(tag.decode(), fname)
+                )
+
+    # same byte offset as NanonisFile.start_byte, first byte after tag line
+    byte_offset = raw.find(b'\n', tag_pos) + 1
+    header = _parse_dat_header(raw[:byte_offset].decode('utf-8', errors='replace'))
+
+    names_end = raw.find(b'\n', byte_offset) + 1
+    column_names = raw[byte_offset:names_end].decode().strip('\r\n').split('\t')
+    sweep = column_names[0] if sweep is None else sweep
+    for name in (sweep, column):
+        if name not in column_names:
+            raise KeyError('{} is missing from the columns of {}'.format(name, fname))
+    usecols = (column_names.index(sweep), column_names.index(column))
+
+    try:
+        table = pd.read_csv(io.BytesIO(raw[names_end:]), sep='\t', header=None, usecols=usecols,
+                            dtype=np.float64, engine='c')
+    except pd.errors.EmptyDataError:
+        return np.empty(0), np.empty(0), header
+
+    return table[usecols[0]].to_numpy(), table[usecols[1]].to_numpy(), header
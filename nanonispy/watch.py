@@ -0,0 +1,373 @@
+import ctypes
+import os
+import pickle
+import select
+import struct
+import threading
+import time
+import warnings
+from concurrent import futures
+
+import numpy as np
+
+# file extensions picked up by default
+_WATCH_EXTS = ('.sxm', '.3ds', '.dat')
+
+# inotify(7) events of files being written, closed or moved in
+_IN_MODIFY = 0x2
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_INOTIFY_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+
+# wd, mask, cookie, len header of every inotify event
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class Watcher:
+
+    """
+    Watch a directory and process new or grown Nanonis files.
+
+    Changes are detected with inotify on Linux, by polling the
+    directory elsewhere. A file is processed once its size and
+    modification time haven't changed for settle_time seconds: its
+    header is read first (read.open_header), then the header-only
+    object is passed through the pipeline steps by a pool of worker
+    threads.
+    Files that grow again later, e.g. a grid still being measured, are
+    processed again once they settle. At most max_pending files are
+    queued or being processed, further files wait in the watcher until
+    a worker is free, so a burst of files doesn't pile up in memory.
+    Subdirectories are not watched.
+
+    Parameters
+    ----------
+    directory : str or path-like
+        Directory to watch.
+    pipeline : sequence of callable, optional
+        Steps called as step(path, obj) in order. obj is the object
+        returned by the last step that returned something other than
+        None, initially the header-only Grid, Scan or Spec. See load,
+        thumbnail, convert and cache.
+    workers : int, optional
+        Number of worker threads. Default: 2
+    max_pending : int, optional
+        Maximum number of files queued or in process. Default: 2 x
+        workers
+    settle_time : float, optional
+        Seconds a file must stay unchanged. Default: 2
+    poll_interval : float, optional
+        Seconds between checks of the directory (polling) or of the
+        files waiting to settle (inotify). Default: 1
+    extensions : sequence of str, optional
+        File extensions to process. Default: .sxm, .3ds and .dat
+    existing : bool, optional
+        Also process the files already in the directory. Default: False
+    inotify : bool, optional
+        True requires inotify, False always polls. Default is inotify
+        if available.
+
+    Attributes
+    ----------
+    backend : str
+        'inotify' or 'polling'.
+    processed : dict
+        File name keyed (size, mtime) of the files submitted so far.
+    failed : dict
+        File name keyed exception of the files whose processing failed.
+
+    Examples
+    --------
+    >>> with Watcher('/data/session', [load(strategy='auto'), thumbnail('/data/thumbs')]) as w:
+    ...     w.run()
+    """
+
+    def __init__(self, directory, pipeline=(), workers=2, max_pending=None, settle_time=2.0,
+                 poll_interval=1.0, extensions=_WATCH_EXTS, existing=False, inotify=None):
+        self.directory = os.fspath(directory)
+        self.pipeline = list(pipeline)
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.processed = dict()
+        self.failed = dict()
+        # file name keyed (size, mtime, time of the last change)
+        self._pending = dict()
+        self._slots = threading.BoundedSemaphore(max_pending or 2 * workers)
+        self._pool = futures.ThreadPoolExecutor(max_workers=workers)
+        self._futures = set()
+        self._stop = threading.Event()
+
+        self._inotify = None
+        if inotify is not False:
+            try:
+                self._inotify = _Inotify(self.directory)
+            except (OSError, AttributeError, TypeError):
+                if inotify:
+                    raise
+        self.backend = 'polling' if self._inotify is None else 'inotify'
+
+        now = time.monotonic()
+        for name, st in self._list():
+            if existing:
+                self._pending[name] = (st.st_size, st.st_mtime, now)
+            else:
+                self.processed[name] = (st.st_size, st.st_mtime)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _list(self):
+        """
+        (name, stat) of the files to watch in the directory.
+        """
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if self._watched(entry.name) and entry.is_file():
+                    yield entry.name, entry.stat()
+
+    def _watched(self, name):
+        return name.lower().endswith(self.extensions)
+
+    def poll_once(self, now=None):
+        """
+        Look for changes once and submit the files that have settled.
+
+        Blocks while max_pending files are queued or in process.
+
+        Parameters
+        ----------
+        now : float, optional
+            time.monotonic() value to use as the current time.
+
+        Returns
+        -------
+        list of str
+            Names of the files submitted.
+        """
+        now = time.monotonic() if now is None else now
+        if self._inotify is None:
+            stats = dict(self._list())
+            for name in set(self._pending) - set(stats):
+                del self._pending[name]
+        else:
+            stats = dict()
+            for name in self._inotify.read() | set(self._pending):
+                if not self._watched(name):
+                    continue
+                try:
+                    stats[name] = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    self._pending.pop(name, None)
+
+        for name, st in stats.items():
+            state = (st.st_size, st.st_mtime)
+            if name in self._pending:
+                if self._pending[name][:2] != state:
+                    self._pending[name] = state + (now,)
+            elif self.processed.get(name) != state:
+                self._pending[name] = state + (now,)
+
+        ready = sorted(name for name, (_, _, changed) in self._pending.items()
+                       if now - changed >= self.settle_time)
+        for name in ready:
+            size, mtime, _ = self._pending.pop(name)
+            self._submit(name, (size, mtime))
+        return ready
+
+    def _submit(self, name, state):
+        # backpressure, wait for a free slot
+        self._slots.acquire()
+        self.processed[name] = state
+        future = self._pool.submit(self._process, name)
+        self._futures.add(future)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        self._futures.discard(future)
+        self._slots.release()
+
+    def wait(self):
+        """
+        Wait until the files submitted so far are processed.
+        """
+        futures.wait(list(self._futures))
+
+    def _process(self, name):
+        from . import read
+
+        path = os.path.join(self.directory, name)
+        try:
+            obj = read.open_header(path)
+            for step in self.pipeline:
+                result = step(path, obj)
+                if result is not None:
+                    obj = result
+        except Exception as exc:
+            self.failed[name] = exc
+            warnings.warn('Processing {} failed: {}'.format(path, exc))
+        else:
+            self.failed.pop(name, None)
+
+    def run(self, timeout=None):
+        """
+        Watch until stop is called or for timeout seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._stop.is_set():
+            self.poll_once()
+            wait = self.poll_interval
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    break
+            if self._inotify is not None:
+                self._inotify.wait(wait)
+            else:
+                self._stop.wait(wait)
+
+    def stop(self):
+        """
+        Make run return, from another thread or a signal handler.
+        """
+        self._stop.set()
+
+    def close(self):
+        """
+        Stop watching and wait for the files being processed.
+        """
+        self.stop()
+        self._pool.shutdown(wait=True)
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+
+class _Inotify:
+
+    """
+    Non-blocking inotify watch of one directory through ctypes.
+    """
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), _INOTIFY_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, 'inotify_add_watch failed for {}'.format(directory))
+
+    def wait(self, timeout):
+        """
+        Wait up to timeout seconds for events.
+        """
+        select.select([self.fd], [], [], max(timeout, 0))
+
+    def read(self):
+        """
+        Names of the files with events since the last read.
+        """
+        names = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return names
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+                offset += _INOTIFY_EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if name:
+                    names.add(os.fsdecode(name))
+
+    def close(self):
+        os.close(self.fd)
+
+
+def load(**kwargs):
+    """
+    Pipeline step loading the data, kwargs are passed to Grid and Scan.
+
+    E.g. load(strategy='auto') to memory map or stream large grids.
+    """
+    from .read import Spec
+
+    def step(path, obj):
+        if isinstance(obj, Spec):
+            return Spec(path)
+        return type(obj)(path, **kwargs)
+    return step
+
+
+def thumbnail(outdir, max_px=128, channel='Z'):
+    """
+    Pipeline step saving a preview of grids and scans as name.npy.
+
+    Grid topography previews and Scan.preview of channel (or of the
+    first channel) only read the pixels they need. Point spectra are
+    skipped.
+    """
+    from .read import Grid, Scan
+
+    def step(path, obj):
+        if isinstance(obj, Grid):
+            preview = obj.topo_preview(max_px=max_px)
+        elif isinstance(obj, Scan):
+            names = list(obj.header['data_info']['Name'])
+            preview = obj.preview(channel if channel in names else names[0], max_px=max_px)
+        else:
+            return None
+        os.makedirs(outdir, exist_ok=True)
+        np.save(os.path.join(outdir, os.path.basename(path) + '.npy'), preview)
+        return None
+    return step
+
+
+def convert(outdir):
+    """
+    Pipeline step saving the signals of loaded objects as name.npz.
+
+    Scan channels are saved as 'channel/forward' and
+    'channel/backward'. Objects without loaded data are skipped, put
+    load before it in the pipeline.
+    """
+    def step(path, obj):
+        if obj.signals is None:
+            return None
+        arrays = dict()
+        for key, value in obj.signals.items():
+            if isinstance(value, dict):
+                for direction, image in value.items():
+                    arrays['{}/{}'.format(key, direction)] = image
+            else:
+                arrays[key] = value
+        os.makedirs(outdir, exist_ok=True)
+        np.savez(os.path.join(outdir, os.path.basename(path) + '.npz'), **arrays)
+        return None
+    return step
+
+
+def cache(outdir):
+    """
+    Pipeline step pickling the object as name.pickle for fast reloads.
+
+    Memory mapped grids are pickled by path, see Grid.
+    """
+    def step(path, obj):
+        os.makedirs(outdir, exist_ok=True)
+        with open(os.path.join(outdir, os.path.basename(path) + '.pickle'), 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return None
+    return step
+
+
+# pipeline steps of the command line, all writing to the output directory
+steps = dict(thumbnail=thumbnail, convert=convert, cache=cache)
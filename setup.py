@@ -33,6 +33,7 @@ setup(
     packages=['nanonispy'],
     package_data={'nanonispy': ['LICENSE', 'README.md'], },
     install_requires=['numpy', ],
+    entry_points={'console_scripts': ['nanonispy = nanonispy.__main__:main']},
     tests_require=['nose', 'coverage', ],
     include_package_data=True,
 )
@@ -0,0 +1,46 @@
+"""
+Fixtures shared by the test modules.
+"""
+import io
+import os
+
+import numpy as np
+
+GRID_HEADER = 'Grid dim="{nx} x {ny}"\r\nGrid settings={settings}\r\nSweep Signal="Bias (V)"\r\nFixed parameters="Sweep Start;Sweep End"\r\nExperiment parameters="{parameters}"\r\n# Parameters (4 byte)={num_param}\r\nExperiment size (bytes)={experiment_size}\r\nPoints={points}\r\nChannels="{channels}"\r\n{extra}Delay before measuring (s)=0\r\nExperiment=Grid\r\nStart time=\r\nEnd time=\r\nUser=\r\nComment=\r\n:HEADER_END:\r\n'
+
+
+class CountingFile(io.FileIO):
+    """
+    File object keeping track of the number of bytes read from it.
+    """
+    bytes_read = 0
+
+    def readinto(self, b):
+        n = super().readinto(b)
+        self.bytes_read += n or 0
+        return n
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def write_grid(path, data=None, nx=4, ny=3, parameters='X (m);Y (m);Z (m)', num_param=5,
+               points=8, channels=('Current (A)',), settings='0;0;1E-8;1E-8;0', extra=''):
+    """
+    Write a small .3ds grid and return its path.
+
+    data defaults to np.arange over all values, written as '>f4'. extra
+    is inserted as is before the 'Delay before measuring' entry, e.g. a
+    segments entry.
+    """
+    header = GRID_HEADER.format(nx=nx, ny=ny, settings=settings, parameters=parameters,
+                                num_param=num_param, experiment_size=4 * points * len(channels),
+                                points=points, channels=';'.join(channels), extra=extra)
+    if data is None:
+        data = np.arange(ny * nx * (num_param + points * len(channels)))
+    with open(path, 'wb') as f:
+        f.write(header.encode())
+        np.asarray(data, dtype='>f4').tofile(f)
+    return os.fspath(path)
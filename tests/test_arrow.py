@@ -0,0 +1,149 @@
+import unittest
+import tempfile
+import os
+import json
+import numpy as np
+
+import nanonispy as nap
+from nanonispy import arrow
+
+from .common import write_grid
+
+try:
+    import pyarrow
+    import pyarrow.dataset
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+class TestArrow(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        base = os.path.dirname(__file__)
+        with open(base + '/Bias-Spectroscopy002.dat', 'rb') as f:
+            self.raw = f.read().replace(b'\n', b'\r\n')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_grid(self):
+        return write_grid(os.path.join(self.temp_dir.name, 'grid.3ds'))
+
+    def create_specs(self, dates):
+        fnames = []
+        for i, date in enumerate(dates):
+            fname = os.path.join(self.temp_dir.name, 'spec{:03d}.dat'.format(i))
+            with open(fname, 'wb') as f:
+                f.write(self.raw.replace(b'04.08.2015', date.encode()))
+            fnames.append(fname)
+        return fnames
+
+    def test_grid_parameters(self):
+        grid = nap.read.Grid(self.create_grid())
+        table = grid.to_arrow(fields=['pos_xy', 'experiment_name'])
+
+        self.assertEqual(table.column_names, ['row', 'col'] + grid.parameter_names +
+                         ['pos_xy', 'experiment_name'])
+        self.assertEqual(table.num_rows, 12)
+        np.testing.assert_array_equal(table.column('row').to_numpy(), np.repeat(np.arange(3), 4))
+        np.testing.assert_array_equal(table.column('col').to_numpy(), np.tile(np.arange(4), 3))
+        for name in grid.parameter_names:
+            np.testing.assert_array_equal(table.column(name).to_numpy(),
+                                          grid.parameters[name].ravel())
+        self.assertEqual(table.column('pos_xy')[0].as_py(), [0.0, 0.0])
+        self.assertEqual(table.column('experiment_name')[0].as_py(), 'Grid')
+        header = json.loads(table.schema.metadata[b'nanonis_header'])
+        self.assertEqual(header['dim_px'], [4, 3])
+
+        # header only grids are streamed block by block
+        streamed = nap.read.Grid(grid.fname, load_data=False).to_arrow(
+            fields=['pos_xy', 'experiment_name'], chunk_rows=2)
+        self.assertEqual(streamed.column('row').num_chunks, 2)
+        self.assertTrue(streamed.equals(table))
+
+        # region of interest, absolute row and col indices
+        roi = (slice(1, 3), slice(1, 3))
+        table = nap.read.Grid(grid.fname, roi=roi).to_arrow()
+        streamed = nap.read.Grid(grid.fname, roi=roi, load_data=False).to_arrow(chunk_rows=1)
+        self.assertTrue(streamed.equals(table))
+        np.testing.assert_array_equal(table.column('row').to_numpy(), [1, 1, 2, 2])
+        np.testing.assert_array_equal(table.column('col').to_numpy(), [1, 2, 1, 2])
+        np.testing.assert_array_equal(table.column('Z (m)').to_numpy(),
+                                      grid.parameters['Z (m)'][1:3, 1:3].ravel())
+
+        with self.assertRaises(KeyError):
+            grid.to_arrow(fields=['Experiment'])
+        with self.assertRaises(ValueError):
+            grid.to_arrow(fields=['row'])
+
+    def test_zero_copy_columns(self):
+        table = np.asfortranarray(np.arange(12.0).reshape(4, 3))
+        columns = arrow._columns(table)
+        array = pyarrow.array(columns[1])
+        self.assertEqual(array.buffers()[1].address, table[:, 1].ctypes.data)
+
+        # big-endian strided columns are converted once, in one buffer
+        columns = arrow._columns(table.astype('>f4'))
+        self.assertTrue(all(c.dtype.isnative and c.flags.c_contiguous for c in columns))
+        self.assertIs(columns[0].base, columns[2].base)
+        np.testing.assert_array_equal(columns[2], table[:, 2])
+
+        # row-major columns are strided, transposed in one copy
+        table = np.ascontiguousarray(table)
+        columns = arrow._columns(table)
+        self.assertTrue(all(c.flags.c_contiguous for c in columns))
+        self.assertIs(columns[0].base, columns[2].base)
+        self.assertFalse(np.shares_memory(columns[1], table))
+        np.testing.assert_array_equal(columns[1], table[:, 1])
+
+    def test_spec(self):
+        fname = self.create_specs(['04.08.2015'])[0]
+        spec = nap.read.Spec(fname)
+        table = spec.to_arrow(fields=['Date', 'X (m)'])
+
+        self.assertEqual(table.column_names, spec.columns + ['Date', 'X (m)'])
+        for name in spec.columns:
+            np.testing.assert_array_equal(table.column(name).to_numpy(), spec.signals[name])
+        self.assertEqual(table.column('X (m)')[0].as_py(), -19.4904e-9)
+        self.assertEqual(table.schema.metadata[b'nanonis_file'], fname.encode())
+
+        streamed = nap.read.Spec(fname, max_rows=0).to_arrow(chunk_rows=100)
+        self.assertEqual(streamed.column(0).num_chunks, 11)
+        compact = nap.read.CompactSpec(fname).to_arrow()
+        for other in (streamed, compact):
+            for name in spec.columns:
+                np.testing.assert_array_equal(other.column(name).to_numpy(), spec.signals[name])
+
+        path = os.path.join(self.temp_dir.name, 'spec.parquet')
+        spec.write_parquet(path)
+        stored = pyarrow.parquet.read_table(path)
+        self.assertEqual(stored.schema, spec.to_arrow().schema)
+        self.assertIn(b'nanonis_header', stored.schema.metadata)
+        np.testing.assert_array_equal(stored.column(1).to_numpy(), spec.signals['Input 3 (A)'])
+
+    def test_write_dataset(self):
+        fnames = self.create_specs(['04.08.2015', '05.08.2015', '05.08.2015'])
+        root = os.path.join(self.temp_dir.name, 'dataset')
+        written = arrow.write_dataset(fnames[:2] + [nap.read.Spec(fnames[2])], root,
+                                      partition_by=['Date'], fields=['X (m)'])
+
+        self.assertEqual(len(written), 3)
+        self.assertEqual(sorted(os.listdir(root)), ['Date=04.08.2015%2008%3A49%3A41',
+                                                    'Date=05.08.2015%2008%3A49%3A41'])
+        dataset = pyarrow.dataset.dataset(root, partitioning='hive')
+        table = dataset.to_table(filter=pyarrow.dataset.field('Date') == '05.08.2015 08:49:41')
+        self.assertEqual(table.num_rows, 2 * 1024)
+        self.assertEqual(sorted(set(table.column('file').to_pylist())),
+                         ['spec001.dat', 'spec002.dat'])
+
+        # writing a file again replaces it
+        arrow.write_dataset(fnames[:1], root, partition_by=['Date'], fields=['X (m)'])
+        dataset = pyarrow.dataset.dataset(root, partitioning='hive')
+        self.assertEqual(dataset.count_rows(), 3 * 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+import tempfile
+import os
+import numpy as np
+
+import nanonispy as nap
+from nanonispy import fit
+
+from .common import write_grid
+
+
+class TestFitSpectra(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.x = np.linspace(-1, 1, 101)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_lorentzian_maps(self, ny=4, nx=5):
+        """
+        return (ny, nx, 4) true parameters and (ny, nx, points) spectra
+        """
+        rng = np.random.RandomState(0)
+        params = np.empty((ny, nx, 4))
+        params[..., 0] = rng.uniform(1, 2, (ny, nx))
+        params[..., 1] = rng.uniform(-0.3, 0.3, (ny, nx))
+        params[..., 2] = rng.uniform(0.1, 0.3, (ny, nx))
+        params[..., 3] = rng.uniform(-0.1, 0.1, (ny, nx))
+        spectra = fit.lorentzian(self.x, params.reshape(-1, 4)).reshape(ny, nx, -1)
+        return params, spectra
+
+    def test_lorentzian_maps(self):
+        params, spectra = self.create_lorentzian_maps()
+        # per pixel initial guess from the peak position
+        p0 = np.stack([spectra.max(axis=2) - spectra.min(axis=2), self.x[spectra.argmax(axis=2)],
+                       np.full(spectra.shape[:2], 0.2), spectra.min(axis=2)], axis=-1)
+        result = fit.fit_spectra('lorentzian', self.x, spectra, p0=p0, chunk_size=7)
+
+        self.assertEqual(result.params.shape, (4, 5, 4))
+        self.assertEqual(result.names, ('amplitude', 'center', 'fwhm', 'offset'))
+        self.assertTrue(result.converged.all())
+        np.testing.assert_allclose(result.params, params, rtol=1e-5, atol=1e-7)
+
+    def test_process_pool(self):
+        params, spectra = self.create_lorentzian_maps(3, 3)
+        result = fit.fit_spectra('lorentzian', self.x, spectra, p0=[1.5, 0, 0.2, 0])
+        result2 = fit.fit_spectra('lorentzian', self.x, spectra, p0=[1.5, 0, 0.2, 0],
+                                  chunk_size=4, workers=2)
+
+        np.testing.assert_allclose(result.params, result2.params)
+
+    def test_dynes_gap(self):
+        true = np.array([[1.0, 0.3, 0.02, 0.0]])
+        spectra = fit.dynes(self.x, true)
+        result = fit.fit_spectra('dynes', self.x, spectra, p0=[0.8, 0.25, 0.05, 0.1])
+
+        np.testing.assert_allclose(result.params, true, rtol=1e-4, atol=1e-6)
+
+    def test_custom_model_and_jacobian(self):
+        def exponential(x, p):
+            return p[:, 0:1] * np.exp(p[:, 1:2] * x)
+
+        def jac(x, p):
+            e = np.exp(p[:, 1:2] * x)
+            return np.stack([e, p[:, 0:1] * x * e], axis=-1)
+
+        spectra = exponential(self.x, np.array([[2.0, -1.5], [0.5, 0.7]]))
+        result = fit.fit_spectra(exponential, self.x, spectra, p0=[1, 0], jac=jac)
+
+        self.assertIsNone(result.names)
+        np.testing.assert_allclose(result.params, [[2.0, -1.5], [0.5, 0.7]], rtol=1e-6)
+
+    def test_not_converged(self):
+        params, spectra = self.create_lorentzian_maps(2, 2)
+        result = fit.fit_spectra('lorentzian', self.x, spectra, p0=[1.5, 0, 0.2, 0], max_iter=2)
+        self.assertFalse(result.converged.any())
+
+        # flat model, no downhill step until the damping is exhausted
+        def steps(x, p):
+            return np.floor(p[:, 0:1]) + 0 * x
+
+        result = fit.fit_spectra(steps, self.x, np.full((3, 101), 2.5), p0=[0.5])
+        self.assertFalse(result.converged.any())
+        np.testing.assert_array_equal(result.params, 0.5)
+
+    def test_wrong_model(self):
+        with self.assertRaises(ValueError):
+            fit.fit_spectra('not a model', self.x, np.zeros((2, 101)), p0=[0, 0])
+        with self.assertRaises(ValueError):
+            fit.fit_spectra('linear', self.x, np.zeros((2, 101)), p0=[0, 0, 0])
+
+    def test_grid_fit(self):
+        data = np.zeros((3, 4, 13))
+        data[..., 0] = -1
+        data[..., 1] = 1
+        data[..., 5:] = np.arange(12).reshape(3, 4, 1) * np.linspace(-1, 1, 8) + 2
+        fname = write_grid(os.path.join(self.temp_dir.name, 'grid.3ds'), data)
+        result = nap.read.Grid(fname).fit('Current (A)', 'linear', p0=[0, 0])
+
+        np.testing.assert_allclose(result.params[..., 0], np.arange(12).reshape(3, 4), atol=1e-5)
+        np.testing.assert_allclose(result.params[..., 1], 2, atol=1e-5)
+
+    def test_grid_fit_backward(self):
+        bias = np.linspace(-1, 1, 8)
+        slope = np.arange(1, 13).reshape(3, 4, 1)
+        data = np.zeros((3, 4, 21))
+        data[..., 0] = -1
+        data[..., 1] = 1
+        data[..., 5:13] = slope * bias + 2
+        # backward channel stored in sweep order, with its own slope and offset
+        data[..., 13:] = -0.5 * slope * bias + 3
+        fname = write_grid(os.path.join(self.temp_dir.name, 'grid.3ds'), data,
+                           channels=('Current (A)', 'Current [bwd] (A)'))
+        grid = nap.read.Grid(fname)
+        result = grid.fit('Current (A)', 'linear', p0=[0, 0], direction='backward')
+
+        np.testing.assert_allclose(result.params[..., 0], -0.5 * slope[..., 0], atol=1e-5)
+        np.testing.assert_allclose(result.params[..., 1], 3, atol=1e-5)
+        result = grid.fit('Current (A)', 'linear', p0=[0, 0])
+        np.testing.assert_allclose(result.params[..., 0], slope[..., 0], atol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
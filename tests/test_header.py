@@ -0,0 +1,91 @@
+import unittest
+import tempfile
+import os
+import pickle
+import numpy as np
+
+import nanonispy as nap
+from nanonispy.header import LazyHeader, TypedHeader
+
+
+class TestTypedHeader(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_dummy_spec_data(self):
+        """
+        return filename of the test .dat file with \\r\\n line endings
+        """
+        base = os.path.dirname(__file__)
+        with open(base + '/Bias-Spectroscopy002.dat', 'rb') as f:
+            raw = f.read().replace(b'\n', b'\r\n')
+        fname = os.path.join(self.temp_dir.name, 'spec.dat')
+        with open(fname, 'wb') as f:
+            f.write(raw)
+        return fname
+
+    def test_value_conversion(self):
+        header = TypedHeader({'Bias>Bias (V)': '-199.609E-3',
+                              'Order': '6',
+                              'Z-Ctrl hold': 'TRUE',
+                              'Final Z (m)': 'N/A',
+                              'Bias Spectroscopy>Channels': 'Current (A);Bias (V)',
+                              'Grid settings': ['4.0E-8', '-4.3E-8', '1.5E-7'],
+                              'dim_px': [230, 230]})
+
+        self.assertEqual(header['Bias>Bias (V)'], -199.609e-3)
+        self.assertIsInstance(header['Order'], int)
+        self.assertIs(header['Z-Ctrl hold'], True)
+        self.assertEqual(header['Final Z (m)'], 'N/A')
+        self.assertEqual(header['Bias Spectroscopy>Channels'], ['Current (A)', 'Bias (V)'])
+        np.testing.assert_array_equal(header['Grid settings'], [4.0e-8, -4.3e-8, 1.5e-7])
+        self.assertEqual(header['Grid settings'].dtype, np.float64)
+        np.testing.assert_array_equal(header['dim_px'], [230, 230])
+
+    def test_lazy_header_conversion(self):
+        values = {'Order': '6', 'Z-Ctrl hold': 'TRUE', 'Bias>Bias (V)': '-199.609E-3',
+                  'Bias Spectroscopy>Channels': 'Current (A);Bias (V)',
+                  'Sweep>Limits': '-1E+0;1E+0', 'Final Z (m)': 'N/A'}
+        header, typed = LazyHeader(values), TypedHeader(values)
+
+        self.assertIsInstance(header['Order'], int)
+        self.assertIs(header['Z-Ctrl hold'], True)
+        for key in values:
+            np.testing.assert_equal(header[key], typed[key])
+        self.assertEqual(header.raw('Order'), '6')
+
+    def test_attribute_access(self):
+        header = TypedHeader({'Bias>Bias (V)': '0.1', 'Z-Controller>Z (m)': '1E-9',
+                              '# Parameters (4 byte)': '10'})
+
+        self.assertEqual(header.bias_bias_v, 0.1)
+        self.assertEqual(header.z_controller_z_m, 1e-9)
+        self.assertEqual(header.parameters_4_byte, 10)
+        self.assertIn('bias_bias_v', dir(header))
+        with self.assertRaises(AttributeError):
+            header.not_an_entry
+
+    def test_nested_and_pickle(self):
+        header = TypedHeader({'data_info': {'Name': ('Z', 'Input_3'),
+                                            'Calibration': ('-3.480E-9', '1.000E-9')}})
+        np.testing.assert_array_equal(header.data_info.calibration, [-3.48e-9, 1e-9])
+
+        header2 = pickle.loads(pickle.dumps(header))
+        self.assertIs(header2._layout, header._layout)
+        self.assertEqual(header2.data_info['Name'], ['Z', 'Input_3'])
+
+    def test_spec_typed_header(self):
+        SP = nap.read.Spec(self.create_dummy_spec_data())
+
+        self.assertIs(SP.typed_header, SP.typed_header)
+        self.assertEqual(SP.typed_header.x_m, -19.4904e-9)
+        self.assertEqual(SP.typed_header['Date'], '04.08.2015 08:49:41')
+        self.assertEqual(SP.header['X (m)'], '-19.4904E-9')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import tempfile
+import os
+
+import nanonispy as nap
+
+from .common import CountingFile, write_grid
+
+
+class TestLoadProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_dummy_grid_data(self, suffix='.3ds'):
+        """
+        return tempfile file object with a small dummy grid
+        """
+        f = tempfile.NamedTemporaryFile(mode='wb',
+                                        suffix=suffix,
+                                        dir=self.temp_dir.name,
+                                        delete=False)
+        f.close()
+        write_grid(f.name, nx=8, ny=6, points=16)
+
+        return f
+
+    def test_phases_recorded(self):
+        f = self.create_dummy_grid_data()
+        with nap.LoadProfiler() as prof:
+            nap.read.Grid(f.name)
+
+        phases = [rec.phase for rec in prof.records]
+        self.assertEqual(phases, ['start_byte', 'read_raw_header', 'parse_header',
+                                  'read_data', 'reshape'])
+        read_data = prof.records[3]
+        self.assertEqual(read_data.cls, 'Grid')
+        self.assertEqual(read_data.nbytes, 6*8*(5+16)*4)
+
+    def test_bytes_read(self):
+        f = self.create_dummy_grid_data()
+        with CountingFile(f.name) as fh, nap.LoadProfiler() as prof:
+            nap.read.Grid(fh)
+
+        start_byte, read_raw_header = prof.records[:2]
+        # the small file fits in the first header block
+        self.assertEqual(start_byte.nbytes, os.path.getsize(f.name))
+        self.assertEqual(read_raw_header.nbytes, 0)
+        self.assertEqual(sum(rec.nbytes for rec in prof.records), fh.bytes_read)
+
+    def test_summary_aggregates_loads(self):
+        f = self.create_dummy_grid_data()
+        spec = os.path.join(os.path.dirname(__file__), 'Bias-Spectroscopy002.dat')
+        with nap.LoadProfiler() as prof:
+            nap.read.Grid(f.name)
+            nap.read.Grid(f.name)
+            nap.read.Spec(spec)
+
+        summary = prof.summary()
+        self.assertEqual(summary[('Grid', 'read_data')]['count'], 2)
+        self.assertEqual(summary[('Spec', 'read_data')]['count'], 1)
+        self.assertIsNone(summary[('Grid', 'reshape')]['peak_memory'])
+        self.assertIn('read_data', prof.report())
+
+    def test_callback_and_memory(self):
+        f = self.create_dummy_grid_data()
+        seen = []
+        with nap.LoadProfiler(callback=seen.append, trace_memory=True) as prof:
+            nap.read.Grid(f.name)
+
+        self.assertEqual(seen, prof.records)
+        self.assertGreater(prof.summary()[('Grid', 'read_data')]['peak_memory'], 0)
+
+    def test_inactive_outside_context(self):
+        f = self.create_dummy_grid_data()
+        prof = nap.LoadProfiler()
+        with prof:
+            pass
+        nap.read.Grid(f.name)
+        self.assertEqual(prof.records, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import numpy as np
+
+from nanonispy import qpi
+
+
+class TestFFTStack(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.data = rng.standard_normal((16, 16, 10)).astype('>f4')
+
+    def test_matches_single_slices(self):
+        out = qpi.fft_stack(self.data, chunk_size=3)
+
+        self.assertEqual(out.dtype, np.float32)
+        self.assertEqual(out.shape, self.data.shape)
+        for i in range(self.data.shape[2]):
+            expected = np.fft.fftshift(np.abs(np.fft.fft2(self.data[:, :, i])))
+            np.testing.assert_allclose(out[:, :, i], expected, rtol=1e-4, atol=1e-4)
+
+    def test_workers(self):
+        np.testing.assert_array_equal(qpi.fft_stack(self.data, chunk_size=2),
+                                      qpi.fft_stack(self.data, chunk_size=2, workers=3))
+
+    def test_window(self):
+        out = qpi.fft_stack(self.data, window='hann')
+        win = np.outer(np.hanning(16), np.hanning(16))
+        expected = np.fft.fftshift(np.abs(np.fft.fft2(self.data[:, :, 0] * win)))
+        np.testing.assert_allclose(out[:, :, 0], expected, rtol=1e-4, atol=1e-4)
+
+    def test_c4_symmetric(self):
+        out = qpi.fft_stack(self.data, symmetrize='c4')
+        # rotate by 90 degrees around the zero q pixel at (8, 8)
+        rotated = np.roll(np.rot90(out, axes=(0, 1)), 1, axis=0)
+        np.testing.assert_allclose(out, rotated, rtol=1e-5)
+
+    def test_mirror_odd_size(self):
+        out = qpi.fft_stack(self.data[:15, :15], symmetrize='mirror')
+        np.testing.assert_allclose(out, out[:, ::-1], rtol=1e-5)
+
+    def test_c4_needs_square(self):
+        with self.assertRaises(ValueError):
+            qpi.fft_stack(self.data[:8], symmetrize='c4')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,31 @@
 import unittest
 import tempfile
+import io
 import os
+import gzip
+import zipfile
+import pickle
+import hashlib
+import zlib
 import numpy as np
 import warnings
 from pathlib import Path
 
 import nanonispy as nap
 
+from .common import CountingFile, write_grid
+
+try:
+    import fsspec
+except ImportError:
+    fsspec = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
 class TestNanonisFileBaseClass(unittest.TestCase):
     """
     Testing class for NanonisFile base class.
@@ -136,6 +155,26 @@ class TestNanonisFileBaseClass(unittest.TestCase):
         self.assertEqual(expected_result, NF.header_raw)
 
 
+    def test_header_detection_reads_header_only(self):
+        f = tempfile.NamedTemporaryFile(mode='wb',
+                                        suffix='.3ds',
+                                        dir=self.temp_dir.name,
+                                        delete=False)
+        f.write(b'header_entry\n:HEADER_END:\n')
+        f.write(bytes(10**6))
+        f.close()
+
+        with CountingFile(f.name) as fobj:
+            NF = nap.read.NanonisFile(fobj)
+            self.assertEqual(NF.byte_offset, 26)
+            self.assertLess(fobj.bytes_read, 10**5)
+            self.assertFalse(fobj.closed)
+
+    def test_anonymous_file_like_needs_filetype(self):
+        with self.assertRaises(nap.read.UnhandledFileError):
+            nap.read.NanonisFile(io.BytesIO(b':HEADER_END:'))
+
+
 class TestGridFile(unittest.TestCase):
 
     def setUp(self):
@@ -176,6 +215,66 @@ class TestGridFile(unittest.TestCase):
 
         return f
 
+    def create_small_grid_data(self, experiment_parameters, num_param):
+        """
+        return tempfile file object of a 4 x 3 grid with custom parameters
+        """
+        f = tempfile.NamedTemporaryFile(mode='wb',
+                                        suffix='.3ds',
+                                        dir=self.temp_dir.name,
+                                        delete=False)
+        f.close()
+        write_grid(f.name, parameters=experiment_parameters, num_param=num_param)
+
+        return f
+
+    def create_segmented_grid_data(self):
+        """
+        return tempfile file object of a 4 x 3 grid with a backward
+        channel and a two segment sweep of 3 + 5 points
+        """
+        f = tempfile.NamedTemporaryFile(mode='wb',
+                                        suffix='.3ds',
+                                        dir=self.temp_dir.name,
+                                        delete=False)
+        f.close()
+        write_grid(f.name, channels=('Current (A)', 'Current [bwd] (A)'),
+                   extra='Segment Start (V), Segment End (V), Settling (s), Integration (s), Steps (xn)=-1.0E+0,-5.0E-1,1E-3,1E-3,3;0.0E+0,1.0E+0,1E-3,1E-3,5\r\n')
+
+        return f
+
+    def test_sweep_segments(self):
+        f = self.create_segmented_grid_data()
+        GF = nap.read.Grid(f.name)
+
+        self.assertEqual(GF.segments, [(-1.0, -0.5, 3), (0.0, 1.0, 5)])
+        np.testing.assert_allclose(GF.signals['sweep_signal'],
+                                   [-1, -0.75, -0.5, 0, 0.25, 0.5, 0.75, 1])
+        sweep, data = GF.sweep_view('Current (A)', segment=1)
+        np.testing.assert_allclose(sweep, [0, 0.25, 0.5, 0.75, 1])
+        np.testing.assert_array_equal(data, GF.signals['Current (A)'][:, :, 3:])
+        self.assertTrue(np.shares_memory(data, GF.signals['Current (A)']))
+
+    def test_backward_sweep_view(self):
+        f = self.create_segmented_grid_data()
+        GF = nap.read.Grid(f.name)
+        bwd = GF.signals['Current [bwd] (A)']
+
+        self.assertEqual(GF.bwd_channels, {'Current (A)': 'Current [bwd] (A)'})
+        # stored in sweep order, lined up with the sweep signal as is
+        sweep, data = GF.sweep_view('Current (A)', direction='backward')
+        np.testing.assert_array_equal(data, bwd)
+        self.assertIs(sweep, GF.signals['sweep_signal'])
+        self.assertTrue(np.shares_memory(data, bwd))
+
+        # acquisition order, data and sweep reversed together
+        sweep, data = GF.sweep_view('Current (A)', direction='backward', segment=0, align=False)
+        np.testing.assert_array_equal(data, bwd[:, :, 2::-1])
+        np.testing.assert_allclose(sweep, [-0.5, -0.75, -1])
+        self.assertTrue(np.shares_memory(data, bwd))
+        with self.assertRaises(KeyError):
+            GF.sweep_view('Current [bwd] (A)', direction='backward')
+
     def test_is_instance_grid_file(self):
         """
         Check for correct instance of Grid object.
@@ -258,6 +357,358 @@ class TestGridFile(unittest.TestCase):
         GF = nap.read.Grid(f.name, header_override=header_override)
         self.assertEqual(GF.header['sweep_signal'], header_override['Sweep Signal'])
 
+    def test_parameters_are_views(self):
+        f = self.create_dummy_grid_data()
+        GF = nap.read.Grid(f.name)
+
+        self.assertEqual(GF.parameter_names[:5],
+                         ['Sweep Start', 'Sweep End', 'X (m)', 'Y (m)', 'Z (m)'])
+        self.assertEqual(GF.parameters.shape, (230, 230))
+        self.assertTrue(np.shares_memory(GF.parameters['Z (m)'], GF.signals['params']))
+        np.testing.assert_array_equal(GF.parameters['Final Z (m)'], GF.signals['params'][:, :, 9])
+        np.testing.assert_array_equal(GF.signals['topo'], GF.signals['params'][:, :, 4])
+
+    def test_topo_found_by_name(self):
+        f = self.create_small_grid_data('Z (m);Current (A);Current (A)', 5)
+        GF = nap.read.Grid(f.name)
+
+        self.assertEqual(GF.parameter_names,
+                         ['Sweep Start', 'Sweep End', 'Z (m)', 'Current (A)', 'Current (A) #2'])
+        np.testing.assert_array_equal(GF.signals['topo'], GF.signals['params'][:, :, 2])
+        self.assertEqual(GF.signals['sweep_signal'][-1], 1.0)
+
+    def test_topo_fallback_warns(self):
+        f = self.create_small_grid_data('X (m);Y (m);Height (m)', 6)
+        with self.assertWarns(UserWarning):
+            GF = nap.read.Grid(f.name)
+
+        self.assertEqual(GF.parameter_names[-1], 'Parameter 5')
+        np.testing.assert_array_equal(GF.signals['topo'], GF.signals['params'][:, :, 4])
+
+    def test_topo_preview(self):
+        f = self.create_dummy_grid_data()
+        GF = nap.read.Grid(f.name)
+        with CountingFile(f.name) as fobj:
+            GF2 = nap.read.Grid(fobj, load_data=False)
+            preview = GF2.topo_preview(max_px=64)
+            bytes_read = fobj.bytes_read
+
+        self.assertIsNone(GF2.signals)
+        self.assertEqual(preview.shape, (58, 58))
+        np.testing.assert_array_equal(preview, GF.signals['topo'][::4, ::4])
+        np.testing.assert_array_equal(preview, GF.topo_preview(max_px=64))
+        self.assertLess(bytes_read, os.path.getsize(f.name) // 2)
+
+    def test_topo_preview_roi(self):
+        f = self.create_dummy_grid_data()
+        roi = (slice(10, 100), slice(30, 230))
+        GF = nap.read.Grid(f.name, roi=roi)
+        GF2 = nap.read.Grid(f.name, roi=roi, load_data=False)
+
+        preview = GF.topo_preview(max_px=64)
+        self.assertEqual(preview.shape, (23, 50))
+        np.testing.assert_array_equal(preview, GF.signals['topo'][::4, ::4])
+        np.testing.assert_array_equal(GF2.topo_preview(max_px=64), preview)
+
+    def test_mean_spectrum_streamed(self):
+        f = self.create_dummy_grid_data()
+        GF = nap.read.Grid(f.name)
+        expected = GF.signals['Input 3 (A)'].mean(axis=(0, 1), dtype=np.float64)
+        GF2 = nap.read.Grid(f.name, load_data=False)
+
+        np.testing.assert_allclose(GF2.mean_spectrum('Input 3 (A)', chunk_rows=17), expected)
+        np.testing.assert_allclose(GF2.mean_spectrum('Input 3 (A)', chunk_rows=17, workers=3),
+                                   expected)
+        np.testing.assert_allclose(GF.mean_spectrum('Input 3 (A)'), expected)
+
+    def test_reduce_streamed(self):
+        f = self.create_dummy_grid_data()
+        GF = nap.read.Grid(f.name)
+        GF2 = nap.read.Grid(f.name, load_data=False)
+        chann = GF.signals['Input 3 (A)']
+
+        np.testing.assert_array_equal(GF2.reduce(np.max, 'Input 3 (A)', axis=2, chunk_rows=50),
+                                      chann.max(axis=2))
+        np.testing.assert_array_equal(GF2.reduce(np.min, 'params', axis=(0, 1), workers=2,
+                                                 chunk_rows=50),
+                                      GF.signals['params'].min(axis=(0, 1)))
+        counts = GF2.reduce(lambda a, axis: np.histogram(a, 10, (0, 100))[0], 'Input 3 (A)',
+                            combine=lambda p: p.sum(axis=0), chunk_rows=64)
+        np.testing.assert_array_equal(counts, np.histogram(chann, 10, (0, 100))[0])
+
+    def test_reduce_streamed_roi(self):
+        fname = write_grid(os.path.join(self.temp_dir.name, 'grid.3ds'), nx=5, ny=6)
+        roi = (slice(1, 4), slice(2, 5))
+        GF = nap.read.Grid(fname, roi=roi)
+        GF2 = nap.read.Grid(fname, roi=roi, load_data=False)
+
+        blocks = list(GF2.iter_chunks(chunk_rows=2))
+        self.assertEqual([start for start, _ in blocks], [0, 2])
+        np.testing.assert_array_equal(np.concatenate([b for _, b in blocks]), GF._griddata)
+        self.assertEqual(next(GF2.iter_chunks())[1].shape, (3, 3, 13))
+
+        expected = GF.signals['Current (A)'].max(axis=2)
+        self.assertEqual(expected.shape, (3, 3))
+        np.testing.assert_array_equal(GF2.reduce(np.max, 'Current (A)', axis=2, chunk_rows=2),
+                                      expected)
+        np.testing.assert_array_equal(GF2.reduce(np.max, 'Current (A)', axis=2, workers=2),
+                                      expected)
+        np.testing.assert_allclose(GF2.mean_spectrum('Current (A)', chunk_rows=1),
+                                   GF.mean_spectrum('Current (A)'))
+
+    def test_validate(self):
+        f = self.create_small_grid_data('X (m);Y (m);Z (m)', 5)
+        with open(f.name, 'rb') as fobj:
+            raw = fobj.read()
+        report = nap.read.Grid(f.name, load_data=False).validate(checksum='crc32')
+
+        self.assertTrue(report['complete'])
+        self.assertEqual(report['expected_size'], 12 * 13 * 4)
+        self.assertEqual(report['extra_bytes'], 0)
+        self.assertEqual((report['completed'], report['total']), (12, 12))
+        self.assertEqual(report['checksum'], '{:08x}'.format(zlib.crc32(raw)))
+        self.assertEqual(nap.read.Grid(f.name).validate('sha256')['checksum'],
+                         hashlib.sha256(raw).hexdigest())
+        with self.assertRaises(ValueError):
+            nap.read.Grid(f.name, load_data=False).validate('not a checksum')
+
+    def test_validate_incomplete(self):
+        f = self.create_small_grid_data('X (m);Y (m);Z (m)', 5)
+        with open(f.name, 'rb+') as fobj:
+            fobj.truncate(os.path.getsize(f.name) - 4 * 13 * 2 - 6)
+        report = nap.read.Grid(f.name, load_data=False).validate()
+
+        self.assertFalse(report['complete'])
+        self.assertEqual(report['completed'], 9)
+        with self.assertWarns(UserWarning):
+            nap.read.Grid(f.name)
+
+    def test_validate_gzip(self):
+        f = self.create_small_grid_data('X (m);Y (m);Z (m)', 5)
+        with open(f.name, 'rb') as fobj, gzip.open(f.name + '.gz', 'wb') as gz:
+            gz.write(fobj.read())
+        report = nap.read.Grid(f.name + '.gz', load_data=False).validate()
+
+        self.assertEqual(report, nap.read.Grid(f.name, load_data=False).validate())
+
+    def test_threaded_load(self):
+        f = self.create_dummy_grid_data()
+        GF = nap.read.Grid(f.name)
+        GF2 = nap.read.Grid(f.name, threads=4)
+        GF3 = nap.read.Grid(f.name, threads=3, roi=(slice(7, 100), slice(2, 30)))
+
+        self.assertEqual(GF2.signals['Input 3 (A)'].dtype, GF.signals['Input 3 (A)'].dtype)
+        self.assertTrue(GF.signals['Input 3 (A)'].dtype.isnative)
+        self.assertEqual(GF.data_format, '>f4')
+        np.testing.assert_array_equal(GF.signals['Input 3 (A)'], GF2.signals['Input 3 (A)'])
+        np.testing.assert_array_equal(GF.signals['topo'], GF2.signals['topo'])
+        np.testing.assert_array_equal(GF.signals['Input 3 (A)'][7:100, 2:30],
+                                      GF3.signals['Input 3 (A)'])
+
+    def test_threaded_load_incomplete(self):
+        f = self.create_small_grid_data('X (m);Y (m);Z (m)', 5)
+        with open(f.name, 'rb+') as fobj:
+            fobj.truncate(os.path.getsize(f.name) - 4 * 13 * 5)
+        GF = nap.read.Grid(f.name)
+        GF2 = nap.read.Grid(f.name, threads=2)
+
+        np.testing.assert_array_equal(GF.signals['Current (A)'], GF2.signals['Current (A)'])
+        self.assertEqual(GF2.signals['Current (A)'][-1, -1, -1], 0)
+
+    def test_mmap(self):
+        f = self.create_dummy_grid_data()
+        GF = nap.read.Grid(f.name)
+        GF2 = nap.read.Grid(f.name, mmap=True, roi=(slice(5, 9), None))
+
+        self.assertIsInstance(GF2.signals['Input 3 (A)'].base, np.memmap)
+        np.testing.assert_array_equal(GF.signals['Input 3 (A)'][5:9], GF2.signals['Input 3 (A)'])
+        np.testing.assert_array_equal(GF.signals['topo'][5:9], GF2.parameters['Z (m)'])
+
+    def test_storage_dtype(self):
+        f = self.create_dummy_grid_data()
+        GF = nap.read.Grid(f.name)
+        chann = GF.signals['Input 3 (A)'][10:40]
+        chunk_size = nap.read._GRID_CHUNK_SIZE
+        nap.read._GRID_CHUNK_SIZE = 230*2088*7
+        try:
+            GF2 = nap.read.Grid(f.name, roi=(slice(10, 40), None), storage_dtype='int16')
+            GF3 = nap.read.Grid(f.name, roi=(slice(10, 40), None), storage_dtype='float16')
+        finally:
+            nap.read._GRID_CHUNK_SIZE = chunk_size
+
+        self.assertEqual(GF2.signals['Input 3 (A)'].dtype, np.int16)
+        self.assertEqual(GF3.signals['Input 3 (A)'].dtype, np.float16)
+        np.testing.assert_array_equal(GF2.signals['topo'], GF.signals['topo'][10:40])
+        for grid in (GF2, GF3):
+            q = grid.quantization['Input 3 (A)']
+            error = np.abs(grid.dequantize('Input 3 (A)') - chann.astype(np.float64))
+            # dequantized values are float32
+            self.assertAlmostEqual(q.max_error, error.max(), delta=1e-6 * np.abs(chann).max())
+            self.assertLessEqual(q.rms_error, q.max_error)
+        self.assertLessEqual(GF2.quantization['Input 3 (A)'].max_error,
+                             GF2.quantization['Input 3 (A)'].scale / 2 * (1 + 1e-6))
+
+        np.testing.assert_allclose(GF2.mean_spectrum('Input 3 (A)'), chann.mean(axis=(0, 1)),
+                                   atol=GF2.quantization['Input 3 (A)'].max_error)
+        row_start, block = next(GF2.iter_chunks(chunk_rows=5))
+        np.testing.assert_allclose(block[:, :, 10:], chann[:5], atol=GF2.quantization['Input 3 (A)'].max_error)
+        np.testing.assert_array_equal(block[:, :, :10], GF.signals['params'][10:15])
+
+        with self.assertRaises(ValueError):
+            nap.read.Grid(f.name, mmap=True, storage_dtype='int16')
+        with self.assertRaises(ValueError):
+            nap.read.Grid(f.name, storage_dtype='uint8')
+
+    def test_strategy_auto(self):
+        f = self.create_dummy_grid_data()
+        nbytes = 230*230*522*4
+
+        GF = nap.read.Grid(f.name, strategy='auto', memory_budget=nbytes)
+        self.assertEqual((GF.strategy, GF.data_nbytes), ('eager', nbytes))
+        GF2 = nap.read.Grid(f.name, strategy='auto', memory_budget=nbytes - 1)
+        self.assertEqual(GF2.strategy, 'memmap')
+        self.assertIsInstance(GF2.signals['Input 3 (A)'].base, np.memmap)
+        GF3 = nap.read.Grid(f.name, strategy='auto', memory_budget=nbytes * 3 // 5, storage_dtype='int16')
+        self.assertEqual(GF3.strategy, 'eager')
+        self.assertEqual(GF3.data_nbytes, 230*230*(10*4 + 512*2))
+
+        with open(f.name, 'rb+') as fobj:
+            fobj.truncate(os.path.getsize(f.name) - 4)
+        GF4 = nap.read.Grid(f.name, strategy='auto', memory_budget=nbytes - 1)
+        self.assertEqual(GF4.strategy, 'chunked')
+        self.assertIsNone(GF4.signals)
+        self.assertEqual(nap.read.Grid(f.name, load_data=False).strategy, 'chunked')
+
+        with self.assertRaises(ValueError):
+            nap.read.Grid(f.name, strategy='lazy')
+
+    def test_default_memory_budget(self):
+        meminfo = os.path.join(self.temp_dir.name, 'meminfo')
+        with open(meminfo, 'w') as f:
+            f.write('MemTotal:       16000000 kB\nMemFree:          100000 kB\n'
+                    'MemAvailable:    8000000 kB\n')
+        path = nap.read._MEMINFO
+        nap.read._MEMINFO = meminfo
+        try:
+            self.assertEqual(nap.read._default_memory_budget(), 8000000 * 1024 // 2)
+            nap.read._MEMINFO = os.path.join(self.temp_dir.name, 'missing')
+            self.assertEqual(nap.read._default_memory_budget(), nap.read._DEFAULT_MEMORY_BUDGET)
+        finally:
+            nap.read._MEMINFO = path
+
+    def test_mmap_needs_local_file(self):
+        f = self.create_dummy_grid_data()
+        with open(f.name, 'rb') as fobj:
+            with self.assertRaises(ValueError):
+                nap.read.Grid(fobj, mmap=True)
+
+    def test_fft_stack(self):
+        f = self.create_small_grid_data('X (m);Y (m);Z (m)', 5)
+        GF = nap.read.Grid(f.name)
+        out = GF.fft_stack('Current (A)')
+
+        self.assertEqual(out.shape, (3, 4, 8))
+        expected = np.fft.fftshift(np.abs(np.fft.fft2(GF.signals['Current (A)'][:, :, 2])))
+        np.testing.assert_allclose(out[:, :, 2], expected, rtol=1e-5)
+        with self.assertRaises(ValueError):
+            nap.read.Grid(f.name, load_data=False).fft_stack('Current (A)')
+
+    def test_file_like_grid(self):
+        f = self.create_dummy_grid_data()
+        GF = nap.read.Grid(f.name)
+        with open(f.name, 'rb') as fobj:
+            GF2 = nap.read.Grid(io.BytesIO(fobj.read()))
+
+        np.testing.assert_array_equal(GF.signals['Input 3 (A)'], GF2.signals['Input 3 (A)'])
+
+    def test_roi(self):
+        f = self.create_dummy_grid_data()
+        GF = nap.read.Grid(f.name)
+        rows, cols = slice(10, 20), slice(5, 50)
+        with CountingFile(f.name) as fobj:
+            GF2 = nap.read.Grid(fobj, roi=(rows, cols))
+            bytes_read = fobj.bytes_read
+
+        self.assertEqual(GF2.signals['Input 3 (A)'].shape, (10, 45, 512))
+        np.testing.assert_array_equal(GF.signals['Input 3 (A)'][rows, cols],
+                                      GF2.signals['Input 3 (A)'])
+        np.testing.assert_array_equal(GF.signals['topo'][rows, cols], GF2.signals['topo'])
+        self.assertLess(bytes_read, 10*46*2088 + 10**5)
+
+    def test_gzip_grid(self):
+        f = self.create_dummy_grid_data()
+        with open(f.name, 'rb') as fobj, gzip.open(f.name + '.gz', 'wb', compresslevel=1) as gz:
+            gz.write(fobj.read())
+        GF = nap.read.Grid(f.name)
+        GF2 = nap.read.Grid(f.name + '.gz')
+
+        self.assertEqual(GF2.filetype, 'grid')
+        np.testing.assert_array_equal(GF.signals['Input 3 (A)'], GF2.signals['Input 3 (A)'])
+        np.testing.assert_array_equal(GF.signals['sweep_signal'], GF2.signals['sweep_signal'])
+
+    def test_zip_member_grid(self):
+        f = self.create_dummy_grid_data()
+        archive = os.path.join(self.temp_dir.name, 'grids.zip')
+        with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_DEFLATED,
+                             compresslevel=1) as zf:
+            zf.write(f.name, 'session/grid.3ds')
+        GF = nap.read.Grid(f.name)
+        GF2 = nap.read.Grid(archive + '/session/grid.3ds')
+
+        np.testing.assert_array_equal(GF.signals['topo'], GF2.signals['topo'])
+
+    def test_compressed_wrong_filetype(self):
+        with self.assertRaises(nap.read.UnhandledFileError):
+            nap.read.Grid(os.path.join(self.temp_dir.name, 'scan.sxm.gz'))
+
+    @unittest.skipIf(fsspec is None, 'fsspec is not installed')
+    def test_fsspec_url(self):
+        f = self.create_dummy_grid_data()
+        with open(f.name, 'rb') as fobj:
+            fsspec.filesystem('memory').pipe('/grids/test.3ds', fobj.read())
+        GF = nap.read.Grid(f.name)
+        GF2 = nap.read.Grid('memory://grids/test.3ds')
+
+        self.assertEqual(GF2.basename, 'test.3ds')
+        np.testing.assert_array_equal(GF.signals['Input 3 (A)'], GF2.signals['Input 3 (A)'])
+
+
+    def test_pickle_roundtrip(self):
+        f = self.create_small_grid_data('X (m);Y (m);Z (m)', 5)
+        GF = nap.read.Grid(f.name)
+        buffers = []
+        GF2 = pickle.loads(pickle.dumps(GF, protocol=5, buffer_callback=buffers.append),
+                           buffers=buffers)
+
+        # data buffer is serialized once, out-of-band, not once per view
+        self.assertEqual(sum(buf.raw().nbytes for buf in buffers),
+                         GF._griddata.nbytes + GF.signals['sweep_signal'].nbytes)
+        for key in GF.signals:
+            np.testing.assert_array_equal(GF.signals[key], GF2.signals[key])
+        self.assertTrue(np.shares_memory(GF2.signals['Current (A)'], GF2.parameters))
+        self.assertEqual(GF.header, GF2.header)
+
+    def test_pickle_mmap_by_path(self):
+        f = self.create_dummy_grid_data()
+        GF = nap.read.Grid(f.name, mmap=True, roi=(slice(5, 9), None))
+        data = pickle.dumps(GF)
+        GF2 = pickle.loads(data)
+
+        self.assertLess(len(data), 1 << 16)
+        self.assertIsInstance(GF2.signals['Input 3 (A)'].base, np.memmap)
+        np.testing.assert_array_equal(GF.signals['Input 3 (A)'], GF2.signals['Input 3 (A)'])
+        np.testing.assert_array_equal(GF.signals['topo'], GF2.signals['topo'])
+
+    def test_pickle_file_like_not_loaded(self):
+        f = self.create_dummy_grid_data()
+        with open(f.name, 'rb') as fobj:
+            GF = nap.read.Grid(fobj, load_data=False)
+            GF2 = pickle.loads(pickle.dumps(GF))
+
+        self.assertIsNone(GF2.signals)
+        with self.assertRaises(ValueError):
+            GF2.topo_preview()
+
 
 class TestScanFile(unittest.TestCase):
     def setUp(self):
@@ -335,6 +786,180 @@ class TestScanFile(unittest.TestCase):
             f = self.create_dummy_scan_data(suffix='.3ds')
             SF = nap.read.Scan(f.name)
 
+    def test_channel_selection(self):
+        f = self.create_dummy_scan_data()
+        SF = nap.read.Scan(f.name)
+        with CountingFile(f.name) as fobj:
+            SF2 = nap.read.Scan(fobj, channels=['LIX_1_omega'])
+            bytes_read = fobj.bytes_read
+
+        self.assertEqual(list(SF2.signals), ['LIX_1_omega'])
+        np.testing.assert_array_equal(SF.signals['LIX_1_omega']['backward'],
+                                      SF2.signals['LIX_1_omega']['backward'])
+        self.assertLessEqual(bytes_read, nap.read._HEADER_BLOCK_SIZE + 2*64*64*4)
+
+    def test_preview(self):
+        f = self.create_dummy_scan_data()
+        SF = nap.read.Scan(f.name)
+        with CountingFile(f.name) as fobj:
+            SF2 = nap.read.Scan(fobj, load_data=False)
+            preview = SF2.preview('Input_3', max_px=16, direction='backward')
+            bytes_read = fobj.bytes_read
+
+        self.assertIsNone(SF2.signals)
+        np.testing.assert_array_equal(preview, SF.signals['Input_3']['backward'][::4, ::4])
+        self.assertLessEqual(bytes_read, nap.read._HEADER_BLOCK_SIZE + 16*64*4)
+
+    def test_preview_pyramid_cached(self):
+        f = self.create_dummy_scan_data()
+        SF = nap.read.Scan(f.name, load_data=False)
+        fine = SF.preview('Z', max_px=32)
+        os.remove(f.name)
+        coarse = SF.preview('Z', max_px=8)
+
+        np.testing.assert_array_equal(coarse, fine[::4, ::4])
+        self.assertIs(SF.preview('Z', max_px=32), fine)
+
+    @unittest.skipIf(zstandard is None, 'zstandard is not installed')
+    def test_zstd_scan(self):
+        f = self.create_dummy_scan_data()
+        with open(f.name, 'rb') as fobj, open(f.name + '.zst', 'wb') as zst:
+            zst.write(zstandard.ZstdCompressor().compress(fobj.read()))
+        SF = nap.read.Scan(f.name)
+        SF2 = nap.read.Scan(f.name + '.zst', channels=['Input_3'])
+
+        np.testing.assert_array_equal(SF.signals['Input_3']['forward'],
+                                      SF2.signals['Input_3']['forward'])
+
+    def test_validate_images(self):
+        f = self.create_dummy_scan_data()
+        with open(f.name, 'rb+') as fobj:
+            fobj.truncate(os.path.getsize(f.name) - 64 * 4 * 3)
+        SF = nap.read.Scan(f.name, load_data=False)
+        report = SF.validate()
+
+        # the last backward image misses its last 3 lines
+        self.assertFalse(report['complete'])
+        self.assertEqual((report['completed'], report['total']), (4 * 2 - 1, 4 * 2))
+        self.assertEqual(report['image'], (SF.header['data_info']['Name'][3], 'backward'))
+        self.assertEqual(report['image_lines'], 64 - 3)
+
+        with open(f.name, 'rb+') as fobj:
+            fobj.truncate(SF.byte_offset + 64 * 64 * 4 * 2 + 64 * 4 * 10 + 7)
+        report = SF.validate()
+        self.assertEqual(report['completed'], 2)
+        self.assertEqual(report['image'], (SF.header['data_info']['Name'][1], 'forward'))
+        self.assertEqual(report['image_lines'], 10)
+
+    def test_storage_dtype(self):
+        f = self.create_dummy_scan_data()
+        SF = nap.read.Scan(f.name)
+        SF2 = nap.read.Scan(f.name, channels=['Input_3', 'Z'], storage_dtype='int16')
+
+        self.assertEqual(SF2.signals['Z']['backward'].dtype, np.int16)
+        for chann in ('Input_3', 'Z'):
+            q = SF2.quantization[chann]
+            values = SF.signals[chann]['backward'].astype(np.float64)
+            error = np.abs(SF2.dequantize(chann, 'backward') - values)
+            self.assertAlmostEqual(q.max_error, error.max(), delta=1e-6 * np.abs(values).max())
+            self.assertLessEqual(q.max_error, q.scale / 2 * (1 + 1e-6))
+        np.testing.assert_array_equal(SF2.preview('Z', max_px=16),
+                                      SF2.dequantize('Z')[::4, ::4])
+
+    def test_strategy_memmap(self):
+        f = self.create_dummy_scan_data()
+        SF = nap.read.Scan(f.name)
+        SF2 = nap.read.Scan(f.name, channels=['LIX_1_omega', 'Z'], strategy='auto', memory_budget=1000)
+
+        self.assertEqual((SF2.strategy, SF2.data_nbytes), ('memmap', 2*2*64*64*4))
+        self.assertEqual(list(SF2.signals), ['LIX_1_omega', 'Z'])
+        np.testing.assert_array_equal(SF.signals['LIX_1_omega']['backward'],
+                                      SF2.signals['LIX_1_omega']['backward'])
+        SF3 = pickle.loads(pickle.dumps(SF2))
+        self.assertIsInstance(SF3.signals['Z']['forward'].base, np.memmap)
+        np.testing.assert_array_equal(SF.signals['Z']['forward'], SF3.signals['Z']['forward'])
+
+        self.assertEqual(nap.read.Scan(f.name, strategy='auto').strategy, 'eager')
+        with open(f.name, 'rb') as fobj:
+            SF4 = nap.read.Scan(fobj, strategy='auto', memory_budget=1000)
+        self.assertEqual(SF4.strategy, 'chunked')
+        self.assertIsNone(SF4.signals)
+
+    def create_multipass_scan_data(self):
+        """
+        return tempfile file object of an 8 x 8 two pass scan, every
+        value of the file numbered in order
+        """
+        f = tempfile.NamedTemporaryFile(mode='wb',
+                                        suffix='.sxm',
+                                        dir=self.temp_dir.name,
+                                        delete=False)
+        f.write(b':SCAN_PIXELS:\n       8       8\n:SCAN_TIME:\n 1E+0 1E+0\n:SCAN_RANGE:\n 1E-8 1E-8\n:SCAN_OFFSET:\n 0 0\n:SCAN_ANGLE:\n 0.000E+0\n:SCAN_DIR:\nup\n:BIAS:\n 1E-1\n:ACQ_TIME:\n 1.0\n:Multipass-Config:\n\tRecord-Ch\tPlayback\tBias_override\tBias_override_value\n\t-1\tFALSE\tTRUE\t2.000E-1\n\t-1\tFALSE\tTRUE\t2.000E-1\n\t-1\tTRUE\tTRUE\t-2.000E-1\n\t-1\tTRUE\tTRUE\t-3.000E-1\n:DATA_INFO:\n\tChannel\tName\tUnit\tDirection\tCalibration\tOffset\n\t14\tZ\tm\tboth\t1.000E+0\t0.000E+0\n\t0\tCurrent\tA\tboth\t1.000E+0\t0.000E+0\n\t14\t[P2]_Z\tm\tboth\t1.000E+0\t0.000E+0\n\t0\t[P2]_Current\tA\tboth\t1.000E+0\t0.000E+0\n\n:SCANIT_END:\n')
+        # 4 bytes stand in for the \1A\04 code after the end tag
+        np.arange(-1, 4*2*8*8, dtype='>f4').tofile(f)
+        f.close()
+
+        return f
+
+    def test_multipass(self):
+        f = self.create_multipass_scan_data()
+        SF = nap.read.Scan(f.name)
+
+        self.assertEqual(sorted(SF.passes), [1, 2])
+        self.assertEqual(list(SF.passes[2]), ['Z', 'Current'])
+        self.assertIs(SF.passes[2]['Current']['backward'], SF.signals['[P2]_Current']['backward'])
+        self.assertEqual(SF.passes[2]['Z']['forward'][0, 0], 4*8*8)
+        self.assertEqual(SF.multipass_config[2]['backward']['Bias_override_value'], '-3.000E-1')
+        self.assertEqual(SF.multipass_config[2]['forward']['Playback'], 'TRUE')
+
+        SF2 = pickle.loads(pickle.dumps(SF))
+        self.assertIs(SF2.passes[1]['Z']['forward'], SF2.signals['Z']['forward'])
+
+    def test_multipass_selection(self):
+        f = self.create_multipass_scan_data()
+        SF = nap.read.Scan(f.name)
+        with CountingFile(f.name) as fobj:
+            SF2 = nap.read.Scan(fobj, passes=[2])
+            bytes_read = fobj.bytes_read
+
+        self.assertEqual(list(SF2.signals), ['[P2]_Z', '[P2]_Current'])
+        self.assertEqual(list(SF2.passes), [2])
+        np.testing.assert_array_equal(SF2.passes[2]['Current']['forward'],
+                                      SF.passes[2]['Current']['forward'])
+        self.assertLessEqual(bytes_read, nap.read._HEADER_BLOCK_SIZE + 2*2*8*8*4)
+
+        SF3 = nap.read.Scan(f.name, passes=[1, 2], channels=['[P2]_Current', 'Current'])
+        self.assertEqual(list(SF3.passes[1]), ['Current'])
+        np.testing.assert_array_equal(SF3.signals['Current']['backward'],
+                                      SF.signals['Current']['backward'])
+        with self.assertRaises(KeyError):
+            nap.read.Scan(f.name, passes=[3])
+
+        # a third pass configured but without recorded channels
+        with open(f.name, 'rb') as fobj:
+            raw = fobj.read()
+        row = b'\t-1\tTRUE\tTRUE\t-3.000E-1\n'
+        with open(f.name, 'wb') as fobj:
+            fobj.write(raw.replace(row, row * 3, 1))
+        self.assertIn(3, nap.read.Scan(f.name, load_data=False).multipass_config)
+        with self.assertRaises(KeyError):
+            nap.read.Scan(f.name, passes=[3])
+
+    def test_unknown_channel(self):
+        f = self.create_dummy_scan_data()
+        with self.assertRaises(KeyError):
+            nap.read.Scan(f.name, channels=['Not a channel'])
+
+    def test_pickle_roundtrip(self):
+        f = self.create_dummy_scan_data()
+        SF = nap.read.Scan(f.name, channels=['Z', 'LIX_1_omega'])
+        SF2 = pickle.loads(pickle.dumps(SF))
+
+        self.assertEqual(list(SF2.signals), ['Z', 'LIX_1_omega'])
+        np.testing.assert_array_equal(SF.signals['Z']['backward'], SF2.signals['Z']['backward'])
+        self.assertIs(SF2.signals['Z']['forward'].base,
+                      SF2.signals['LIX_1_omega']['backward'].base)
+
 class TestSpecFile(unittest.TestCase):
     def setUp(self):
         self.temp_dir = tempfile.TemporaryDirectory()
@@ -372,6 +997,90 @@ class TestSpecFile(unittest.TestCase):
             b = ''.join(sorted(test_dict[key]))
             self.assertEqual(a, b)
 
+    def test_pickle_roundtrip(self):
+        f = self.create_dummy_spec_data()
+        SP = nap.read.Spec(f.name)
+        SP2 = pickle.loads(pickle.dumps(SP))
+
+        self.assertEqual(list(SP.signals), list(SP2.signals))
+        for key in SP.signals:
+            np.testing.assert_array_equal(SP.signals[key], SP2.signals[key])
+
+    def create_long_spec_data(self, num_rows, suffix='.dat'):
+        """
+        return filename of a .dat file with a long 3 column table
+        """
+        fname = os.path.join(self.temp_dir.name, 'history' + suffix)
+        opener = gzip.open if suffix.endswith('.gz') else open
+        rows = np.arange(num_rows * 3, dtype=float).reshape(-1, 3) / 4
+        with opener(fname, 'wb') as f:
+            f.write(b'Experiment\tHistory Data\r\nSample Period (ms)\t20\r\n\r\n[DATA]\r\n')
+            f.write(b'Time (s)\tCurrent (A)\tZ (m)\r\n')
+            for row in rows:
+                f.write('{}\t{}\t{}\r\n'.format(*row).encode())
+        return fname, rows
+
+    def test_partial_read(self):
+        fname, rows = self.create_long_spec_data(3000)
+        SP = nap.read.Spec(fname, usecols=['Z (m)', 0], skip_rows=2500, max_rows=300)
+
+        self.assertEqual(SP.columns, ['Z (m)', 'Time (s)'])
+        np.testing.assert_array_equal(SP.signals['Z (m)'], rows[2500:2800, 2])
+        np.testing.assert_array_equal(SP.signals['Time (s)'], rows[2500:2800, 0])
+        self.assertEqual(SP.header['Sample Period (ms)'], '20')
+        self.assertEqual(nap.read.Spec(fname, max_rows=0).signals['Current (A)'].size, 0)
+
+    def test_iter_chunks(self):
+        fname, rows = self.create_long_spec_data(3000)
+        SP = nap.read.Spec(fname, max_rows=10)
+
+        self.assertIsNone(SP._row_index)
+        blocks = list(SP.iter_chunks(rows=1000))
+        self.assertEqual([start for start, _ in blocks], [0, 1000, 2000])
+        np.testing.assert_array_equal(np.concatenate([b['Current (A)'] for _, b in blocks]),
+                                      rows[:, 1])
+        self.assertIsNone(SP._row_index)
+
+        blocks = list(SP.iter_chunks(rows=100, start=1500, stop=1750))
+        self.assertEqual(SP.num_rows, 3000)
+        self.assertEqual([start for start, _ in blocks], [1500, 1600, 1700])
+        np.testing.assert_array_equal(blocks[-1][1]['Time (s)'], rows[1700:1750, 0])
+
+    def test_iter_chunks_gzip(self):
+        fname, rows = self.create_long_spec_data(2100, suffix='.dat.gz')
+        SP = nap.read.Spec(fname, usecols=[1], skip_rows=2050)
+
+        np.testing.assert_array_equal(SP.signals['Current (A)'], rows[2050:, 1])
+        start, block = next(SP.iter_chunks(rows=10, start=1030))
+        np.testing.assert_array_equal(block['Current (A)'], rows[1030:1040, 1])
+
+    def test_compact_spec(self):
+        base = os.path.dirname(__file__)
+        with open(base + '/Bias-Spectroscopy002.dat', 'rb') as f:
+            raw = f.read().replace(b'\n', b'\r\n')
+        fnames = []
+        for i in range(2):
+            fname = os.path.join(self.temp_dir.name, 'spec{}.dat'.format(i))
+            with open(fname, 'wb') as f:
+                f.write(raw)
+            fnames.append(fname)
+        SP = nap.read.Spec(fnames[0])
+        CS, CS2 = [nap.read.CompactSpec(fname) for fname in fnames]
+
+        self.assertFalse(hasattr(CS, '__dict__'))
+        self.assertEqual(list(CS.header), list(SP.header))
+        self.assertEqual(CS.header['X (m)'], -19.4904e-9)
+        self.assertEqual(CS.header['Date'], '04.08.2015 08:49:41')
+        self.assertEqual(CS.header.raw('X (m)'), '-19.4904E-9')
+        self.assertIs(CS.header.raw('Filter type'), CS2.header.raw('Filter type'))
+        self.assertIs(CS._columns, CS2._columns)
+        for key in SP.signals:
+            np.testing.assert_array_equal(SP.signals[key], CS.signals[key])
+
+        CS3 = pickle.loads(pickle.dumps(CS))
+        self.assertIs(CS3._columns, CS._columns)
+        self.assertEqual(dict(CS3.header), dict(CS.header))
+
     def test_dat_header_extra_delimiter(self):
         entry = 'entry1\t\t\r\n\r\n[DATA]\r\n'
         expected_result = {'entry1': ''}
@@ -382,11 +1091,6 @@ class TestSpecFile(unittest.TestCase):
         expected_result = {'entry1': ''}
         self.assertEqual(nap.read._parse_dat_header(entry), expected_result)
 
-    def test_get_num_lines(self):
-        f = self.create_dummy_spec_data()
-        SP = nap.read.Spec(f.name)
-        self.assertEqual(SP._num_header_lines(), 17)
-
     def test_duplicate_headers(self):
         try:
             base = Path(__file__).parent
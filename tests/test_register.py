@@ -0,0 +1,87 @@
+import unittest
+import tempfile
+import os
+import numpy as np
+
+import nanonispy as nap
+from nanonispy import register
+
+
+class TestRegister(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        fy = np.fft.fftfreq(64)[:, None]
+        fx = np.fft.fftfreq(64)[None, :]
+        # smooth random surface, shifted by known subpixel amounts
+        spectrum = np.fft.fft2(rng.standard_normal((64, 64))) * \
+            np.exp(-(fy**2 + fx**2) / (2 * 0.08**2))
+        self.drift = np.cumsum(np.vstack([[0, 0], rng.uniform(-5, 5, (6, 2))]), axis=0)
+        self.images = np.stack([np.fft.ifft2(spectrum * np.exp(-2j * np.pi * (fy * d[0] + fx * d[1]))).real
+                                for d in self.drift])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_dummy_scan(self, name, offset, scan_dir):
+        fname = os.path.join(self.temp_dir.name, name)
+        with open(fname, 'wb') as f:
+            f.write(':SCAN_PIXELS:\n       64       32\n:SCAN_TIME:\n 1E+0 1E+0\n:SCAN_RANGE:\n 6.4E-8 6.4E-8\n:SCAN_OFFSET:\n {} {}\n:SCAN_ANGLE:\n 0.000E+0\n:SCAN_DIR:\n{}\n:BIAS:\n 1E-1\n:ACQ_TIME:\n 1.0\n:DATA_INFO:\n\tChannel\tName\tUnit\tDirection\tCalibration\tOffset\n\t14\tZ\tm\tboth\t1.000E+0\t0.000E+0\n\n:SCANIT_END:\n'.format(offset[0], offset[1], scan_dir).encode())
+        return nap.read.Scan(fname, load_data=False)
+
+    def test_estimate_drift(self):
+        for chunk_size in (None, 2, 3):
+            drift = register.estimate_drift(self.images, upsample=20, chunk_size=chunk_size)
+            np.testing.assert_allclose(drift, self.drift, atol=0.1)
+
+        np.testing.assert_allclose(register.estimate_drift(self.images, upsample=20, workers=3),
+                                   self.drift, atol=0.1)
+        if register._scipy_fft is None:
+            np.testing.assert_allclose(register.estimate_drift(self.images, upsample=20,
+                                                               chunk_size=3, workers=3),
+                                       self.drift, atol=0.1)
+
+    def test_frames_transformed_once(self):
+        transformed = []
+        fft2 = register._fft2
+
+        def counting_fft2(frames, workers):
+            transformed.append(len(frames))
+            return fft2(frames, workers)
+
+        register._fft2 = counting_fft2
+        try:
+            register.estimate_drift(self.images, chunk_size=3)
+        finally:
+            register._fft2 = fft2
+        self.assertEqual(sum(transformed), len(self.images))
+
+    def test_search_window(self):
+        pairs = np.diff(self.drift, axis=0)
+        drift = register.estimate_drift(self.images, prior=pairs + 0.7, max_shift=2)
+        np.testing.assert_allclose(drift, self.drift, atol=0.1)
+
+        # peaks far from zero shift are out of the window without prior,
+        # subpixel refinement moves at most 0.75 pixel further
+        drift = register.estimate_drift(self.images, max_shift=1)
+        self.assertTrue(np.all(np.abs(np.diff(drift, axis=0)) <= 1.75))
+
+        with self.assertRaises(ValueError):
+            register.estimate_drift(self.images, prior=pairs[1:])
+
+    def test_register(self):
+        aligned = register.register(self.images, self.drift, chunk_size=4)
+        np.testing.assert_allclose(aligned, np.broadcast_to(self.images[0], aligned.shape), atol=1e-9)
+
+    def test_offset_prior(self):
+        scans = [self.create_dummy_scan('a.sxm', (0, 0), 'up'),
+                 self.create_dummy_scan('b.sxm', (1e-8, 4e-9), 'up'),
+                 self.create_dummy_scan('c.sxm', (1e-8, 0), 'down')]
+
+        # 1 nm pixels along x, 2 nm along y
+        np.testing.assert_allclose(register.offset_prior(scans), [[-2, -10], [2, 0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
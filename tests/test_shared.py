@@ -0,0 +1,83 @@
+import unittest
+import tempfile
+import os
+import multiprocessing
+import sys
+import numpy as np
+
+import nanonispy as nap
+
+from .common import write_grid
+
+
+def _sum_in_worker(name):
+    shared = nap.attach(name)
+    total = float(shared.signals['Current (A)'].sum(dtype=np.float64))
+    shared.close()
+    return total
+
+
+@unittest.skipIf(sys.version_info < (3, 8), 'multiprocessing.shared_memory needs python 3.8')
+class TestSharedGrid(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        fname = write_grid(os.path.join(self.temp_dir.name, 'grid.3ds'))
+        self.grid = nap.read.Grid(fname)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_attach_views(self):
+        with self.grid.to_shared_memory() as published:
+            shared = nap.attach(published.name)
+            self.assertEqual(published.attach_count, 1)
+            self.assertEqual(shared.header, self.grid.header)
+            for key, arr in self.grid.signals.items():
+                np.testing.assert_array_equal(shared.signals[key], arr)
+                self.assertEqual(shared.signals[key].dtype, arr.dtype)
+
+            # same memory in both handles, topo is a view of params
+            published.signals['topo'][0, 0] = -1
+            self.assertEqual(shared.signals['topo'][0, 0], -1)
+            self.assertTrue(np.shares_memory(shared.signals['topo'], shared.signals['params']))
+            self.assertEqual(len(shared._blocks), len(self.grid.signals) - 1)
+
+            shared.close()
+            self.assertEqual(published.attach_count, 0)
+
+    def test_attach_other_process(self):
+        published = self.grid.to_shared_memory()
+        try:
+            ctx = multiprocessing.get_context('spawn')
+            with ctx.Pool(2) as pool:
+                totals = pool.map(_sum_in_worker, [published.name] * 2)
+            expected = self.grid.signals['Current (A)'].sum(dtype=np.float64)
+            self.assertEqual(totals, [expected, expected])
+            self.assertEqual(published.attach_count, 0)
+        finally:
+            published.close()
+            published.unlink()
+
+        with self.assertRaises(FileNotFoundError):
+            nap.attach(published.name)
+
+    def test_close_with_views_in_use(self):
+        published = self.grid.to_shared_memory()
+        shared = nap.attach(published.name)
+        topo = shared.signals['topo']
+        with self.assertRaises(BufferError):
+            shared.close()
+        del topo
+        # derived slices keep the mapping in use too
+        row = shared.signals['Current (A)'][0]
+        with self.assertRaises(BufferError):
+            shared.close()
+        del row
+        shared.close()
+        published.close()
+        published.unlink()
+
+
+if __name__ == '__main__':
+    unittest.main()
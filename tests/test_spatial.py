@@ -0,0 +1,124 @@
+import unittest
+import tempfile
+import os
+import warnings
+import numpy as np
+
+from nanonispy import spatial
+from nanonispy.spatial import Frame, SpatialIndex
+
+from .common import write_grid
+
+
+class TestSpatialIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_random_frames(self, num):
+        rng = np.random.RandomState(1)
+        frames = []
+        for i in range(num):
+            size = (0.0, 0.0) if i % 5 == 0 else tuple(rng.uniform(1e-9, 50e-9, 2))
+            frames.append(Frame('f{}'.format(i), 'scan', tuple(rng.uniform(0, 1e-6, 2)), size,
+                                rng.uniform(0, 360)))
+        return frames
+
+    def create_dummy_files(self):
+        """
+        return grid, scan and spec filenames with known frames
+        """
+        grid = os.path.join(self.temp_dir.name, 'grid.3ds')
+        write_grid(grid, np.zeros(3*4*13), settings='1.0E-7;2.0E-7;4.0E-8;2.0E-8;9.0E+1')
+
+        scan = os.path.join(self.temp_dir.name, 'scan.sxm')
+        with open(scan, 'wb') as f:
+            f.write(b':SCAN_PIXELS:\n       2       2\n:SCAN_TIME:\n 1E+0 1E+0\n:SCAN_RANGE:\n 1.000000E-7 1.000000E-7\n:SCAN_OFFSET:\n 1.200000E-7 2.000000E-7\n:SCAN_ANGLE:\n 0.000E+0\n:BIAS:\n 1E-1\n:ACQ_TIME:\n 1.0\n:DATA_INFO:\n\tChannel\tName\tUnit\tDirection\tCalibration\tOffset\n\t14\tZ\tm\tboth\t1.000E+0\t0.000E+0\n\n:SCANIT_END:\n')
+            np.zeros(1 + 2*2*2, dtype='>f4').tofile(f)
+
+        spec = os.path.join(self.temp_dir.name, 'spec.dat')
+        with open(spec, 'wb') as f:
+            f.write(b'X (m)\t1.1E-7\r\nY (m)\t2.15E-7\r\n\r\n[DATA]\r\nBias (V)\tCurrent (A)\r\n0\t1\r\n')
+
+        return grid, scan, spec
+
+    def test_tree_matches_brute_force(self):
+        frames = self.create_random_frames(600)
+        index = SpatialIndex(frames)
+        rng = np.random.RandomState(2)
+
+        for x, y in rng.uniform(0, 1e-6, (50, 2)):
+            expected = [f.path for f in frames
+                        if all(abs(c) <= s / 2 + 5e-9 for c, s in zip(spatial._to_frame(f, x, y), f.size))]
+            self.assertEqual(sorted(index.files_at(x, y, tolerance=5e-9)), sorted(expected))
+
+        for query in frames[:30]:
+            corners = spatial._corners(query)
+            expected = [f.path for f in frames if f.path != query.path and
+                        spatial._convex_overlap(corners, spatial._corners(f))]
+            self.assertEqual(sorted(index.overlapping(query)), sorted(expected))
+
+    def test_rotated_frame(self):
+        index = SpatialIndex([Frame('a', 'scan', (0.0, 0.0), (10.0, 2.0), 90.0),
+                              Frame('b', 'scan', (0.0, 0.0), (4.0, 0.0), 45.0)])
+
+        self.assertEqual(index.files_at(0.0, 4.0), ['a'])
+        self.assertEqual(index.files_at(4.0, 0.0), [])
+        # clockwise rotation, the width axis points to +x, -y
+        self.assertEqual(index.files_at(1.2, -1.2, tolerance=1e-9), ['b'])
+        self.assertEqual(index.files_at(1.2, 1.2, tolerance=1e-9), [])
+        self.assertEqual(index.overlapping(Frame('c', 'spec', (3.0, 3.0), (0.0, 0.0), 0.0)), [])
+        self.assertEqual(index.overlapping(Frame('c', 'scan', (2.8, -1.2), (3.0, 3.0), 0.0)), ['b'])
+
+    def test_files_and_persistence(self):
+        grid, scan, spec = self.create_dummy_files()
+        index = SpatialIndex.from_files([grid, scan, spec], workers=2)
+
+        self.assertEqual(index.frames[0].angle, 90.0)
+        # grid is 40 nm wide along y once rotated
+        self.assertEqual(sorted(index.files_at(1.0e-7, 2.15e-7)), sorted([grid, scan]))
+        self.assertEqual(sorted(index.overlapping(spec)), sorted([scan]))
+        self.assertEqual(sorted(index.overlapping(scan)), sorted([grid, spec]))
+
+        fname = os.path.join(self.temp_dir.name, 'index.npz')
+        index.save(fname)
+        index2 = SpatialIndex.load(fname)
+        self.assertEqual(index2.frames, index.frames)
+        self.assertEqual(index2.files_at(1.1e-7, 2.15e-7), index.files_at(1.1e-7, 2.15e-7))
+
+        # unchanged files are not read again
+        os.remove(grid)
+        with open(grid, 'wb'):
+            pass
+        os.utime(grid, (os.stat(scan).st_mtime,) * 2)
+        index2._mtimes[index2._positions[grid]] = os.stat(grid).st_mtime
+        index2.add([grid, scan, spec])
+        self.assertEqual(len(index2), 3)
+
+    def test_unreadable_file_skipped(self):
+        fname = os.path.join(self.temp_dir.name, 'nopos.dat')
+        with open(fname, 'wb') as f:
+            f.write(b'Experiment\tbias\r\n\r\n[DATA]\r\nBias (V)\r\n0\r\n')
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            index = SpatialIndex.from_files([fname])
+
+        self.assertEqual(len(index), 0)
+        self.assertEqual(len(w), 1)
+
+        # missing files don't abort the batch
+        missing = os.path.join(self.temp_dir.name, 'missing.sxm')
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            index.add([missing, self.create_dummy_files()[2]])
+
+        self.assertEqual(len(index), 1)
+        self.assertEqual(len(w), 1)
+        self.assertIn('missing.sxm', str(w[0].message))
+
+
+if __name__ == '__main__':
+    unittest.main()
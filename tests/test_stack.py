@@ -0,0 +1,72 @@
+import unittest
+import tempfile
+import os
+import numpy as np
+
+import nanonispy as nap
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+
+@unittest.skipIf(pandas is None, 'pandas is not installed')
+class TestStackSpecs(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        base = os.path.dirname(__file__)
+        with open(base + '/Bias-Spectroscopy002.dat', 'rb') as f:
+            self.raw = f.read().replace(b'\n', b'\r\n')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_dummy_spec_files(self, num, raw=None, prefix='spec'):
+        """
+        return list of .dat filenames with shifted X (m) header entries
+        """
+        raw = self.raw if raw is None else raw
+        fnames = []
+        for i in range(num):
+            fname = os.path.join(self.temp_dir.name, '{}{:03d}.dat'.format(prefix, i))
+            x = '{}E-9'.format(i).encode()
+            with open(fname, 'wb') as f:
+                f.write(raw.replace(b'-19.4904E-9', x))
+            fnames.append(fname)
+        return fnames
+
+    def test_stack_matches_spec(self):
+        fnames = self.create_dummy_spec_files(5)
+        sweep, data, info = nap.stack_specs(fnames, column='Input 3 (A)', workers=2)
+        SP = nap.read.Spec(fnames[0])
+
+        self.assertEqual(data.shape, (5, SP.signals['Bias calc (V)'].size))
+        np.testing.assert_array_equal(sweep, SP.signals['Bias calc (V)'])
+        for row in data:
+            np.testing.assert_array_equal(row, SP.signals['Input 3 (A)'])
+
+    def test_header_fields(self):
+        fnames = self.create_dummy_spec_files(3)
+        _, _, info = nap.stack_specs(fnames, column='Input 3 (A)', workers=1)
+
+        self.assertEqual(list(info.index), fnames)
+        np.testing.assert_allclose(info['X (m)'], [0, 1e-9, 2e-9])
+        self.assertEqual(info['Date'].iloc[0], '04.08.2015 08:49:41')
+
+    def test_sweep_mismatch(self):
+        fnames = self.create_dummy_spec_files(2)
+        fnames += self.create_dummy_spec_files(
+            1, raw=self.raw.replace(b'-199.609E-3', b'-100.000E-3'), prefix='other')
+        with self.assertRaises(ValueError):
+            nap.stack_specs(fnames, column='Input 3 (A)')
+
+    def test_missing_column(self):
+        fnames = self.create_dummy_spec_files(2)
+        with self.assertRaises(KeyError):
+            nap.stack_specs(fnames, column='Not a channel')
+
+
+if __name__ == '__main__':
+    unittest.main()
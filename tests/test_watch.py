@@ -0,0 +1,126 @@
+import unittest
+import tempfile
+import os
+import threading
+import time
+import warnings
+import numpy as np
+
+from nanonispy import watch
+from nanonispy.__main__ import main
+
+SCAN_HEADER = b':SCAN_PIXELS:\n       8       8\n:SCAN_TIME:\n 1E+0 1E+0\n:SCAN_RANGE:\n 1E-8 1E-8\n:SCAN_OFFSET:\n 0 0\n:SCAN_ANGLE:\n 0.000E+0\n:SCAN_DIR:\nup\n:BIAS:\n 1E-1\n:ACQ_TIME:\n 1.0\n:DATA_INFO:\n\tChannel\tName\tUnit\tDirection\tCalibration\tOffset\n\t14\tZ\tm\tboth\t1.000E+0\t0.000E+0\n\n:SCANIT_END:\n'
+
+
+class TestWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_scan(self, name, values=2*8*8 + 1, mode='wb'):
+        with open(os.path.join(self.dir, name), mode) as f:
+            if mode == 'wb':
+                f.write(SCAN_HEADER)
+            np.arange(values, dtype='>f4').tofile(f)
+
+    def recorder(self):
+        calls = []
+
+        def step(path, obj):
+            calls.append((os.path.basename(path), type(obj).__name__, os.path.getsize(path)))
+        return calls, step
+
+    def test_settle_and_growth(self):
+        self.write_scan('old.sxm')
+        calls, step = self.recorder()
+        watcher = watch.Watcher(self.dir, [step], settle_time=5, inotify=False)
+        self.assertEqual(watcher.backend, 'polling')
+
+        self.write_scan('a.sxm', values=100)
+        with open(os.path.join(self.dir, 'notes.txt'), 'w') as f:
+            f.write('not watched')
+        self.assertEqual(watcher.poll_once(now=0), [])
+        # still written to, the settle time starts again
+        self.write_scan('a.sxm', values=29, mode='ab')
+        self.assertEqual(watcher.poll_once(now=4), [])
+        self.assertEqual(watcher.poll_once(now=8), [])
+        self.assertEqual(watcher.poll_once(now=9), ['a.sxm'])
+        watcher.wait()
+        self.assertEqual(watcher.poll_once(now=20), [])
+
+        # grown again
+        self.write_scan('a.sxm', values=8, mode='ab')
+        watcher.poll_once(now=30)
+        self.assertEqual(watcher.poll_once(now=35), ['a.sxm'])
+        watcher.close()
+
+        size = len(SCAN_HEADER) + 129*4
+        self.assertEqual(calls, [('a.sxm', 'Scan', size), ('a.sxm', 'Scan', size + 32)])
+        self.assertEqual(watcher.failed, dict())
+
+    def test_failures_and_existing(self):
+        self.write_scan('a.sxm')
+        with open(os.path.join(self.dir, 'b.3ds'), 'wb') as f:
+            f.write(b'no header yet')
+        calls, step = self.recorder()
+
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            with watch.Watcher(self.dir, [step], settle_time=0, existing=True, inotify=False) as watcher:
+                self.assertEqual(watcher.poll_once(), ['a.sxm', 'b.3ds'])
+
+        self.assertEqual([c[0] for c in calls], ['a.sxm'])
+        self.assertEqual(list(watcher.failed), ['b.3ds'])
+        self.assertEqual(len([x for x in w if 'failed' in str(x.message)]), 1)
+
+    def test_backpressure(self):
+        for i in range(6):
+            self.write_scan('{}.sxm'.format(i))
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def slow_step(path, obj):
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+
+        with watch.Watcher(self.dir, [slow_step], workers=4, max_pending=2, settle_time=0,
+                           existing=True, inotify=False) as watcher:
+            self.assertEqual(len(watcher.poll_once()), 6)
+        self.assertEqual(active[1], 2)
+
+    def test_inotify(self):
+        calls, step = self.recorder()
+        try:
+            watcher = watch.Watcher(self.dir, [step], settle_time=0.1, poll_interval=0.05, inotify=True)
+        except (OSError, AttributeError, TypeError):
+            self.skipTest('inotify is not available')
+
+        self.write_scan('a.sxm')
+        watcher.run(timeout=0.5)
+        watcher.close()
+        self.assertEqual([c[:2] for c in calls], [('a.sxm', 'Scan')])
+
+    def test_command_line(self):
+        self.write_scan('a.sxm')
+        out = os.path.join(self.dir, 'out')
+        code = main(['watch', self.dir, '--existing', '--settle', '0', '--poll', '0.05',
+                     '--timeout', '0.2', '--steps', 'thumbnail,convert', '--out', out])
+
+        self.assertEqual(code, 0)
+        self.assertEqual(np.load(os.path.join(out, 'a.sxm.npy')).shape, (8, 8))
+        with np.load(os.path.join(out, 'a.sxm.npz')) as data:
+            self.assertEqual(sorted(data.files), ['Z/backward', 'Z/forward'])
+        with self.assertRaises(SystemExit):
+            main(['watch', self.dir, '--steps', 'bogus'])
+
+
+if __name__ == '__main__':
+    unittest.main()